@@ -6,7 +6,7 @@ import warnings
 from collections import defaultdict
 from datetime import datetime, timedelta
 from multiprocessing import current_process
-from typing import Iterable
+from typing import Iterable, Union
 
 import netCDF4 as nc4
 import numpy as np
@@ -14,7 +14,7 @@ import xarray as xr
 from baseclasses import Dataset, Field
 from conf.global_settings import OUTPUT_DIR
 from utils.pipeline_utils import solr_utils
-from utils.processing_utils import records
+from utils.processing_utils import records, transformed_store
 
 logger = logging.getLogger(str(current_process().pid))
 
@@ -31,11 +31,14 @@ class Aggregation(Dataset):
         self.do_monthly_aggregation: bool = config.get('do_monthly_aggregation', False)
         self.remove_nan_days_from_data: bool = config.get('remove_nan_days_from_data', True)
         self.skipna_in_mean: bool = config.get('skipna_in_mean', False)
+        self.encoding_profile: str = config.get('aggregation_encoding_profile', records.AGGREGATION_ENCODING_PROFILE)
         self.transformations: Iterable[dict] = defaultdict(list)
         self._set_ds_meta()
         self.grid: dict = grid
         self.year: str = year
         self.field: Field = field
+        # Year stores opened by open_transformation
+        self.stores: dict = {}
 
     def __str__(self) -> str:
         return f'"{self.grid["grid_name_s"]} {self.field.name} {self.year}"'
@@ -119,7 +122,8 @@ class Aggregation(Dataset):
         docs = solr_utils.solr_query(fq)
         filepaths = defaultdict(list)
         for doc in docs:
-            filepaths[doc['date_s']].append(doc['transformation_file_path_s'])
+            filepaths[doc['date_s']].append((doc['transformation_file_path_s'], doc.get('transformation_variable_s'),
+                                             doc.get('transformation_time_index_i')))
             
             # Update JSON transformations list
             fq = [f'dataset_s:{self.ds_name}', 'type_s:granule',
@@ -131,16 +135,39 @@ class Aggregation(Dataset):
             self.transformations[self.field.name].append(transformation_metadata)
         return filepaths
         
+    def open_transformation(self, filepath: str, variable: str = None, time_index: Union[int, Iterable[int]] = None) -> xr.Dataset:
+        '''
+        Opens a transformed file, selecting the field's variable from files holding several fields
+        and the time step(s) from year stores
+        '''
+        if time_index is not None:
+            if filepath not in self.stores:
+                self.stores[filepath] = transformed_store.open_store(filepath)
+            ds = self.stores[filepath].isel(time=np.atleast_1d(time_index))
+        else:
+            ds = xr.open_dataset(filepath)
+        if variable:
+            # Keeps coordinates not on the variable's dimensions (ex: time_bnds)
+            ds = ds.drop_vars([var for var in ds.data_vars if var != variable])
+        return ds
+
     def open_and_concat(self, filepaths: dict):
         opened_files = []
         dates = sorted(list(filepaths.keys()))
+
+        # A year in a single year store is read in one selection
+        files = [file for date in dates for file in filepaths[date]]
+        if files and len(files) == len(dates) and len({file[0] for file in files}) == 1 and files[0][2] is not None:
+            store_path, variable, _ = files[0]
+            return self.open_transformation(store_path, variable, [file[2] for file in files])
+
         for date in dates:
             files = filepaths[date]
             if len(files) == 1:
-                opened_files.append(xr.open_dataset(files[0]))
+                opened_files.append(self.open_transformation(*files[0]))
             else:
-                f1 = xr.open_dataset(files[0])
-                f2 = xr.open_dataset(files[1])                
+                f1 = self.open_transformation(*files[0])
+                f2 = self.open_transformation(*files[1])                
                 var = list(f1.keys())[0]
                 if np.isnan(f1[var].values).all():
                     if np.isnan(f2[var].values).all():
@@ -308,7 +335,8 @@ class Aggregation(Dataset):
                     mon_DS_year_merged[data_var] = mon_DS_year_merged[data_var].fillna(NETCDF_FILL_VALUE)
 
                     records.save_binary(mon_DS_year_merged, monthly_filename, bin_output_dir, grid_type, data_var)
-                    records.save_netcdf(mon_DS_year_merged, f'{monthly_filename}.nc', netCDF_output_dir)
+                    records.save_netcdf(mon_DS_year_merged, f'{monthly_filename}.nc', netCDF_output_dir,
+                                        self.encoding_profile)
 
                 except Exception as e:
                     logger.exception(f'Error aggregating {self.ds_name}. {e}')
@@ -327,7 +355,7 @@ class Aggregation(Dataset):
             daily_annual_ds[data_var] = daily_annual_ds[data_var].fillna(NETCDF_FILL_VALUE)
 
             records.save_binary(daily_annual_ds, shortest_filename, bin_output_dir, grid_type, data_var)
-            records.save_netcdf(daily_annual_ds, f'{shortest_filename}.nc', netCDF_output_dir)       
+            records.save_netcdf(daily_annual_ds, f'{shortest_filename}.nc', netCDF_output_dir, self.encoding_profile)       
 
         aggregation_successes = aggregation_successes and success
         empty_year = empty_year and success
@@ -0,0 +1,91 @@
+'''
+Benchmarks writing and reading a record with each netCDF encoding profile of records.save_netcdf,
+to help choose TRANSFORMATION_ENCODING_PROFILE and AGGREGATION_ENCODING_PROFILE.
+
+The record is either an existing transformed or aggregated file (--file) or a record built on a
+model grid: a smooth field over wet cells and fill values over land, repeated for --days time steps.
+
+Run from ecco_pipeline/:
+python -m benchmarks.encoding_profiles --grid ECCO_llc270 --days 1
+python -m benchmarks.encoding_profiles --grid ECCO_llc90 --days 365
+python -m benchmarks.encoding_profiles --file /path/to/transformed/ECCO_llc90_sea_ice_conc_<granule>.nc
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import xarray as xr
+from utils.processing_utils import records
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', default=None, help='transformed or aggregated netCDF file to benchmark')
+    parser.add_argument('--grid', default='ECCO_llc90', help='name of grid in grids/, when --file is not given')
+    parser.add_argument('--days', type=int, default=1, help='number of daily time steps, when --file is not given')
+    parser.add_argument('--profiles', nargs='*', default=list(records.ENCODING_PROFILES),
+                        help='encoding profiles to benchmark')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed writes and reads per profile')
+    return parser
+
+
+def make_record(grid_name: str, days: int) -> xr.Dataset:
+    '''
+    Record shaped like an aggregated file of the grid, nan over dry cells
+    '''
+    grid_ds = xr.open_dataset(f'grids/{grid_name}.nc')
+    field = np.cos(np.deg2rad(grid_ds.YC.values)) * np.sin(np.deg2rad(2 * grid_ds.XC.values))
+    for mask_var in ['maskC', 'hFacC']:
+        if mask_var in grid_ds:
+            mask = grid_ds[mask_var].values
+            mask = mask[0] if mask.ndim > field.ndim else mask
+            field = np.where(mask > 0, field, np.nan)
+            break
+
+    rng = np.random.default_rng(0)
+    data = (field + 0.01 * rng.normal(size=(days, *field.shape))).astype(records.DTYPE)
+    times = np.datetime64('2000-01-01', 'ns') + np.arange(days) * np.timedelta64(1, 'D')
+    data_DA = xr.DataArray(data, dims=('time', *grid_ds.XC.dims), name='field')
+    data_DA = data_DA.assign_coords(time=times)
+    return data_DA.to_dataset()
+
+
+def main():
+    args = create_parser().parse_args()
+    if args.file:
+        ds = xr.open_dataset(args.file).load()
+        print(f'{args.file}: {dict(ds.sizes)}\n')
+    else:
+        ds = make_record(args.grid, args.days)
+        print(f'{args.grid}, {args.days} days: {dict(ds.sizes)}\n')
+
+    output_dir = tempfile.mkdtemp()
+    try:
+        print(f'{"profile":<10} {"write (s)":>10} {"read (s)":>9} {"size (MB)":>10}')
+        for profile in args.profiles:
+            filename = f'{profile}.nc'
+            path = os.path.join(output_dir, filename)
+            write_times = []
+            read_times = []
+            for _ in range(args.repeats):
+                if os.path.exists(path):
+                    os.remove(path)
+                start = time.perf_counter()
+                records.save_netcdf(ds, filename, output_dir, profile)
+                write_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                with xr.open_dataset(path) as written_ds:
+                    written_ds.load()
+                read_times.append(time.perf_counter() - start)
+            size = os.path.getsize(path)
+            print(f'{profile:<10} {min(write_times):>10.3f} {min(read_times):>9.3f} {size / 1024**2:>10.2f}')
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+Benchmarks each mapping operation of RegridOperator against the per target cell loop
+that RegridOperator replaced.
+
+Run from ecco_pipeline/:
+python -m benchmarks.mapping_operations --dataset G02202_V4 --hemi nh --grid ECCO_llc90
+'''
+import argparse
+import time
+
+import numpy as np
+import pyresample as pr
+import xarray as xr
+import yaml
+from utils.processing_utils import transformation_utils
+from utils.processing_utils.transformation_utils import RegridOperator
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', default='G02202_V4', help='name of dataset config in conf/ds_configs')
+    parser.add_argument('--hemi', default='nh', help='hemisphere (nh or sh) for hemispherical datasets')
+    parser.add_argument('--grid', default='ECCO_llc90', help='name of grid in grids/')
+    parser.add_argument('--nan_fraction', type=float, default=0.3, help='fraction of source field set to nan')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed RegridOperator applications')
+    return parser
+
+
+def load_source_grid(config: dict, hemi: str):
+    suffix = f'_{hemi}' if f'dims_{hemi}' in config else ''
+    data_res = config['data_res']
+    if isinstance(data_res, str):
+        num, den = data_res.replace(' ', '').split('/') if '/' in data_res else (data_res, 1)
+        data_res = float(num) / float(den)
+    return transformation_utils.generalized_grid_product(data_res, config[f'area_extent{suffix}'],
+                                                         config[f'dims{suffix}'], config[f'proj_info{suffix}'])
+
+
+def load_target_grid(grid_name: str):
+    grid_ds = xr.open_dataset(f'grids/{grid_name}.nc')
+    target_grid = pr.geometry.SwathDefinition(lons=grid_ds.XC.values.ravel(), lats=grid_ds.YC.values.ravel())
+    radius_var = 'effective_grid_radius' if 'effective_grid_radius' in grid_ds else 'RAD'
+    return target_grid, grid_ds[radius_var].values.ravel()
+
+
+def to_legacy_factors(operator: RegridOperator):
+    '''
+    Per target cell dictionaries expected by the loop implementation
+    '''
+    source_indices_within_target_radius_i = {i: operator.source_indices[operator.offsets[i]:operator.offsets[i+1]]
+                                             for i in range(operator.n_target)}
+    nearest_source_index_to_target_index_i = {i: source_i for i, source_i in enumerate(operator.nearest_source_index)
+                                              if source_i >= 0}
+    return source_indices_within_target_radius_i, operator.num_source_indices, nearest_source_index_to_target_index_i
+
+
+def main():
+    args = create_parser().parse_args()
+    with open(f'conf/ds_configs/{args.dataset}.yaml', 'r') as stream:
+        config = yaml.load(stream, yaml.Loader)
+
+    source_grid_min_L, source_grid_max_L, source_grid = load_source_grid(config, args.hemi)
+    target_grid, target_grid_radius = load_target_grid(args.grid)
+
+    start = time.perf_counter()
+    factors = transformation_utils.find_mappings_from_source_to_target(source_grid, target_grid, target_grid_radius,
+                                                                       source_grid_min_L, source_grid_max_L)
+    operator = RegridOperator.from_factors(factors)
+    print(f'{args.dataset} {args.hemi} -> {args.grid}: {operator.n_target} target cells, '
+          f'{len(operator.source_indices)} source indices, factors in {time.perf_counter() - start:.2f}s\n')
+
+    legacy_factors = to_legacy_factors(operator)
+
+    rng = np.random.default_rng(0)
+    source_field = rng.normal(size=source_grid.size)
+    source_field[rng.random(source_grid.size) < args.nan_fraction] = np.nan
+
+    print(f'{"operation":<10} {"loop (s)":>10} {"operator (s)":>13} {"speedup":>9} {"max abs diff":>13}')
+    for operation in RegridOperator.operations:
+        start = time.perf_counter()
+        expected = transformation_utils._transform_to_target_grid_loop(*legacy_factors, source_field,
+                                                                       (operator.n_target,), operation)
+        loop_time = time.perf_counter() - start
+
+        operator_times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            result = operator.apply(source_field, operation)
+            operator_times.append(time.perf_counter() - start)
+        operator_time = min(operator_times)
+
+        both_valid = ~np.isnan(expected) & ~np.isnan(result)
+        if not np.array_equal(np.isnan(expected), np.isnan(result)):
+            max_diff = 'nan mismatch'
+        else:
+            max_diff = f'{np.max(np.abs(expected[both_valid] - result[both_valid]), initial=0):.2e}'
+        print(f'{operation:<10} {loop_time:>10.3f} {operator_time:>13.4f} {loop_time / operator_time:>8.0f}x {max_diff:>13}')
+
+
+if __name__ == '__main__':
+    main()
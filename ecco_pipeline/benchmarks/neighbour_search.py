@@ -0,0 +1,83 @@
+'''
+Benchmarks the neighbour search backends of find_mappings_from_source_to_target on the
+source grid of a dataset, and reports how closely the factors of each backend agree with
+those of the pyresample backend.
+
+Run from ecco_pipeline/:
+python -m benchmarks.neighbour_search --dataset G02202_V4 --hemi nh --grid ECCO_llc90
+python -m benchmarks.neighbour_search --dataset AVHRR_OI-NCEI-L4-GLOB-v2.1 --grid ECCO_llc90
+'''
+import argparse
+import time
+import warnings
+
+import numpy as np
+import yaml
+from benchmarks.mapping_operations import load_source_grid, load_target_grid
+from utils.processing_utils import transformation_utils
+from utils.processing_utils.transformation_utils import NEIGHBOUR_SEARCH_BACKENDS, RegridOperator
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', default='G02202_V4', help='name of dataset config in conf/ds_configs')
+    parser.add_argument('--hemi', default='nh', help='hemisphere (nh or sh) for hemispherical datasets')
+    parser.add_argument('--grid', default='ECCO_llc90', help='name of grid in grids/')
+    parser.add_argument('--neighbours', type=int, default=100, help='number of neighbours searched per target cell')
+    parser.add_argument('--workers', type=int, default=-1, help='parallel queries for the kdtree backend, -1 for all cores')
+    return parser
+
+
+def nearest_distances(operator: RegridOperator, source_xyz: np.ndarray, target_xyz: np.ndarray) -> np.ndarray:
+    '''
+    Distance from each target cell to its nearest source cell, nan where there is none
+    '''
+    distances = np.full(operator.n_target, np.nan)
+    has_nearest = operator.nearest_source_index >= 0
+    distances[has_nearest] = np.linalg.norm(source_xyz[operator.nearest_source_index[has_nearest]]
+                                            - target_xyz[has_nearest], axis=1)
+    return distances
+
+
+def main():
+    args = create_parser().parse_args()
+    with open(f'conf/ds_configs/{args.dataset}.yaml', 'r') as stream:
+        config = yaml.load(stream, yaml.Loader)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        source_grid_min_L, source_grid_max_L, source_grid = load_source_grid(config, args.hemi)
+    target_grid, target_grid_radius = load_target_grid(args.grid)
+    print(f'{args.dataset} {args.hemi} -> {args.grid}: {source_grid.size} source cells, '
+          f'{target_grid.size} target cells\n')
+
+    operators = {}
+    print(f'{"backend":<12} {"time (s)":>9} {"source indices":>15}')
+    for backend in NEIGHBOUR_SEARCH_BACKENDS:
+        start = time.perf_counter()
+        factors = transformation_utils.find_mappings_from_source_to_target(source_grid, target_grid, target_grid_radius,
+                                                                           source_grid_min_L, source_grid_max_L,
+                                                                           neighbours=args.neighbours,
+                                                                           backend=backend, workers=args.workers)
+        operators[backend] = RegridOperator.from_factors(factors)
+        print(f'{backend:<12} {time.perf_counter() - start:>9.2f} {len(operators[backend].source_indices):>15}')
+
+    # Agreement with pyresample. Cells equidistant from several source cells (common for
+    # grids whose cell centres fall on source cell edges) may pick a different but equally near one
+    source_lons, source_lats = source_grid.get_lonlats()
+    source_xyz = transformation_utils.lonlat_to_unit_vectors(np.asarray(source_lons).ravel(), np.asarray(source_lats).ravel())
+    target_xyz = transformation_utils.lonlat_to_unit_vectors(np.asarray(target_grid.lons).ravel(), np.asarray(target_grid.lats).ravel())
+
+    reference = operators['pyresample']
+    reference_distances = nearest_distances(reference, source_xyz, target_xyz)
+    print(f'\n{"backend":<12} {"count mismatches":>17} {"nearest mismatches":>19} {"non-tied":>9}')
+    for backend, operator in operators.items():
+        count_mismatches = np.sum(operator.num_source_indices != reference.num_source_indices)
+        nearest_mismatch = operator.nearest_source_index != reference.nearest_source_index
+        distances = nearest_distances(operator, source_xyz, target_xyz)
+        tied = np.isclose(distances, reference_distances, rtol=1e-9, atol=0)
+        print(f'{backend:<12} {count_mismatches:>17} {np.sum(nearest_mismatch):>19} {np.sum(nearest_mismatch & ~tied):>9}')
+
+
+if __name__ == '__main__':
+    main()
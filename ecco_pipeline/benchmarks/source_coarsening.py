@@ -0,0 +1,87 @@
+'''
+Benchmarks building and applying factors against coarsened levels of a fine source grid
+(see SourceCoarsening) and reports the error introduced relative to the full resolution
+source grid, to help choose a dataset's source_coarsening_threshold.
+
+The source field is a smooth analytic field plus noise, with a fraction of cells set to nan.
+
+Run from ecco_pipeline/:
+python -m benchmarks.source_coarsening --dataset MODIS_AQUA_L3_SST_THERMAL_DAILY_9KM_DAYTIME_V2019.0 --grid ECCO_llc90
+'''
+import argparse
+import time
+import warnings
+
+import numpy as np
+import yaml
+from benchmarks.mapping_operations import load_source_grid, load_target_grid
+from utils.processing_utils import transformation_utils
+from utils.processing_utils.transformation_utils import RegridOperator, SourceCoarsening
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', default='MODIS_AQUA_L3_SST_THERMAL_DAILY_9KM_DAYTIME_V2019.0',
+                        help='name of dataset config in conf/ds_configs')
+    parser.add_argument('--hemi', default='nh', help='hemisphere (nh or sh) for hemispherical datasets')
+    parser.add_argument('--grid', default='ECCO_llc90', help='name of grid in grids/')
+    parser.add_argument('--factors', type=int, nargs='*', default=[2, 3, 4], help='block sizes to coarsen by')
+    parser.add_argument('--operation', default='nanmean', help='mapping operation')
+    parser.add_argument('--nan_fraction', type=float, default=0.3, help='fraction of source field set to nan')
+    parser.add_argument('--backend', default='kdtree', help='neighbour search backend')
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    with open(f'conf/ds_configs/{args.dataset}.yaml', 'r') as stream:
+        config = yaml.load(stream, yaml.Loader)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        source_grid_min_L, source_grid_max_L, source_grid = load_source_grid(config, args.hemi)
+    target_grid, target_grid_radius = load_target_grid(args.grid)
+    dims = config.get(f'dims_{args.hemi}', config.get('dims'))
+
+    lons, lats = source_grid.get_lonlats()
+    lons, lats = np.deg2rad(np.asarray(lons).ravel()), np.deg2rad(np.asarray(lats).ravel())
+    rng = np.random.default_rng(0)
+    source_field = 10 * np.sin(2 * lats) * np.cos(3 * lons) + rng.normal(scale=0.5, size=lons.size)
+    source_field[rng.random(lons.size) < args.nan_fraction] = np.nan
+    source_field = source_field[np.newaxis]
+
+    ratio = np.nanmedian(target_grid_radius) / source_grid_max_L
+    print(f'{args.dataset} -> {args.grid}: {source_grid.size} source cells, median target radius / source '
+          f'resolution = {ratio:.1f}\n')
+    print(f'{"factor":>6} {"source cells":>13} {"indices":>10} {"factors (s)":>12} {"mapping (s)":>12} '
+          f'{"mean abs diff":>14} {"max abs diff":>13} {"cells lost":>11}')
+
+    reference = None
+    for factor in [1] + args.factors:
+        coarsening = SourceCoarsening(dims, factor) if factor > 1 else None
+
+        start = time.perf_counter()
+        grid = coarsening.coarsen_grid(source_grid) if coarsening else source_grid
+        factors = transformation_utils.find_mappings_from_source_to_target(grid, target_grid, target_grid_radius,
+                                                                           source_grid_min_L * factor,
+                                                                           source_grid_max_L * factor,
+                                                                           backend=args.backend)
+        source_indices, num_source_indices, nearest_source_index = factors
+        operator = RegridOperator(source_indices, num_source_indices, nearest_source_index, coarsening=coarsening)
+        factors_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = operator.apply_batch(source_field, args.operation)[0]
+        mapping_time = time.perf_counter() - start
+
+        if reference is None:
+            reference = result
+        both_valid = ~np.isnan(reference) & ~np.isnan(result)
+        diff = np.abs(reference[both_valid] - result[both_valid])
+        cells_lost = np.sum(~np.isnan(reference) & np.isnan(result))
+        print(f'{factor:>6} {grid.size:>13} {len(operator.source_indices):>10} {factors_time:>12.2f} {mapping_time:>12.3f} '
+              f'{np.mean(diff):>14.2e} {np.max(diff, initial=0):>13.2e} {cells_lost:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,9 @@ import os
 from datetime import datetime
 from typing import Iterable
 
-import requests
 from harvesters.enumeration.catds_enumerator import CATDSGranule, search_catds
 from harvesters.harvesterclasses import Granule, Harvester
+from utils.pipeline_utils import file_utils
 from utils.pipeline_utils.file_utils import get_date
 
 logger = logging.getLogger('pipeline')
@@ -53,9 +53,7 @@ class CATDS_Harvester(Harvester):
         
     
     def dl_file(self, src: str, dst: str):
-        r = requests.get(src)
-        r.raise_for_status()
-        open(dst, 'wb').write(r.content)
+        file_utils.download(src, dst)
 
 
 def harvester(config: dict) -> str:
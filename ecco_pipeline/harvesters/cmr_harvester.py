@@ -5,10 +5,10 @@ from datetime import datetime, timedelta
 from typing import Iterable
 
 import numpy as np
-import requests
 import xarray as xr
 from harvesters.enumeration.cmr_enumerator import CMRGranule, CMRQuery
 from harvesters.harvesterclasses import Granule, Harvester
+from utils.pipeline_utils import file_utils
 from utils.pipeline_utils.file_utils import get_date
 from utils.processing_utils.records import TimeBound
 
@@ -53,10 +53,7 @@ class CMR_Harvester(Harvester):
         logger.info(f'Downloading {self.ds_name} complete')
     
     def dl_file(self, src: str, dst: str):
-        r = requests.get(src)
-        r.raise_for_status()
-        with open(dst, 'wb') as f:
-            f.write(r.content)
+        file_utils.download(src, dst)
 
 
     def fetch_atl_daily(self):
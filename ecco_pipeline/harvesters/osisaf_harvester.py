@@ -3,9 +3,9 @@ import os
 from datetime import datetime
 from typing import Iterable
 
-import requests
 from harvesters.enumeration.osisaf_enumerator import OSISAFGranule, search_osisaf
 from harvesters.harvesterclasses import Granule, Harvester
+from utils.pipeline_utils import file_utils
 from utils.pipeline_utils.file_utils import get_date
 
 logger = logging.getLogger('pipeline')
@@ -52,9 +52,7 @@ class OSISAF_Harvester(Harvester):
         
     
     def dl_file(self, src: str, dst: str):
-        r = requests.get(src)
-        r.raise_for_status()
-        open(dst, 'wb').write(r.content)
+        file_utils.download(src, dst)
 
 
 def harvester(config: dict) -> str:
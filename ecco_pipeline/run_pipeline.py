@@ -9,8 +9,9 @@ from typing import List
 
 import yaml
 from aggregations.aggregation_factory import AgJobFactory
-from transformations.transformation_factory import TxJobFactory
+from transformations.transformation_factory import TxJobFactory, pregenerate_factors, worker_log_settings
 from utils.pipeline_utils import init_pipeline, log_config
+from utils.processing_utils.transformation_utils import NEIGHBOUR_SEARCH_BACKENDS
 
 
 def create_parser() -> argparse.ArgumentParser:
@@ -44,11 +45,28 @@ def create_parser() -> argparse.ArgumentParser:
     parser.add_argument('--wipe_factors', default=False, action='store_true', help='removes all stored factors')
 
     parser.add_argument('--wipe_logs', default=False, action='store_true', help='removes all prior log files')
+
+    parser.add_argument('--backfill_days', type=int, default=1, metavar='N',
+                        help='backfill mode: transforms granules sharing a source grid in batches of N days, \
+                            mapping each batch with a single application of the mapping factors')
+
+    parser.add_argument('--neighbour_search_backend', default=None, choices=NEIGHBOUR_SEARCH_BACKENDS,
+                        help='neighbour search backend used to generate mapping factors. Overrides the \
+                            neighbour_search_backend set in dataset configs')
+
+    parser.add_argument('--prefetch_depth', type=int, default=0, metavar='N',
+                        help='number of granules each transformation worker reads ahead of the one it is \
+                            transforming (default 0, no prefetching). Not used in backfill mode')
+
+    parser.add_argument('--factors_only', '--factors-only', default=False, action='store_true',
+                        help='generates the mapping factors of every harvested dataset for the grids in use \
+                            and exits. Use to warm up the factors cache before reprocessing')
     
     return parser
 
 
-def show_menu(grids_to_use: List[str], user_cpus: int):
+def show_menu(grids_to_use: List[str], user_cpus: int, backfill_days: int = 1, neighbour_search_backend: str = None,
+              prefetch_depth: int = 0):
     while True:
         print('\n===== ECCO PREPROCESSING PIPELINE =====')
         print('\n------------- OPTIONS -------------')
@@ -74,7 +92,7 @@ def show_menu(grids_to_use: List[str], user_cpus: int):
     if chosen_option == '1':
         for ds in datasets:
             run_harvester([ds])
-            run_transformation([ds], user_cpus, grids_to_use)
+            run_transformation([ds], user_cpus, grids_to_use, backfill_days, neighbour_search_backend, prefetch_depth)
             run_aggregation([ds], user_cpus, grids_to_use)
 
     # Run harvester
@@ -85,7 +103,7 @@ def show_menu(grids_to_use: List[str], user_cpus: int):
     elif chosen_option == '3':
         for ds in datasets:
             run_harvester([ds])
-            run_transformation([ds], user_cpus, grids_to_use)
+            run_transformation([ds], user_cpus, grids_to_use, backfill_days, neighbour_search_backend, prefetch_depth)
 
     # Manually enter dataset and pipeline step(s)
     elif chosen_option == '4':
@@ -126,12 +144,12 @@ def show_menu(grids_to_use: List[str], user_cpus: int):
         if 'harvest' in wanted_steps:
             run_harvester([wanted_ds])
         if 'transform' in wanted_steps:
-            run_transformation([wanted_ds], user_cpus, grids_to_use)
+            run_transformation([wanted_ds], user_cpus, grids_to_use, backfill_days, neighbour_search_backend, prefetch_depth)
         if 'aggregate' in wanted_steps:
             run_aggregation([wanted_ds], user_cpus, grids_to_use)
         if wanted_steps == 'all':
             run_harvester([wanted_ds])
-            run_transformation([wanted_ds], user_cpus, grids_to_use)
+            run_transformation([wanted_ds], user_cpus, grids_to_use, backfill_days, neighbour_search_backend, prefetch_depth)
             run_aggregation([wanted_ds], user_cpus, grids_to_use)
 
 
@@ -161,18 +179,45 @@ def run_harvester(datasets: List[str]):
             logger.exception(f'{ds} harvesting failed. {e}')
 
 
-def run_transformation(datasets: List[str], user_cpus: int, grids_to_use: List[str]):
+def run_transformation(datasets: List[str], user_cpus: int, grids_to_use: List[str], backfill_days: int = 1,
+                       neighbour_search_backend: str = None, prefetch_depth: int = 0):
     for ds in datasets:
         try:
             logger.info(f'Beginning transformations on {ds}')
             with open(Path(f'conf/ds_configs/{ds}.yaml'), 'r') as stream:
                 config = yaml.load(stream, yaml.Loader)
-            status = TxJobFactory(config, user_cpus, grids_to_use).start_factory()
+            if neighbour_search_backend:
+                config['neighbour_search_backend'] = neighbour_search_backend
+            status = TxJobFactory(config, user_cpus, grids_to_use, backfill_days, prefetch_depth).start_factory()
             logger.info(f'{ds} transformation complete. {status}')
         except:
             logger.exception(f'{ds} transformation failed.')
 
 
+def run_factors(datasets: List[str], user_cpus: int, grids_to_use: List[str], neighbour_search_backend: str = None):
+    '''
+    Generates the factors needed by all datasets in a single pool of jobs, running jobs
+    shared between datasets once
+    '''
+    factor_jobs = {}
+    for ds in datasets:
+        try:
+            with open(Path(f'conf/ds_configs/{ds}.yaml'), 'r') as stream:
+                config = yaml.load(stream, yaml.Loader)
+            if neighbour_search_backend:
+                config['neighbour_search_backend'] = neighbour_search_backend
+            ds_factor_jobs = TxJobFactory(config, user_cpus, grids_to_use).factor_jobs()
+            logger.info(f'{len(ds_factor_jobs)} sets of factors to generate for {ds}')
+            for key, job in ds_factor_jobs.items():
+                factor_jobs.setdefault(key, job)
+        except:
+            logger.exception(f'Unable to find factors to generate for {ds}.')
+
+    log_level, log_dir = worker_log_settings('factors')
+    generated = pregenerate_factors(factor_jobs, user_cpus, log_level, log_dir)
+    logger.info(f'Factor generation complete. {generated} of {len(factor_jobs)} sets of factors generated')
+
+
 def run_aggregation(datasets: List[str], user_cpus: int, grids_to_use: List[str]):
     for ds in datasets:
         try:
@@ -190,4 +235,8 @@ if __name__ == '__main__':
     args = parser.parse_args()
     grids_to_use, user_cpus = init_pipeline.init_pipeline(args)
     logger = logging.getLogger('pipeline')
-    show_menu(grids_to_use, user_cpus)
\ No newline at end of file
+    if args.factors_only:
+        datasets = sorted(os.path.splitext(os.path.basename(f))[0] for f in glob(f'conf/ds_configs/*.yaml'))
+        run_factors(datasets, user_cpus, grids_to_use, args.neighbour_search_backend)
+        exit()
+    show_menu(grids_to_use, user_cpus, args.backfill_days, args.neighbour_search_backend, args.prefetch_depth)
\ No newline at end of file
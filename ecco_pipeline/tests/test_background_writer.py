@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from utils.processing_utils.background_writer import BackgroundWriteError, BackgroundWriter
+
+
+class BackgroundWriterTestCase(unittest.TestCase):
+
+    def test_writes_in_order(self):
+        writer = BackgroundWriter()
+        written = []
+        for i in range(10):
+            writer.submit(written.append, i)
+        writer.flush()
+        self.assertEqual(written, list(range(10)))
+        writer.close()
+        self.assertFalse(writer.thread.is_alive())
+
+    def test_errors_reach_caller(self):
+        writer = BackgroundWriter()
+        written = []
+
+        def fail():
+            raise ValueError('disk full')
+
+        writer.submit(written.append, 1)
+        writer.submit(fail, description='granule_a grid_a transformations')
+        writer.submit(written.append, 2)
+        with self.assertRaises(BackgroundWriteError) as context:
+            writer.flush()
+        self.assertIn('granule_a grid_a transformations', str(context.exception))
+        self.assertIsInstance(context.exception.__cause__, ValueError)
+        # a failure doesn't stop the writes queued after it, and is only raised once
+        self.assertEqual(written, [1, 2])
+        writer.flush()
+        writer.close()
+
+    def test_queue_applies_backpressure(self):
+        writer = BackgroundWriter(max_queued=2)
+        release = threading.Event()
+        writer.submit(release.wait)
+        # wait for the blocked write to leave the queue
+        while not writer.queue.empty():
+            time.sleep(0.01)
+        writer.submit(time.sleep, 0)
+        writer.submit(time.sleep, 0)
+
+        submitter = threading.Thread(target=writer.submit, args=(time.sleep, 0))
+        submitter.start()
+        submitter.join(0.2)
+        self.assertTrue(submitter.is_alive())
+
+        release.set()
+        submitter.join(5)
+        self.assertFalse(submitter.is_alive())
+        writer.close()
+
+    def test_flushes_on_exit(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'written')
+            # the process exits with writes still queued
+            script = ('import time\n'
+                      'from utils.processing_utils import background_writer\n'
+                      'def write(i):\n'
+                      '    time.sleep(0.05)\n'
+                      f'    open({path!r}, "a").write(str(i))\n'
+                      'for i in range(5):\n'
+                      '    background_writer.get_writer().submit(write, i)\n')
+            subprocess.run([sys.executable, '-c', script], check=True, env={**os.environ, 'PYTHONPATH': os.getcwd()})
+            with open(path, 'r') as f:
+                self.assertEqual(f.read(), '01234')
+
+
+if __name__ == '__main__':
+    unittest.main()
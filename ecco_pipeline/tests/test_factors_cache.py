@@ -0,0 +1,95 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from utils.processing_utils import factors_cache, factors_io
+from utils.processing_utils.transformation_utils import RegridOperator
+
+from tests.test_transformation_utils import make_legacy_factors
+
+
+class FactorsCacheTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_dir = factors_cache.CACHE_DIR
+        factors_cache.CACHE_DIR = os.path.join(self.tempdir, 'factors_cache')
+        factors_cache._touched.clear()
+        self.header = {'ds_name': 'ds_a', 'transformation_version': 1.0, 'grid_name': 'grid', 'grid_checksum': 'abc',
+                       'data_res': 0.25, 'area_extent': [-180, -90, 180, 90], 'dims': [1440, 720],
+                       'proj_info': {'proj_id': 'EPSG:4326'}, 'neighbours': 100,
+                       'neighbour_search_backend': 'pyresample', 'source_coarsening': 1, 'n_source': 500}
+
+    def tearDown(self) -> None:
+        factors_cache.CACHE_DIR = self.cache_dir
+        shutil.rmtree(self.tempdir)
+
+    def add_factors(self, header: dict, ds_name: str) -> str:
+        key = factors_cache.factors_key(header)
+        operator = RegridOperator.from_factors(make_legacy_factors(500, 300))
+        factors_io.save_factors(operator, factors_cache.factors_path(key), header)
+        factors_cache.record(key, header, ds_name)
+        return key
+
+    def test_key(self):
+        key = factors_cache.factors_key(self.header)
+        self.assertEqual(key, factors_cache.factors_key({**self.header, 'ds_name': 'ds_b', 'transformation_version': 2.0,
+                                                         'chunk_size': 1000}))
+        for param, value in [('dims', [1440, 721]), ('grid_checksum', 'abd'), ('neighbours', 50), ('source_coarsening', 2)]:
+            with self.subTest(param=param):
+                self.assertNotEqual(key, factors_cache.factors_key({**self.header, param: value}))
+
+    def test_evicts_least_recently_used(self):
+        keys = [self.add_factors({**self.header, 'grid_checksum': str(i)}, 'ds_a') for i in range(3)]
+        factors_cache.touch(keys[1], self.header, 'ds_b')
+
+        with factors_cache.locked_index() as index:
+            self.assertEqual(index[keys[1]]['datasets'], ['ds_a'])
+            for key, last_used in zip(keys, ['2024-01-01', '2024-01-03', '2024-01-02']):
+                index[key]['last_used'] = last_used
+            entry_size = index[keys[0]]['size_bytes']
+            # the oldest entry is kept, so the next oldest goes
+            factors_cache.evict(index, 2.5 * entry_size, keep=[keys[0]])
+            self.assertEqual(sorted(index), sorted([keys[0], keys[1]]))
+        self.assertFalse(os.path.exists(factors_cache.factors_path(keys[2])))
+
+        factors_cache.clear()
+        with factors_cache.locked_index() as index:
+            self.assertEqual(index, {})
+        self.assertEqual(sorted(os.listdir(factors_cache.CACHE_DIR)), [factors_cache.INDEX_FILENAME,
+                                                                      factors_cache.INDEX_FILENAME + '.lock'])
+
+    def test_import_factors(self):
+        legacy_path = os.path.join(self.tempdir, 'grid_nh_v1.0_factors')
+        operator = RegridOperator.from_factors(make_legacy_factors(500, 300))
+        factors_io.save_factors(operator, legacy_path, self.header)
+
+        key = factors_cache.factors_key(self.header)
+        factors_cache.import_factors(legacy_path, key, self.header, 'ds_a')
+        self.assertFalse(os.path.exists(legacy_path))
+        loaded = factors_io.load_factors(factors_cache.factors_path(key))
+        self.assertEqual(loaded.n_target, operator.n_target)
+        with factors_cache.locked_index() as index:
+            self.assertEqual(index[key]['datasets'], ['ds_a'])
+
+    def test_import_legacy_factors(self):
+        legacy_path = os.path.join(self.tempdir, 'grid_nh_v1.0_factors')
+        header = {**self.header, 'n_target': 300}
+        for params, reused in [({}, True), ({'source_coarsening': 2}, False), ({'neighbours': 50}, False),
+                               ({'target_mask': {'variable': 'maskC', 'n_wet': 200, 'checksum': 'def'}}, False),
+                               ({'n_target': 301}, False)]:
+            with self.subTest(params=params):
+                with open(legacy_path, 'wb') as f:
+                    pickle.dump(make_legacy_factors(500, 300), f)
+                requested = {**header, **params}
+                key = factors_cache.factors_key(requested)
+                factors_cache.import_factors(legacy_path, key, requested, 'ds_a')
+                self.assertFalse(os.path.exists(legacy_path))
+                self.assertEqual(os.path.exists(factors_cache.factors_path(key)), reused)
+                factors_cache.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from utils.processing_utils import factors_io
+from utils.processing_utils.transformation_utils import RegridOperator, SourceCoarsening
+
+from tests.test_transformation_utils import make_legacy_factors
+
+
+def is_memory_mapped(array: np.ndarray) -> bool:
+    '''
+    Whether array is a view of a memory-mapped file, rather than a copy in memory
+    '''
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+class FactorsIOTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.mkdtemp()
+        self.factors_path = os.path.join(self.tempdir, 'grid_nh_v1.0_factors')
+        self.legacy_factors = make_legacy_factors(500, 300)
+        self.header = {'grid_name': 'grid', 'grid_checksum': 'abc', 'n_source': 500}
+        self.source_field = np.random.default_rng(3).normal(size=500)
+
+    def assert_same_mapping(self, a: RegridOperator, b: RegridOperator):
+        for operation in RegridOperator.operations:
+            np.testing.assert_array_equal(a.apply(self.source_field, operation), b.apply(self.source_field, operation))
+
+    def test_roundtrip(self):
+        operator = RegridOperator.from_factors(self.legacy_factors)
+        factors_io.save_factors(operator, self.factors_path, self.header)
+
+        self.assertFalse(factors_io.is_legacy_factors(self.factors_path))
+        header = factors_io.read_header(self.factors_path)
+        self.assertEqual(header['format_version'], factors_io.FACTORS_FORMAT_VERSION)
+        self.assertEqual(header['grid_checksum'], 'abc')
+        self.assertEqual(header['n_target'], 300)
+
+        loaded = factors_io.load_factors(self.factors_path)
+        self.assertEqual(loaded.source_indices.dtype, np.int32)
+        self.assertEqual(loaded.num_source_indices.dtype, np.float32)
+        self.assert_same_mapping(operator, loaded)
+
+    def test_memory_mapped(self):
+        factors_io.save_factors(RegridOperator.from_factors(self.legacy_factors), self.factors_path, self.header)
+        loaded = factors_io.load_factors(self.factors_path, mmap_mode='r')
+        # workers share the pages of the files, so no array may be converted to another dtype on load
+        for operator in [loaded, RegridOperator.from_factors(loaded)]:
+            for array in [operator.source_indices, operator.offsets, operator.num_source_indices,
+                          operator.nearest_source_index]:
+                self.assertTrue(is_memory_mapped(array))
+        self.assert_same_mapping(loaded, RegridOperator.from_factors(self.legacy_factors))
+
+    def test_convert_legacy(self):
+        with open(self.factors_path, 'wb') as f:
+            pickle.dump(self.legacy_factors, f)
+        self.assertTrue(factors_io.is_legacy_factors(self.factors_path))
+
+        converted = factors_io.convert_legacy_factors(self.factors_path, self.header)
+        self.assertTrue(os.path.isdir(self.factors_path))
+        header = factors_io.read_header(self.factors_path)
+        self.assertTrue(header['converted_from_pickle'])
+        # the pickle can't tell which grid it was made for
+        self.assertNotIn('grid_checksum', header)
+        self.assertEqual(header['source_coarsening'], 1)
+        self.assert_same_mapping(RegridOperator.from_factors(self.legacy_factors), converted)
+        self.assert_same_mapping(converted, factors_io.load_factors(self.factors_path))
+
+    def test_unsupported_version(self):
+        factors_io.save_factors(RegridOperator.from_factors(self.legacy_factors), self.factors_path, self.header)
+        header = factors_io.read_header(self.factors_path)
+        header['format_version'] = 0
+        with open(os.path.join(self.factors_path, factors_io.HEADER_FILENAME), 'w') as f:
+            json.dump(header, f)
+        with self.assertRaises(factors_io.FactorsFormatError):
+            factors_io.load_factors(self.factors_path)
+
+    def test_source_coarsening(self):
+        # 500 source cells coarsened by 2 x 2 blocks of a 25 x 20 grid leave 130 coarse cells
+        operator = RegridOperator.from_factors(make_legacy_factors(130, 300))
+        factors_io.save_factors(operator, self.factors_path, {**self.header, 'dims': [25, 20], 'source_coarsening': 2})
+
+        loaded = factors_io.load_factors(self.factors_path)
+        self.assertEqual(loaded.coarsening, SourceCoarsening([25, 20], 2))
+        self.assertEqual(loaded.apply(self.source_field).shape, (300,))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tempdir)
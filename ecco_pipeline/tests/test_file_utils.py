@@ -0,0 +1,45 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.pipeline_utils import file_utils
+
+
+class FileUtilsTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.mkdtemp()
+        self.data = os.urandom(3 * 1024**2 + 7)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tempdir)
+
+    def test_md5(self):
+        fname = os.path.join(self.tempdir, 'file')
+        with open(fname, 'wb') as f:
+            f.write(self.data)
+        for buffer_size in [4096, 1024**2, 8 * 1024**2]:
+            with self.subTest(buffer_size=buffer_size):
+                self.assertEqual(file_utils.md5(fname, buffer_size), hashlib.md5(self.data).hexdigest())
+
+    def test_hashing_writer(self):
+        fname = os.path.join(self.tempdir, 'file')
+        with file_utils.HashingWriter(fname) as f:
+            for i in range(0, len(self.data), 1024**2):
+                f.write(self.data[i:i + 1024**2])
+        self.assertIn(os.path.realpath(fname), file_utils._written_checksums)
+        self.assertEqual(file_utils.md5(fname), hashlib.md5(self.data).hexdigest())
+        self.assertNotIn(os.path.realpath(fname), file_utils._written_checksums)
+
+        # a file changed after it was written is read again
+        with file_utils.HashingWriter(fname) as f:
+            f.write(self.data)
+        with open(fname, 'ab') as f:
+            f.write(b'more')
+        self.assertEqual(file_utils.md5(fname), hashlib.md5(self.data + b'more').hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+import numpy as np
+import xarray as xr
+from utils.processing_utils.grid_cache import LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        # each dataset is 800 bytes, so the cache holds two
+        cache = LRUCache(max_bytes=1600)
+        datasets = {key: xr.Dataset({'XC': ('i', np.zeros(100))}) for key in 'abc'}
+        loads = []
+
+        def load(key):
+            loads.append(key)
+            return datasets[key]
+
+        for key in ['a', 'b', 'a', 'c', 'a', 'b']:
+            self.assertIs(cache.get(key, lambda: load(key)), datasets[key])
+        # b was least recently used when c was added
+        self.assertEqual(loads, ['a', 'b', 'c', 'b'])
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 4)
+        self.assertEqual(list(cache.entries), ['a', 'b'])
+        self.assertEqual(cache.size, 1600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,495 @@
+import os
+import shutil
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+import pyresample as pr
+import xarray as xr
+from transformations import grid_transformation
+from transformations.grid_transformation import Transformation
+from transformations.transformation_factory import TxJobFactory
+from utils.pipeline_utils import solr_utils
+from utils.processing_utils import background_writer, ds_functions, factors_cache, grid_cache, transformation_utils
+
+from tests.test_factors_io import is_memory_mapped
+
+'''
+Transformations of a synthetic 1 degree global source to small regional model grids, checked
+against the one target cell at a time reference implementation (_transform_to_target_grid_loop)
+applied with factors searched directly over the full source grid.
+'''
+
+SOURCE_CONFIG = {
+    'ds_name': 'synthetic',
+    'start': '19800101T00:00:00Z',
+    'end': 'NOW',
+    'data_time_scale': 'daily',
+    'fields': [{'name': name, 'long_name': name, 'standard_name': name, 'units': '1',
+                'pre_transformations': [], 'post_transformations': []} for name in ['field_a', 'field_b']],
+    'original_dataset_title': 'Synthetic',
+    'original_dataset_short_name': 'synthetic',
+    'original_dataset_url': '',
+    'original_dataset_reference': '',
+    'original_dataset_doi': '',
+    't_version': 1.0,
+    'data_res': 1,
+    'area_extent': [-180, 90, 180, -90],
+    'dims': [360, 180],
+    'proj_info': {'area_id': 'longlat', 'area_name': 'Plate Carree', 'proj_id': 'EPSG:4326',
+                  'proj4_args': '+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs'},
+    'notes': ''
+}
+
+
+def make_model_grid(name: str, lon_range: tuple, lat_range: tuple, mask: bool = False) -> xr.Dataset:
+    '''
+    Regional lat-lon model grid with 3 degree cells. With mask, cells west of the middle of the grid are dry.
+    '''
+    XC, YC = np.meshgrid(np.arange(*lon_range, 3.), np.arange(*lat_range, 3.))
+    grid_ds = xr.Dataset({'XC': (('j', 'i'), XC), 'YC': (('j', 'i'), YC), 'RAD': (('j', 'i'), np.full(XC.shape, 300e3))},
+                         attrs={'name': name, 'type': 'latlon'})
+    if mask:
+        grid_ds['maskC'] = (('k', 'j', 'i'), np.stack([XC > np.median(XC), np.zeros(XC.shape)]).astype(float))
+    return grid_ds
+
+
+def make_granule(path: str, date: str, seed: int = 0):
+    '''
+    Source granule of smooth fields with missing values on the source grid of SOURCE_CONFIG
+    '''
+    rng = np.random.default_rng(seed)
+    lons, lats = np.meshgrid(np.arange(-179.5, 180), np.arange(89.5, -90, -1))
+    data_vars = {}
+    for i, field in enumerate(SOURCE_CONFIG['fields']):
+        values = np.cos(np.deg2rad(lats)) * np.sin(np.deg2rad((i + 2) * lons)) + 0.1 * rng.normal(size=lons.shape)
+        values[rng.random(lons.shape) < 0.1] = np.nan
+        data_vars[field['name']] = (('time', 'lat', 'lon'), values[np.newaxis])
+    ds = xr.Dataset(data_vars, coords={'time': [np.datetime64(date[:10], 'ns')], 'lat': lats[:, 0], 'lon': lons[0]})
+    ds.to_netcdf(path)
+
+
+def reference_transformation(T: Transformation, grid_ds: xr.Dataset, source_ds: xr.Dataset, field_name: str,
+                             coarsening: int = 1) -> np.ndarray:
+    '''
+    field_name of source_ds mapped to grid_ds by _transform_to_target_grid_loop, with factors searched
+    with pyresample over every target cell and the whole (optionally block averaged) source grid
+    '''
+    source_grid_min_L, source_grid_max_L, source_grid = transformation_utils.generalized_grid_product(
+        T.data_res, T.area_extent, T.dims, T.proj_info)
+    source_field = source_ds[field_name].values[0]
+    if coarsening > 1:
+        source_grid = transformation_utils.SourceCoarsening(T.dims, coarsening).coarsen_grid(source_grid)
+        source_grid_min_L *= coarsening
+        source_grid_max_L *= coarsening
+        rows, cols = source_field.shape
+        source_field = source_field.reshape(rows // coarsening, coarsening, cols // coarsening, coarsening).mean((1, 3))
+
+    target_grid = pr.geometry.SwathDefinition(lons=grid_ds.XC.values.ravel(), lats=grid_ds.YC.values.ravel())
+    source_indices, num_source_indices, nearest_source_index = transformation_utils.find_mappings_from_source_to_target(
+        source_grid, target_grid, grid_ds.RAD.values.ravel(), source_grid_min_L, source_grid_max_L)
+
+    # per target cell layout of the factors made by earlier versions
+    offsets = np.concatenate([[0], np.cumsum(num_source_indices)]).astype(int)
+    factors = ({i: source_indices[offsets[i]:offsets[i + 1]] for i in range(len(num_source_indices))},
+               list(num_source_indices),
+               {i: nearest_source_index[i] for i in range(len(nearest_source_index))})
+    return transformation_utils._transform_to_target_grid_loop(*factors, source_field, grid_ds.XC.shape, T.mapping_operation)
+
+
+def solr_response() -> types.SimpleNamespace:
+    return types.SimpleNamespace(status_code=200, raise_for_status=lambda: None)
+
+
+def solr_query(fq: list) -> list:
+    '''
+    Solr without any transformation entries, for a harvested granule
+    '''
+    if 'type_s:granule' in fq:
+        return [{'checksum_s': 'abc'}]
+    return []
+
+
+class SyntheticGranulesTestCase(unittest.TestCase):
+    '''
+    Synthetic granules and model grids, with Solr mocked out, and outputs and factors written to a
+    temporary directory
+    '''
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.mkdtemp()
+        self.grids = {grid_ds.name: grid_ds for grid_ds in [make_model_grid('regional_a', (10, 50), (-20, 20)),
+                                                            make_model_grid('regional_b', (-40, -10), (30, 60)),
+                                                            make_model_grid('masked', (10, 50), (-20, 20), mask=True)]}
+        self.granules = []
+        for day in range(1, 4):
+            path = os.path.join(self.tempdir, f'synthetic_2020010{day}.nc')
+            make_granule(path, f'2020-01-0{day}', seed=day)
+            self.granules.append((path, f'2020-01-0{day}T00:00:00Z'))
+
+        self.cache = grid_cache.cache
+        grid_cache.cache = grid_cache.LRUCache(self.cache.max_bytes)
+        for grid_name, grid_ds in self.grids.items():
+            grid_cache.cache.get(('grid', grid_name), lambda: grid_ds)
+
+        self.patches = [mock.patch.object(grid_transformation, 'OUTPUT_DIR', self.tempdir),
+                        mock.patch.object(factors_cache, 'CACHE_DIR', os.path.join(self.tempdir, 'factors_cache')),
+                        mock.patch.object(grid_transformation.solr_utils, 'solr_query', side_effect=solr_query)]
+        self.solr_update = mock.patch.object(grid_transformation.solr_utils, 'solr_update',
+                                             return_value=solr_response()).start()
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        mock.patch.stopall()
+        grid_cache.cache = self.cache
+        shutil.rmtree(self.tempdir)
+
+    def config(self, **options) -> dict:
+        return {**SOURCE_CONFIG, **options}
+
+    def tx_jobs(self, config: dict, grid_names: list) -> dict:
+        fields = Transformation(config, self.granules[0][0], self.granules[0][1]).fields
+        return {grid_name: fields for grid_name in grid_names}
+
+    def transformed(self, config: dict, grid_name: str, field_name: str, source_file_path: str) -> xr.Dataset:
+        file_name = os.path.splitext(os.path.basename(source_file_path))[0]
+        output_path = f'{self.tempdir}/{config["ds_name"]}/transformed_products/{grid_name}/transformed'
+        if config.get('consolidate_transformed_fields'):
+            return xr.open_dataset(f'{output_path}/{grid_name}_{file_name}.nc')
+        return xr.open_dataset(f'{output_path}/{field_name}/{grid_name}_{field_name}_{file_name}.nc')
+
+    def outputs(self, output_dir: str) -> dict:
+        '''
+        Every output under output_dir, keyed by path relative to output_dir
+        '''
+        outputs = {}
+        for root, _, files in os.walk(output_dir):
+            for file in files:
+                with xr.open_dataset(os.path.join(root, file)) as ds:
+                    outputs[os.path.relpath(os.path.join(root, file), output_dir)] = ds.load()
+        return outputs
+
+    def assert_identical_outputs(self, outputs: dict, expected_outputs: dict):
+        self.assertEqual(sorted(outputs), sorted(expected_outputs))
+        for path, ds in expected_outputs.items():
+            with self.subTest(path=path):
+                xr.testing.assert_identical(outputs[path], ds)
+
+    def factors_params(self) -> list:
+        '''
+        Parameters of each set of factors generated
+        '''
+        with factors_cache.locked_index() as index:
+            return [entry['params'] for entry in index.values()]
+
+    def assert_matches_reference(self, config: dict, grid_names: list, source_file_path: str, coarsening: int = 1,
+                                 dry: np.ndarray = None):
+        T = Transformation(config, source_file_path, '')
+        with xr.open_dataset(source_file_path) as source_ds:
+            for grid_name in grid_names:
+                for field in T.fields:
+                    with self.subTest(grid=grid_name, field=field.name, file=os.path.basename(source_file_path)):
+                        expected = reference_transformation(T, self.grids[grid_name], source_ds, field.name, coarsening)
+                        if dry is not None:
+                            expected[dry] = np.nan
+                        with self.transformed(config, grid_name, field.name, source_file_path) as transformed_ds:
+                            result = transformed_ds[f'{field.name}_interpolated_to_{grid_name}'].values[0]
+                        self.assertTrue(np.isfinite(expected).any())
+                        np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+
+class TransformationTestCase(SyntheticGranulesTestCase):
+
+    def test_source_window(self):
+        config = self.config()
+        grid_names = ['regional_a', 'regional_b']
+        source_file_path, granule_date = self.granules[0]
+
+        T, ds, _, operators = grid_transformation.load_granule(source_file_path, self.tx_jobs(config, grid_names),
+                                                              config, granule_date)
+        # only the rows and columns spanning both grids are read
+        self.assertLess(ds.sizes['lat'], 180)
+        self.assertLess(ds.sizes['lon'], 360)
+        self.assertEqual({operator.source_window for operator in operators.values()},
+                         {(0, ds.sizes['lat'], 0, ds.sizes['lon'])})
+
+        grid_transformation.transform(source_file_path, self.tx_jobs(config, grid_names), config, granule_date)
+        self.assert_matches_reference(config, grid_names, source_file_path)
+
+    def test_mask_dry_target_cells(self):
+        config = self.config(mask_dry_target_cells=True)
+        source_file_path, granule_date = self.granules[0]
+        grid_transformation.transform(source_file_path, self.tx_jobs(config, ['masked']), config, granule_date)
+
+        dry = self.grids['masked'].maskC.values[0] == 0
+        self.assert_matches_reference(config, ['masked'], source_file_path, dry=dry)
+        self.assertEqual([params['target_mask']['n_wet'] for params in self.factors_params()], [int((~dry).sum())])
+
+    def test_source_coarsening(self):
+        # 300 km target cell radii span 2.7 cells of the 1 degree source grid
+        config = self.config(source_coarsening_threshold=1)
+        source_file_path, granule_date = self.granules[0]
+        grid_transformation.transform(source_file_path, self.tx_jobs(config, ['regional_a']), config, granule_date)
+        self.assertEqual([params['source_coarsening'] for params in self.factors_params()], [2])
+        self.assert_matches_reference(config, ['regional_a'], source_file_path, coarsening=2)
+
+    def test_kdtree_backend(self):
+        config = self.config(neighbour_search_backend='kdtree')
+        source_file_path, granule_date = self.granules[0]
+        grid_transformation.transform(source_file_path, self.tx_jobs(config, ['regional_a']), config, granule_date)
+        self.assertEqual([params['neighbour_search_backend'] for params in self.factors_params()], ['kdtree'])
+        self.assert_matches_reference(config, ['regional_a'], source_file_path)
+
+    def test_stacked_operator_cached(self):
+        config = self.config()
+        grid_names = ['regional_a', 'regional_b']
+        stack = transformation_utils.RegridOperator.stack
+        with mock.patch.object(transformation_utils.RegridOperator, 'stack', side_effect=stack) as stack_mock:
+            for source_file_path, granule_date in self.granules:
+                grid_transformation.transform(source_file_path, self.tx_jobs(config, grid_names), config, granule_date)
+        # the operators of both grids are stacked once for all granules
+        self.assertEqual(stack_mock.call_count, 1)
+        self.assertEqual(len([key for key in grid_cache.cache.entries if key[0] == 'stacked']), 1)
+        # the last granule is mapped with the cached operator
+        for source_file_path, _ in [self.granules[0], self.granules[-1]]:
+            self.assert_matches_reference(config, grid_names, source_file_path)
+
+    def test_cached_operators_memory_mapped(self):
+        config = self.config()
+        source_file_path, granule_date = self.granules[0]
+        grid_transformation.transform(source_file_path, self.tx_jobs(config, ['regional_a']), config, granule_date)
+        # windowed operators hold new source indices, but the operator loaded from the factors cache is mapped
+        T = Transformation(config, source_file_path, granule_date)
+        key = ('factors', T.ds_name, 'regional_a', T.hemi, T.transformation_version)
+        operators = [value for entry_key, (value, _) in grid_cache.cache.entries.items() if entry_key == key]
+        self.assertEqual(len(operators), 1)
+        for array in [operators[0].source_indices, operators[0].offsets, operators[0].num_source_indices,
+                      operators[0].nearest_source_index]:
+            self.assertTrue(is_memory_mapped(array))
+
+    def test_consolidated_output(self):
+        config = self.config(consolidate_transformed_fields=True)
+        grid_names = ['regional_a', 'regional_b']
+        source_file_path, granule_date = self.granules[0]
+        grid_transformation.transform(source_file_path, self.tx_jobs(config, grid_names), config, granule_date)
+        self.assert_matches_reference(config, grid_names, source_file_path)
+
+        updates = [update for call in self.solr_update.call_args_list for update in call.args[0]]
+        variables = {update['transformation_variable_s']['set'] for update in updates if 'transformation_variable_s' in update}
+        self.assertEqual(variables, {f'{field["name"]}_interpolated_to_{grid_name}'
+                                     for field in config['fields'] for grid_name in grid_names})
+
+
+class LoadFileTestCase(SyntheticGranulesTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        # a granule with variables beyond its fields
+        self.source_file_path = self.granules[0][0]
+        with xr.open_dataset(self.source_file_path) as ds:
+            ds = ds.load()
+        for var in ['sea_ice_fraction', 'analysed_sst', 'quality_flag']:
+            ds[var] = ds['field_a'].copy()
+        ds['time_bnds'] = (('time', 'nv'), np.array([[ds.time.values[0], ds.time.values[0]]]))
+        ds.to_netcdf(self.source_file_path)
+
+    def load_file(self, pre_transformations: list) -> xr.Dataset:
+        config = self.config(time_bounds_var='time_bnds')
+        config['fields'] = [{**config['fields'][0], 'pre_transformations': pre_transformations}, config['fields'][1]]
+        T = Transformation(config, self.source_file_path, self.granules[0][1])
+        return T.load_file(self.source_file_path)
+
+    def test_drops_unused_variables(self):
+        with self.load_file([]) as ds:
+            self.assertEqual(set(ds.variables), {'field_a', 'field_b', 'time', 'time_bnds', 'lat', 'lon'})
+
+    def test_keeps_variables_read(self):
+        with self.load_file(['AVHRR_remove_ice_or_near_ice']) as ds:
+            self.assertEqual(set(ds.variables), {'field_a', 'field_b', 'time', 'time_bnds', 'lat', 'lon',
+                                                 'sea_ice_fraction', 'analysed_sst'})
+
+    def test_loads_everything_when_undeclared(self):
+        with mock.patch.object(ds_functions.PretransformationFuncs, 'undeclared', lambda self, ds: ds, create=True):
+            with self.load_file(['undeclared']) as ds:
+                self.assertIn('quality_flag', ds.variables)
+                self.assertIn('sea_ice_fraction', ds.variables)
+
+class BackfillTestCase(SyntheticGranulesTestCase):
+
+    def hemisphere_config(self) -> dict:
+        '''
+        Config of a dataset split into hemispheres, both on the source grid of SOURCE_CONFIG
+        '''
+        config = self.config(hemi_pattern={'north': '_nh_', 'south': '_sh_'})
+        for hemi in ['_nh', '_sh']:
+            for param in ['area_extent', 'dims', 'proj_info']:
+                config[f'{param}{hemi}'] = config[param]
+        return config
+
+    def assert_batch_matches_transform(self, config: dict, granules: list, grid_names: list):
+        tx_jobs = self.tx_jobs(config, grid_names)
+        with mock.patch.object(grid_transformation, 'OUTPUT_DIR', os.path.join(self.tempdir, 'granules')):
+            for source_file_path, granule_date in granules:
+                grid_transformation.transform(source_file_path, tx_jobs, config, granule_date)
+        with mock.patch.object(grid_transformation, 'OUTPUT_DIR', os.path.join(self.tempdir, 'batch')):
+            grid_transformation.transform_batch(granules, tx_jobs, config)
+
+        expected_outputs = self.outputs(os.path.join(self.tempdir, 'granules'))
+        self.assertEqual(len(expected_outputs), len(granules) * len(grid_names) * len(config['fields']))
+        self.assert_identical_outputs(self.outputs(os.path.join(self.tempdir, 'batch')), expected_outputs)
+
+    def test_batch_matches_transform(self):
+        self.assert_batch_matches_transform(self.config(), self.granules, ['regional_a', 'regional_b'])
+
+    def test_mixed_granules(self):
+        # the fields of one granule have different dimensions, so it can't be read in a window of the source grid
+        mixed_path = self.granules[1][0]
+        with xr.open_dataset(mixed_path) as ds:
+            ds = ds.load()
+        ds['field_b'] = (('time', 'y', 'x'), ds['field_b'].values)
+        ds.to_netcdf(mixed_path)
+
+        config = self.config()
+        T = Transformation(config, mixed_path, self.granules[1][1])
+        with xr.open_dataset(mixed_path) as ds:
+            self.assertIsNone(T.source_dims(ds))
+        self.assert_batch_matches_transform(config, self.granules, ['regional_a', 'regional_b'])
+
+    def test_hemispheres(self):
+        granules = []
+        for hemi, day in [('nh', 1), ('sh', 1), ('nh', 2)]:
+            path = os.path.join(self.tempdir, f'synthetic_{hemi}_2020010{day}.nc')
+            make_granule(path, f'2020-01-0{day}', seed=day)
+            granules.append((path, f'2020-01-0{day}T00:00:00Z'))
+        config = self.hemisphere_config()
+
+        # a batch spanning hemispheres is mapped a hemisphere at a time
+        self.assert_batch_matches_transform(config, granules, ['regional_a'])
+
+        factory = TxJobFactory(config, grids_to_use=['regional_a'], backfill_days=3)
+        tx_jobs = self.tx_jobs(config, ['regional_a'])
+        batches = factory.batch_jobs([({'pre_transformation_file_path_s': path, 'date_s': date}, tx_jobs)
+                                      for path, date in granules])
+        self.assertEqual([[os.path.basename(granule['pre_transformation_file_path_s']) for granule in batch]
+                          for batch, _ in batches],
+                         [['synthetic_nh_20200101.nc', 'synthetic_nh_20200102.nc'], ['synthetic_sh_20200101.nc']])
+
+    def test_granule_errors(self):
+        config = self.config()
+        tx_jobs = self.tx_jobs(config, ['regional_a'])
+        failed_path = self.granules[1][0]
+        prepopulate_solr = Transformation.prepopulate_solr
+
+        def fail_granule(T, source_file_path, grid_names):
+            if source_file_path == failed_path:
+                raise ValueError('Solr unavailable')
+            prepopulate_solr(T, source_file_path, grid_names)
+
+        with mock.patch.object(Transformation, 'prepopulate_solr', fail_granule):
+            grid_transformation.transform_batch(self.granules, tx_jobs, config)
+
+        # the other granules of the batch are transformed
+        outputs = self.outputs(os.path.join(self.tempdir, config['ds_name']))
+        transformed = [os.path.basename(path) for path, _ in self.granules
+                       if any(output.endswith(os.path.basename(path)) for output in outputs)]
+        self.assertEqual(transformed, ['synthetic_20200101.nc', 'synthetic_20200103.nc'])
+        self.assertEqual(len(outputs), 4)
+
+
+class SolrUpdatesTestCase(SyntheticGranulesTestCase):
+
+    def assert_granule_updates(self, calls: list, grid_names: list, updated_grid_names: list = None):
+        '''
+        Asserts a granule's entries are prepopulated and then updated, each in a single soft committed request.
+        Only the entries of updated_grid_names (all of grid_names by default) are updated.
+        '''
+        prepopulate_call, update_call = calls
+        for call in calls:
+            self.assertTrue(call.kwargs['soft_commit'])
+        prepopulated = {(doc['grid_name_s'], doc['field_s']): doc['id'] for doc in prepopulate_call.args[0]}
+        self.assertEqual(len(prepopulated), len(grid_names) * len(SOURCE_CONFIG['fields']))
+
+        updates = {update['id']: update for update in update_call.args[0]}
+        updated_grid_names = updated_grid_names or grid_names
+        expected_ids = {doc_id for (grid_name, _), doc_id in prepopulated.items() if grid_name in updated_grid_names}
+        self.assertEqual(set(updates), expected_ids)
+        for update in updates.values():
+            self.assertFalse(update['transformation_in_progress_b']['set'])
+            self.assertTrue(update['success_b']['set'])
+
+    def test_one_update_per_granule(self):
+        config = self.config()
+        grid_names = ['regional_a', 'regional_b']
+        source_file_path, granule_date = self.granules[0]
+        grid_transformation.transform(source_file_path, self.tx_jobs(config, grid_names), config, granule_date)
+        self.assert_granule_updates(self.solr_update.call_args_list, grid_names)
+
+    def test_one_update_per_granule_in_batch(self):
+        config = self.config()
+        grid_names = ['regional_a', 'regional_b']
+        grid_transformation.transform_batch(self.granules, self.tx_jobs(config, grid_names), config)
+
+        calls = self.solr_update.call_args_list
+        self.assertEqual(len(calls), 2 * len(self.granules))
+        for source_file_path, _ in self.granules:
+            granule_calls = [call for call in calls
+                             if call.args[0][0].get('pre_transformation_file_path_s') == source_file_path]
+            self.assertEqual(len(granule_calls), 1)
+            # the granule's update names the ids it was prepopulated with
+            ids = {doc['id'] for doc in granule_calls[0].args[0]}
+            granule_calls += [call for call in calls if call not in granule_calls
+                              and {update['id'] for update in call.args[0]} == ids]
+            self.assert_granule_updates(granule_calls, grid_names)
+
+    def test_failed_transformation_updates_saved_entries(self):
+        config = self.config()
+        grid_names = ['regional_a', 'regional_b']
+        source_file_path, granule_date = self.granules[0]
+        make_records = Transformation.make_records
+
+        def fail_grid(T, grid_ds, *args):
+            if grid_ds.name == 'regional_b':
+                raise ValueError('mapping failed')
+            return make_records(T, grid_ds, *args)
+
+        with mock.patch.object(Transformation, 'make_records', fail_grid):
+            with self.assertRaises(ValueError):
+                grid_transformation.transform(source_file_path, self.tx_jobs(config, grid_names), config, granule_date)
+        background_writer.get_writer().flush()
+
+        # the regional_a outputs queued before the failure still have their entries updated
+        self.assert_granule_updates(self.solr_update.call_args_list, grid_names, ['regional_a'])
+
+    def test_failed_save_updates_other_entries(self):
+        config = self.config()
+        grid_names = ['regional_a', 'regional_b']
+        source_file_path, granule_date = self.granules[0]
+        save_netcdf = grid_transformation.records.save_netcdf
+
+        def fail_grid(ds, filename, *args):
+            if 'regional_b' in filename:
+                raise OSError('disk full')
+            return save_netcdf(ds, filename, *args)
+
+        with mock.patch.object(grid_transformation.records, 'save_netcdf', fail_grid):
+            grid_transformation.transform(source_file_path, self.tx_jobs(config, grid_names), config, granule_date)
+        self.assert_granule_updates(self.solr_update.call_args_list, grid_names, ['regional_a'])
+
+
+
+class SolrUpdateTestCase(unittest.TestCase):
+
+    def test_soft_commit(self):
+        with mock.patch.object(solr_utils.requests, 'post') as post:
+            solr_utils.solr_update([{'id': 'a'}], soft_commit=True)
+            solr_utils.solr_update([{'id': 'a'}])
+        urls = [call.args[0] for call in post.call_args_list]
+        self.assertTrue(urls[0].endswith('/update?softCommit=true'))
+        self.assertTrue(urls[1].endswith('/update?commit=true'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+import numpy as np
+from utils.pipeline_utils import memory_utils
+
+
+class ProcessMemoryTestCase(unittest.TestCase):
+
+    def test_process_memory(self):
+        usage = memory_utils.process_memory()
+        self.assertGreater(usage['peak_rss'], 0)
+        if 'rss' not in usage:
+            # only peak usage is available outside Linux
+            return
+        self.assertLessEqual(usage['rss'], usage['peak_rss'])
+
+        # touching 200 MB raises the resident set size, and its peak, by about as much
+        data = np.ones(200 * 1024**2 // 8)
+        grown_usage = memory_utils.process_memory()
+        self.assertGreaterEqual(grown_usage['rss'], usage['rss'] + 150)
+        self.assertGreaterEqual(grown_usage['peak_rss'], grown_usage['rss'])
+        del data
+
+    def test_format_memory(self):
+        self.assertEqual(memory_utils.format_memory({'rss': 100.4, 'peak_rss': 200.6}), 'rss 100 MB, peak_rss 201 MB')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import netCDF4 as nc4
+import numpy as np
+import xarray as xr
+from aggregations import aggregation
+from transformations.grid_transformation import Transformation
+from utils.processing_utils import records
+
+from tests.test_grid_transformation import SOURCE_CONFIG
+
+
+class EncodingProfilesTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.mkdtemp()
+        self.record = xr.DataArray(np.arange(40, dtype=np.float32).reshape(1, 5, 8), dims=('time', 'j', 'i'),
+                                   coords={'time': [np.datetime64('2020-01-01', 'ns')]}, name='field')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tempdir)
+
+    def test_profiles(self):
+        expected_encodings = {
+            'fast': ({'zlib': False, 'shuffle': False}, 'contiguous'),
+            'balanced': ({'zlib': True, 'complevel': 1, 'shuffle': True}, [1, 5, 8]),
+            'archival': ({'zlib': True, 'complevel': 5, 'shuffle': True}, None),
+        }
+        self.assertEqual(set(expected_encodings), set(records.ENCODING_PROFILES))
+        for profile, (expected_filters, expected_chunking) in expected_encodings.items():
+            with self.subTest(profile=profile):
+                records.save_netcdf(self.record, f'{profile}.nc', self.tempdir, profile)
+                with nc4.Dataset(os.path.join(self.tempdir, f'{profile}.nc')) as nc_ds:
+                    var = nc_ds['field']
+                    filters = var.filters()
+                    for setting, value in expected_filters.items():
+                        self.assertEqual(filters[setting], value)
+                    if expected_chunking:
+                        self.assertEqual(var.chunking(), expected_chunking)
+                    else:
+                        # netCDF default chunking
+                        self.assertIsInstance(var.chunking(), list)
+                    np.testing.assert_array_equal(var[:], self.record.values)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            records.save_netcdf(self.record, 'unknown.nc', self.tempdir, 'lossy')
+
+    def test_dataset_override(self):
+        T = Transformation(SOURCE_CONFIG, 'synthetic_20200101.nc', '2020-01-01T00:00:00Z')
+        self.assertEqual(T.encoding_profile, records.TRANSFORMATION_ENCODING_PROFILE)
+        T = Transformation({**SOURCE_CONFIG, 'transformation_encoding_profile': 'fast'}, 'synthetic_20200101.nc',
+                           '2020-01-01T00:00:00Z')
+        self.assertEqual(T.encoding_profile, 'fast')
+
+        with mock.patch.object(aggregation.solr_utils, 'solr_query', return_value=[{'start_date_dt': '2020-01-01'}]):
+            A = aggregation.Aggregation({**SOURCE_CONFIG, 'aggregation_encoding_profile': 'balanced'},
+                                        {'grid_name_s': 'regional_a'}, '2020', T.fields[0])
+        self.assertEqual(A.encoding_profile, 'balanced')
+
+
+if __name__ == '__main__':
+    unittest.main()
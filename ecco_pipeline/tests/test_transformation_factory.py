@@ -0,0 +1,86 @@
+import os
+import unittest
+from unittest import mock
+
+import yaml
+from transformations import grid_transformation, transformation_factory
+
+from tests.test_grid_transformation import SyntheticGranulesTestCase
+
+
+class PregenerateFactorsTestCase(unittest.TestCase):
+
+    def test_counts_generated_factors(self):
+        with open('conf/ds_configs/AVHRR_OI-NCEI-L4-GLOB-v2.1.yaml', 'r') as stream:
+            config = yaml.load(stream, yaml.Loader)
+        factor_jobs = {key: (config, f'granule_{key}.nc', 'ECCO_llc90') for key in 'abc'}
+        make_factors_calls = []
+
+        def make_factors(T, grid_ds, processes=1, workers=-1):
+            make_factors_calls.append((processes, workers))
+            if len(make_factors_calls) == 2:
+                raise ValueError('search failed')
+
+        with mock.patch.object(transformation_factory.log_config, 'mp_logging'), \
+                mock.patch.object(transformation_factory.xr, 'open_dataset'), \
+                mock.patch.object(transformation_factory.Transformation, 'make_factors', make_factors):
+            generated = transformation_factory.pregenerate_factors(factor_jobs, 1, 'INFO', 'logs')
+
+        self.assertEqual(generated, 2)
+        # a single cpu is never oversubscribed by kdtree queries
+        self.assertEqual(make_factors_calls, [(1, 1)] * 3)
+
+
+class PrefetchTestCase(SyntheticGranulesTestCase):
+
+    def run_jobs(self, output_dir: str, prefetch_depth: int) -> mock.MagicMock:
+        '''
+        Transforms the granules one job at a time, or in a sequence prefetching prefetch_depth granules.
+        Returns the workers' logger.
+        '''
+        config = self.config()
+        tx_jobs = self.tx_jobs(config, ['regional_a', 'regional_b'])
+        granules = [{'pre_transformation_file_path_s': path, 'file_size_l': os.path.getsize(path), 'date_s': date}
+                    for path, date in self.granules]
+        with mock.patch.object(grid_transformation, 'OUTPUT_DIR', output_dir), \
+                mock.patch.object(transformation_factory.log_config, 'mp_logging') as mp_logging:
+            if prefetch_depth:
+                transformation_factory.multiprocess_prefetched_transformation(
+                    config, [(granule, tx_jobs) for granule in granules], 'INFO', 'logs', prefetch_depth)
+            else:
+                for granule in granules:
+                    transformation_factory.multiprocess_transformation(config, granule, tx_jobs, 'INFO', 'logs')
+        return mp_logging.return_value
+
+    def assert_same_outputs(self, prefetch_depth: int):
+        sequential_logger = self.run_jobs(os.path.join(self.tempdir, 'sequential'), 0)
+        prefetch_logger = self.run_jobs(os.path.join(self.tempdir, 'prefetch'), prefetch_depth)
+
+        sequential = self.outputs(os.path.join(self.tempdir, 'sequential'))
+        self.assert_identical_outputs(self.outputs(os.path.join(self.tempdir, 'prefetch')), sequential)
+        return sequential, sequential_logger, prefetch_logger
+
+    def test_prefetch_matches_sequential(self):
+        for prefetch_depth in [1, 2]:
+            with self.subTest(prefetch_depth=prefetch_depth):
+                sequential, _, _ = self.assert_same_outputs(prefetch_depth)
+                # two fields of three granules on two grids
+                self.assertEqual(len(sequential), 12)
+
+    def test_prefetch_load_error(self):
+        failed_path = self.granules[1][0]
+        with open(failed_path, 'wb') as f:
+            f.write(b'not netCDF' * 100)
+
+        sequential, sequential_logger, prefetch_logger = self.assert_same_outputs(2)
+        # the granule that can't be read has no outputs, and doesn't stop the others
+        self.assertEqual(len(sequential), 8)
+        self.assertFalse(any('synthetic_20200102' in path for path in sequential))
+        for logger in [sequential_logger, prefetch_logger]:
+            errors = [call.args[0] for call in logger.exception.call_args_list]
+            self.assertEqual(len(errors), 1)
+            self.assertTrue(errors[0].startswith(f'Error transforming {failed_path}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
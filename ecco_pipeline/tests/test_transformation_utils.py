@@ -0,0 +1,322 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+import pyresample as pr
+from utils.processing_utils import transformation_utils
+from utils.processing_utils.transformation_utils import RegridOperator, SourceCoarsening
+
+
+def make_legacy_factors(n_source: int, n_target: int, seed: int = 0):
+    '''
+    Random factors in the per target cell dictionary layout produced by earlier
+    versions of find_mappings_from_source_to_target
+    '''
+    rng = np.random.default_rng(seed)
+    source_indices_within_target_radius_i = dict()
+    num_source_indices_within_target_radius_i = np.zeros(n_target)
+    nearest_source_index_to_target_index_i = dict()
+    for i in range(n_target):
+        # leave some target cells without any valid source cells
+        if rng.random() < 0.1:
+            continue
+        count = rng.integers(0, 6)
+        source_indices_within_target_radius_i[i] = rng.choice(n_source, count, replace=False)
+        num_source_indices_within_target_radius_i[i] = count
+        if rng.random() < 0.8:
+            nearest_source_index_to_target_index_i[i] = rng.integers(0, n_source)
+    return source_indices_within_target_radius_i, num_source_indices_within_target_radius_i, nearest_source_index_to_target_index_i
+
+
+class RegridOperatorTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.source_shape = (20, 30)
+        cls.target_shape = (15, 25)
+        cls.factors = make_legacy_factors(np.prod(cls.source_shape), np.prod(cls.target_shape))
+
+        rng = np.random.default_rng(1)
+        cls.source_field = rng.normal(size=cls.source_shape)
+        cls.source_field[rng.random(cls.source_shape) < 0.2] = np.nan
+
+    def test_matches_loop(self):
+        for operation in RegridOperator.operations:
+            for allow_nearest_neighbor in [True, False]:
+                with self.subTest(operation=operation, allow_nearest_neighbor=allow_nearest_neighbor):
+                    expected = transformation_utils._transform_to_target_grid_loop(*self.factors, self.source_field,
+                                                                                   self.target_shape, operation,
+                                                                                   allow_nearest_neighbor)
+                    result = transformation_utils.transform_to_target_grid(*self.factors, self.source_field,
+                                                                           self.target_shape, operation,
+                                                                           allow_nearest_neighbor)
+                    self.assertEqual(result.shape, self.target_shape)
+                    np.testing.assert_allclose(result, expected, rtol=1e-12, equal_nan=True)
+
+    def test_from_factors_is_idempotent(self):
+        operator = RegridOperator.from_factors(self.factors)
+        self.assertIs(RegridOperator.from_factors(operator), operator)
+
+    def test_all_nan_field(self):
+        operator = RegridOperator.from_factors(self.factors)
+        source_field = np.full(self.source_shape, np.nan)
+        for operation in RegridOperator.operations:
+            with self.subTest(operation=operation):
+                self.assertTrue(np.isnan(operator.apply(source_field, operation)).all())
+
+    def test_unsupported_operation(self):
+        operator = RegridOperator.from_factors(self.factors)
+        with self.assertRaises(ValueError):
+            operator.apply(self.source_field, 'max')
+
+
+class ScatterOperatorTestCase(unittest.TestCase):
+
+    def test_matches_full_operator(self):
+        operator = RegridOperator.from_factors(make_legacy_factors(400, 250, seed=10))
+        target_indices = np.flatnonzero(np.random.default_rng(11).random(250) < 0.6)
+        subset = RegridOperator.from_factors((
+            np.concatenate([operator.source_indices[operator.offsets[i]:operator.offsets[i+1]] for i in target_indices]),
+            operator.num_source_indices[target_indices], operator.nearest_source_index[target_indices]))
+        scattered = subset.scatter(target_indices, 250)
+        self.assertEqual(scattered.n_target, 250)
+
+        source_field = np.random.default_rng(12).normal(size=400)
+        for operation in RegridOperator.operations:
+            with self.subTest(operation=operation):
+                expected = np.full(250, np.nan)
+                expected[target_indices] = operator.apply(source_field, operation)[target_indices]
+                np.testing.assert_array_equal(scattered.apply(source_field, operation), expected)
+
+
+class SourceWindowTestCase(unittest.TestCase):
+
+    def test_windowed_operator_matches_full_operator(self):
+        source_shape = (20, 30)
+        rng = np.random.default_rng(13)
+        # source cells within rows 4-11 and columns 10-24
+        window_indices = np.ravel_multi_index(np.meshgrid(np.arange(4, 12), np.arange(10, 25)), source_shape).ravel()
+        counts = rng.integers(0, 4, 60)
+        nearest = np.where(rng.random(60) < 0.8, rng.choice(window_indices, 60), -1)
+        operator = RegridOperator(rng.choice(window_indices, counts.sum()), counts, nearest)
+
+        window = operator.find_source_window(source_shape)
+        self.assertTrue(4 <= window[0] and window[1] <= 12 and 10 <= window[2] and window[3] <= 25)
+        windowed = operator.windowed(source_shape, window)
+
+        source_field = rng.normal(size=source_shape)
+        for operation in RegridOperator.operations:
+            with self.subTest(operation=operation):
+                np.testing.assert_array_equal(windowed.apply(source_field[window[0]:window[1], window[2]:window[3]], operation),
+                                              operator.apply(source_field, operation))
+
+    def test_union_window(self):
+        self.assertEqual(transformation_utils.union_window([(2, 5, 0, 10), (0, 0, 0, 0), (4, 8, 3, 12)]), (2, 8, 0, 12))
+        self.assertEqual(transformation_utils.union_window([(0, 0, 0, 0)]), (0, 0, 0, 0))
+
+
+class CompressNeighbourInfoTestCase(unittest.TestCase):
+
+    def test_matches_per_cell_selection(self):
+        rng = np.random.default_rng(2)
+        len_source_grid, len_target_grid, neighbours = 200, 50, 8
+
+        valid_output_index = rng.random(len_target_grid) < 0.9
+        n_valid = valid_output_index.sum()
+        target_grid_radius = rng.uniform(1, 3, len_target_grid)
+
+        # sorted distances, with missing neighbours flagged as in pyresample
+        distances = np.sort(rng.uniform(0, 4, (n_valid, neighbours)), axis=1)
+        indices = rng.integers(0, len_source_grid, (n_valid, neighbours))
+        missing = distances > 3.5
+        distances[missing] = np.inf
+        indices[missing] = len_source_grid
+        Ax_max_target_grid_r = (None, valid_output_index, indices, distances)
+
+        nearest = np.where(rng.random(n_valid) < 0.8, rng.integers(0, len_source_grid, n_valid), len_source_grid)
+        Ax_nearest = (None, valid_output_index, nearest, np.zeros(n_valid))
+
+        source_indices, counts, nearest_source_index = \
+            transformation_utils.compress_neighbour_info(Ax_max_target_grid_r, Ax_nearest,
+                                                         target_grid_radius, len_source_grid)
+
+        self.assertEqual(source_indices.dtype, np.int32)
+        self.assertEqual(counts.dtype, np.float32)
+        self.assertEqual(nearest_source_index.dtype, np.int32)
+
+        offsets = np.concatenate([[0], np.cumsum(counts).astype(int)])
+        for valid_i, i in enumerate(np.flatnonzero(valid_output_index)):
+            expected = indices[valid_i][distances[valid_i] <= target_grid_radius[i]]
+            np.testing.assert_array_equal(source_indices[offsets[i]:offsets[i+1]], expected)
+            expected_nearest = nearest[valid_i] if nearest[valid_i] < len_source_grid else -1
+            self.assertEqual(nearest_source_index[i], expected_nearest)
+        self.assertTrue((counts[~valid_output_index] == 0).all())
+        self.assertTrue((nearest_source_index[~valid_output_index] == -1).all())
+
+
+class FindMappingsTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        proj_info = {'area_id': 'longlat', 'area_name': 'Plate Carree', 'proj_id': 'EPSG:4326',
+                     'proj4_args': '+proj=longlat +datum=WGS84'}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            cls.source_grid_min_L, cls.source_grid_max_L, cls.source_grid = \
+                transformation_utils.generalized_grid_product(5.0, [-180, -90, 180, 90], [72, 36], proj_info)
+
+        rng = np.random.default_rng(3)
+        cls.target_grid = pr.geometry.SwathDefinition(lons=rng.uniform(-180, 180, 500), lats=rng.uniform(-80, 80, 500))
+        cls.target_grid_radius = rng.uniform(2e5, 6e5, 500)
+
+    def find_mappings(self, **kwargs):
+        return transformation_utils.find_mappings_from_source_to_target(self.source_grid, self.target_grid,
+                                                                        self.target_grid_radius, self.source_grid_min_L,
+                                                                        self.source_grid_max_L, **kwargs)
+
+    def test_chunk_size_does_not_change_factors(self):
+        factors = [self.find_mappings(chunk_size=chunk_size) for chunk_size in [37, 500]]
+        self.assertGreater(factors[1][1].sum(), 0)
+        for chunked, unchunked in zip(*factors):
+            np.testing.assert_array_equal(chunked, unchunked)
+
+    def test_kdtree_backend_matches_pyresample(self):
+        for pyresample_factors, kdtree_factors in zip(self.find_mappings(backend='pyresample'),
+                                                      self.find_mappings(backend='kdtree', chunk_size=37)):
+            np.testing.assert_array_equal(pyresample_factors, kdtree_factors)
+
+    def test_parallel_tiles_resume(self):
+        expected = self.find_mappings()
+        tile_dir = tempfile.mkdtemp()
+        try:
+            for processes in [2, 1]:
+                with self.subTest(processes=processes):
+                    factors = self.find_mappings(chunk_size=37, processes=processes, tile_dir=tile_dir)
+                    self.assertEqual(len(os.listdir(tile_dir)), 14)
+                    for tiled, untiled in zip(factors, expected):
+                        np.testing.assert_array_equal(tiled, untiled)
+                    # drop some tiles, as if the run had been interrupted
+                    for tile in sorted(os.listdir(tile_dir))[::3]:
+                        os.remove(os.path.join(tile_dir, tile))
+        finally:
+            shutil.rmtree(tile_dir)
+
+    def test_invalid_target_tile(self):
+        # the first tile only has target cells without valid coordinates
+        target_lons, target_lats = self.target_grid.lons.copy(), self.target_grid.lats.copy()
+        target_lons[:40] = np.nan
+        target_lats[:40] = np.nan
+        target_grid = pr.geometry.SwathDefinition(lons=target_lons, lats=target_lats)
+        for backend in ['pyresample', 'kdtree']:
+            with self.subTest(backend=backend):
+                factors = [transformation_utils.find_mappings_from_source_to_target(
+                    self.source_grid, target_grid, self.target_grid_radius, self.source_grid_min_L,
+                    self.source_grid_max_L, chunk_size=chunk_size, backend=backend) for chunk_size in [37, 500]]
+                for chunked, unchunked in zip(*factors):
+                    np.testing.assert_array_equal(chunked, unchunked)
+                _, num_source_indices, nearest_source_index = factors[0]
+                self.assertTrue((num_source_indices[:40] == 0).all())
+                self.assertTrue((nearest_source_index[:40] == -1).all())
+                self.assertGreater(num_source_indices[40:].sum(), 0)
+
+    def test_failed_search_clears_state(self):
+        with mock.patch.object(transformation_utils, 'compress_neighbour_info', side_effect=MemoryError):
+            with self.assertRaises(MemoryError):
+                self.find_mappings(chunk_size=37, backend='kdtree')
+        self.assertEqual(transformation_utils._tile_search, {})
+
+    def test_unsupported_backend(self):
+        with self.assertRaises(ValueError):
+            self.find_mappings(backend='balltree')
+
+
+class SourceCoarseningTestCase(unittest.TestCase):
+
+    def test_block_average(self):
+        # 5 x 3 grid with cells numbered by value, coarsened into 2 x 2 blocks
+        coarsening = SourceCoarsening((5, 3), 2)
+        self.assertEqual(coarsening.coarse_dims, (3, 2))
+        source_field = np.arange(15, dtype=float)
+        source_field[1] = np.nan
+
+        np.testing.assert_array_equal(coarsening.coarsen_fields(source_field[np.newaxis])[0],
+                                      [np.nan, 5, 6.5, 10.5, 12.5, 14])
+        np.testing.assert_array_equal(coarsening.coarsen_fields(source_field[np.newaxis], skipna=True)[0],
+                                      [11 / 3, 5, 6.5, 10.5, 12.5, 14])
+
+    def test_coarse_grid_centres(self):
+        source_grid = pr.geometry.SwathDefinition(lons=np.array([[179.5, -179.5], [179.5, -179.5]]),
+                                                  lats=np.array([[1., 1.], [-1., -1.]]))
+        coarse_grid = SourceCoarsening((2, 2), 2).coarsen_grid(source_grid)
+        self.assertAlmostEqual(abs(coarse_grid.lons[0]), 180)
+        self.assertAlmostEqual(coarse_grid.lats[0], 0)
+
+    def test_operator_maps_coarsened_fields(self):
+        coarsening = SourceCoarsening((20, 20), 2)
+        operator = RegridOperator.from_factors(make_legacy_factors(coarsening.size, 50, seed=8))
+        coarsened_operator = RegridOperator(operator.source_indices, operator.num_source_indices,
+                                            operator.nearest_source_index, coarsening=coarsening)
+        source_fields = np.random.default_rng(9).normal(size=(2, 400))
+        for operation in RegridOperator.operations:
+            with self.subTest(operation=operation):
+                np.testing.assert_array_equal(coarsened_operator.apply_batch(source_fields, operation),
+                                              operator.apply_batch(coarsening.coarsen_fields(source_fields), operation))
+
+
+class SegmentedMedianTestCase(unittest.TestCase):
+
+    def test_matches_numpy(self):
+        rng = np.random.default_rng(4)
+        counts = rng.integers(0, 7, 300)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        values = rng.normal(size=offsets[-1])
+        values[rng.random(len(values)) < 0.15] = np.nan
+        values[:3] = [np.inf, -np.inf, 5]
+
+        for skipna, median_func in [(False, np.median), (True, np.nanmedian)]:
+            with self.subTest(skipna=skipna), warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                expected = [median_func(values[offsets[i]:offsets[i+1]]) if counts[i] else np.nan
+                            for i in range(len(counts))]
+                result = transformation_utils.segmented_median(values, offsets, skipna)
+                np.testing.assert_array_equal(result, expected)
+
+
+class ApplyBatchTestCase(unittest.TestCase):
+
+    def test_matches_apply(self):
+        factors = make_legacy_factors(400, 250, seed=5)
+        operator = RegridOperator.from_factors(factors)
+        rng = np.random.default_rng(6)
+        source_fields = rng.normal(size=(3, 400))
+        source_fields[rng.random(source_fields.shape) < 0.25] = np.nan
+
+        for operation in RegridOperator.operations:
+            with self.subTest(operation=operation):
+                result = operator.apply_batch(source_fields, operation)
+                self.assertEqual(result.shape, (3, 250))
+                for source_field, mapped in zip(source_fields, result):
+                    np.testing.assert_allclose(mapped, operator.apply(source_field, operation), rtol=1e-12)
+
+
+class StackOperatorsTestCase(unittest.TestCase):
+
+    def test_matches_separate_operators(self):
+        operators = [RegridOperator.from_factors(make_legacy_factors(400, n_target, seed=seed))
+                     for seed, n_target in enumerate([250, 1, 120])]
+        stacked = RegridOperator.stack(operators)
+        self.assertEqual(stacked.n_target, 371)
+
+        rng = np.random.default_rng(7)
+        source_fields = rng.normal(size=(2, 400))
+        source_fields[rng.random(source_fields.shape) < 0.25] = np.nan
+
+        for operation in RegridOperator.operations:
+            with self.subTest(operation=operation):
+                results = RegridOperator.split(stacked.apply_batch(source_fields, operation), operators)
+                for operator, result in zip(operators, results):
+                    np.testing.assert_array_equal(result, operator.apply_batch(source_fields, operation))
@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import xarray as xr
+from utils.processing_utils import transformed_store
+from utils.processing_utils.records import NETCDF_FILL_VALUE
+
+
+def make_time_step(date: str, value: float) -> xr.Dataset:
+    time = np.datetime64(f'{date}T12:00', 'ns')
+    data = np.full((1, 2, 3, 3), value)
+    data[0, 0, 0, 0] = NETCDF_FILL_VALUE
+    return xr.Dataset({'field_interpolated_to_grid': (('time', 'tile', 'j', 'i'), data)},
+                      coords={'time': [time], 'XC': (('tile', 'j', 'i'), np.ones((2, 3, 3))),
+                              'time_bnds': (('time', 'nv'), [[time - np.timedelta64(12, 'h'),
+                                                              time + np.timedelta64(12, 'h')]])})
+
+
+class TransformedStoreTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tempdir)
+
+    def test_time_index(self):
+        self.assertEqual(transformed_store.time_index('2020-01-01T00:00:00Z', 'daily'), 0)
+        self.assertEqual(transformed_store.time_index('2020-12-31T00:00:00Z', 'daily'), 365)
+        self.assertEqual(transformed_store.time_index('2020-12-16T00:00:00Z', 'monthly'), 11)
+        self.assertEqual(len(transformed_store.year_times('2021', 'daily')), 365)
+        self.assertEqual(len(transformed_store.year_times('2021', 'monthly')), 12)
+
+    def test_write_time_steps(self):
+        path = transformed_store.store_path(self.tempdir, 'grid', 'field', '_nh', '2020')
+        times = transformed_store.year_times('2020', 'daily')
+        # written out of order, the store is created by the first
+        for date, value in [('2020-03-01', 3.), ('2020-01-01', 1.)]:
+            transformed_store.write_time_step(path, make_time_step(date, value), times,
+                                              transformed_store.time_index(date, 'daily'))
+
+        store = transformed_store.open_store(path)
+        self.assertEqual(store.sizes['time'], 366)
+        year = store.isel(time=[0, 60])
+        np.testing.assert_array_equal(year.field_interpolated_to_grid.values[:, 0, 0, :2], [[np.nan, 1.], [np.nan, 3.]])
+        np.testing.assert_array_equal(year.time.values, [np.datetime64('2020-01-01T12:00', 'ns'),
+                                                         np.datetime64('2020-03-01T12:00', 'ns')])
+        np.testing.assert_array_equal(year.time_bnds.values[1], [np.datetime64('2020-03-01', 'ns'),
+                                                                 np.datetime64('2020-03-02', 'ns')])
+        # time steps not written are empty
+        self.assertTrue(np.isnan(store.isel(time=1).field_interpolated_to_grid.values).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
+import hashlib
 import logging
 import os
-import pickle
+import uuid
 import warnings
 from datetime import datetime
 from multiprocessing import current_process
@@ -13,13 +14,17 @@ import xarray as xr
 from baseclasses import Dataset, Field
 from conf.global_settings import OUTPUT_DIR
 from requests import HTTPError
+from xarray.backends.netCDF4_ import NETCDF4_PYTHON_LOCK
 from utils.pipeline_utils import file_utils, solr_utils
-from utils.processing_utils import ds_functions, records, transformation_utils
+from utils.processing_utils import (background_writer, ds_functions, factors_cache, factors_io, grid_cache, records,
+                                    transformation_utils, transformed_store)
 from utils.processing_utils.ds_functions import PosttransformationFuncs, PreprocessingFuncs, PretransformationFuncs
 
 logger = logging.getLogger(str(current_process().pid))
 
 BINARY_DTYPE = 'f4'
+# Grid variables read, in order, for the wet/dry mask of the target grid. Nonzero is wet
+TARGET_MASK_VARIABLES = ['maskC', 'hFacC']
 NETCDF_FILL_VALUE = nc4.default_fillvals[BINARY_DTYPE]
 
 class Transformation(Dataset):
@@ -42,6 +47,22 @@ class Transformation(Dataset):
 
         self.mapping_operation: str = config.get('mapping_operation', 'mean')
 
+        # Factor generation information
+        self.factors_neighbours: int = config.get('factors_neighbours', 100)
+        self.factors_chunk_size: int = config.get('factors_chunk_size', transformation_utils.FACTORS_CHUNK_SIZE)
+        self.neighbour_search_backend: str = config.get('neighbour_search_backend', 'pyresample')
+        self.source_coarsening_threshold: float = config.get('source_coarsening_threshold', None)
+        self.mask_dry_target_cells: bool = config.get('mask_dry_target_cells', False)
+
+        # Output information
+        self.encoding_profile: str = config.get('transformation_encoding_profile', records.TRANSFORMATION_ENCODING_PROFILE)
+        self.consolidate_fields: bool = config.get('consolidate_transformed_fields', False)
+        self.output_format: str = config.get('transformation_output_format', 'netcdf')
+
+        # Solr transformation entry ids keyed by (grid name, field name), and their pending updates
+        self.solr_doc_ids: dict = {}
+        self.solr_updates: list = []
+
     def _compute_data_res(self, config):
         '''
 
@@ -79,11 +100,88 @@ class Transformation(Dataset):
                 raise Exception(f'{func_to_run} failed to run on {self.file_name}')
         return data_object
 
-    def make_factors(self, grid_ds: xr.Dataset) -> Tuple[dict, np.ndarray, dict]:
+    def factors_header(self, grid_ds: xr.Dataset) -> dict:
+        '''
+        Metadata describing the source and target grids stored alongside factors
+        '''
+        return {
+            'ds_name': self.ds_name,
+            'hemisphere': self.hemi.replace('_', ''),
+            'transformation_version': self.transformation_version,
+            'grid_name': grid_ds.name,
+            'grid_checksum': factors_io.grid_checksum(grid_ds),
+            'n_target': int(grid_ds.XC.size),
+            'data_res': self.data_res,
+            'area_extent': self.area_extent,
+            'dims': self.dims,
+            'proj_info': self.proj_info,
+            'neighbours': self.factors_neighbours,
+            'chunk_size': self.factors_chunk_size,
+            'neighbour_search_backend': self.neighbour_search_backend,
+            'source_coarsening': self.source_coarsening_factor(grid_ds),
+            'target_mask': self.target_mask_info(grid_ds),
+            'n_source': int(np.prod(self.dims)) if self.dims else None
+        }
+
+    def target_grid_radius(self, grid_ds: xr.Dataset) -> np.ndarray:
+        '''
+        Radius of each target grid cell (m) from the model grid file
         '''
-        Generate mappings from source to target grid
+        if 'effective_grid_radius' in grid_ds:
+            return grid_ds.effective_grid_radius.values.ravel()
+        elif 'effective_radius' in grid_ds:
+            return grid_ds.effective_radius.values.ravel()
+        elif 'RAD' in grid_ds:
+            return grid_ds.RAD.values.ravel()
+        elif 'rA' in grid_ds:
+            return 0.5*np.sqrt(grid_ds.rA.values.ravel())
+        logger.exception(f'Unable to extract grid radius from {grid_ds.name}. Grid not supported')
+        raise ValueError(f'Unable to extract grid radius from {grid_ds.name}')
 
-        Returns Tuple
+    def source_coarsening_factor(self, grid_ds: xr.Dataset) -> int:
+        '''
+        Block size the source grid is coarsened by before generating factors for grid_ds,
+        1 if source_coarsening_threshold is not set or the source grid isn't fine enough
+        '''
+        if not self.source_coarsening_threshold or not self.dims:
+            return 1
+        # nominal resolution of the source grid (m), as source_grid_max_L in generalized_grid_product
+        return transformation_utils.source_coarsening_factor(self.target_grid_radius(grid_ds), self.data_res * 112e3,
+                                                             self.source_coarsening_threshold)
+
+    def wet_target_cells(self, grid_ds: xr.Dataset) -> Tuple[str, np.ndarray]:
+        '''
+        Mask variable and flat indices of the wet cells of grid_ds, from the surface level of the first of
+        TARGET_MASK_VARIABLES in the grid file. (None, None) if mask_dry_target_cells isn't set or there's no mask.
+        '''
+        if not self.mask_dry_target_cells:
+            return None, None
+        for var in TARGET_MASK_VARIABLES:
+            if var in grid_ds:
+                mask = grid_ds[var]
+                mask = mask.isel({dim: 0 for dim in mask.dims if dim not in grid_ds.XC.dims})
+                return var, np.flatnonzero(mask.transpose(*grid_ds.XC.dims).values.ravel() > 0)
+        return None, None
+
+    def target_mask_info(self, grid_ds: xr.Dataset) -> dict:
+        '''
+        Description of the wet/dry mask factors are built with, None if all target cells are used
+        '''
+        mask_var, wet_cells = self.wet_target_cells(grid_ds)
+        if wet_cells is None:
+            return None
+        return {'variable': mask_var, 'n_wet': int(len(wet_cells)),
+                'checksum': hashlib.md5(wet_cells.astype(np.int64).tobytes()).hexdigest()}
+
+    def make_factors(self, grid_ds: xr.Dataset, processes: int = 1, workers: int = -1) -> transformation_utils.RegridOperator:
+        '''
+        Generate mappings from source to target grid, or load them from the factors cache shared
+        across datasets (see factors_cache). Tiles of the target grid are searched
+        across processes and saved as they finish so an interrupted run resumes from the
+        last finished tile. A single process queries the kdtree backend with workers threads
+        (-1 for all cores).
+
+        Returns RegridOperator built from
         (source_indices_within_target_radius_i,
         num_source_indices_within_target_radius_i,
         nearest_source_index_to_target_index_i)
@@ -92,15 +190,26 @@ class Transformation(Dataset):
         logger = logging.getLogger(str(current_process().pid))
         
         grid_name = grid_ds.name
-        factors_dir = f'{OUTPUT_DIR}/{self.ds_name}/transformed_products/{grid_name}/'
-        factors_file = f'{grid_name}{self.hemi}_v{self.transformation_version}_factors'
-        factors_path = f'{factors_dir}{factors_file}'
+        header = self.factors_header(grid_ds)
+
+        # Factors are shared by every dataset and transformation version with the same source grid
+        key = factors_cache.factors_key(header)
+        factors_path = factors_cache.factors_path(key)
+
+        legacy_factors_path = f'{OUTPUT_DIR}/{self.ds_name}/transformed_products/{grid_name}/' \
+                              f'{grid_name}{self.hemi}_v{self.transformation_version}_factors'
+        if os.path.exists(legacy_factors_path) and not os.path.exists(factors_path):
+            factors_cache.import_factors(legacy_factors_path, key, header, self.ds_name)
 
         if os.path.exists(factors_path):
-            logger.debug(f'Loading {grid_name} factors')
-            with open(factors_path, "rb") as f:
-                factors = pickle.load(f)
-                return factors
+            try:
+                logger.debug(f'Loading {grid_name} factors {key}')
+                operator = factors_io.load_factors(factors_path, mmap_mode='r')
+                factors_cache.touch(key, header, self.ds_name)
+                return operator
+            except Exception as e:
+                logger.info(f'Unable to use existing {grid_name} factors {key} ({e}). Regenerating.')
+                factors_cache.remove(key)
         else:
             logger.info(f'Creating {grid_name} factors for {self.ds_name}')
 
@@ -109,35 +218,189 @@ class Transformation(Dataset):
                                                                                                     self.dims, self.proj_info)
 
         # Define the 'swath' as the lats/lon pairs of the model grid
-        target_grid = pr.geometry.SwathDefinition(lons=grid_ds.XC.values.ravel(),
-                                                  lats=grid_ds.YC.values.ravel())
+        target_lons = grid_ds.XC.values.ravel()
+        target_lats = grid_ds.YC.values.ravel()
 
         # Retrieve target_grid_radius from model_grid file
-        if 'effective_grid_radius' in grid_ds:
-            target_grid_radius = grid_ds.effective_grid_radius.values.ravel()
-        elif 'effective_radius' in grid_ds:
-            target_grid_radius = grid_ds.effective_radius.values.ravel()
-        elif 'RAD' in grid_ds:
-            target_grid_radius = grid_ds.RAD.values.ravel()
-        elif 'rA' in grid_ds:
-            target_grid_radius = 0.5*np.sqrt(grid_ds.rA.values.ravel())
-        else:
-            logger.exception(f'Unable to extract grid radius from {grid_ds.name}. Grid not supported')
-
-        factors = (transformation_utils.find_mappings_from_source_to_target(source_grid, target_grid, target_grid_radius,
-                                                                      source_grid_min_L, source_grid_max_L))
-        logger.debug(f'Saving {grid_name} factors')
-        os.makedirs(factors_dir, exist_ok=True)
-        with open(factors_path, 'wb') as f:
-            pickle.dump(factors, f)
-        return factors
+        target_grid_radius = self.target_grid_radius(grid_ds)
+
+        # Only search for source cells of wet target cells
+        mask_var, wet_cells = self.wet_target_cells(grid_ds)
+        if wet_cells is not None:
+            target_lons, target_lats = target_lons[wet_cells], target_lats[wet_cells]
+            target_grid_radius = target_grid_radius[wet_cells]
+        elif self.mask_dry_target_cells:
+            logger.warning(f'{grid_name} has none of {TARGET_MASK_VARIABLES}. Creating factors for all target grid cells.')
+        target_grid = pr.geometry.SwathDefinition(lons=target_lons, lats=target_lats)
+
+        # Build factors against a coarsened level of the source grid if it is much finer than the target grid
+        coarsening = None
+        if header['source_coarsening'] > 1:
+            coarsening = transformation_utils.SourceCoarsening(self.dims, header['source_coarsening'])
+            source_grid = coarsening.coarsen_grid(source_grid)
+            source_grid_min_L *= coarsening.factor
+            source_grid_max_L *= coarsening.factor
+
+        # Tiles depend on the chunk size as well as the factors themselves
+        tiles_header = {**factors_cache.key_params(header), 'chunk_size': header['chunk_size']}
+        operator = transformation_utils.RegridOperator.from_factors(
+            transformation_utils.find_mappings_from_source_to_target(source_grid, target_grid, target_grid_radius,
+                                                                     source_grid_min_L, source_grid_max_L,
+                                                                     neighbours=self.factors_neighbours,
+                                                                     chunk_size=self.factors_chunk_size,
+                                                                     backend=self.neighbour_search_backend,
+                                                                     workers=workers, processes=processes,
+                                                                     tile_dir=factors_io.tile_dir(factors_path, tiles_header)))
+        if wet_cells is not None:
+            logger.info(f'Created {grid_name} factors for {len(wet_cells)} of {grid_ds.XC.size} target grid cells '
+                        f'wet in {mask_var}')
+            operator = operator.scatter(wet_cells, grid_ds.XC.size)
+        if coarsening is None and self.source_shape:
+            header['source_window'] = list(operator.find_source_window(self.source_shape))
+        header['source_grid_min_L'] = float(source_grid_min_L)
+        header['source_grid_max_L'] = float(source_grid_max_L)
+
+        if coarsening is not None:
+            logger.info(f'Coarsened {self.ds_name}{self.hemi} source grid by {coarsening.factor}x{coarsening.factor} '
+                        f'for {grid_name}: {header["n_source"]} -> {coarsening.size} source grid cells, '
+                        f'{np.mean(operator.num_source_indices):.1f} source cells per target grid cell')
+
+        logger.debug(f'Saving {grid_name} factors {key}')
+        os.makedirs(factors_cache.CACHE_DIR, exist_ok=True)
+        factors_io.save_factors(operator, factors_path, header)
+        factors_io.remove_tiles(factors_path)
+        factors_cache.record(key, header, self.ds_name)
+
+        # Reopen memory-mapped so processes using the same factors share one copy
+        return factors_io.load_factors(factors_path, mmap_mode='r')
     
-    def perform_mapping(self, ds: xr.Dataset, factors: Tuple, field: Field, model_grid: xr.Dataset) -> xr.DataArray:
+    @property
+    def source_shape(self) -> Tuple[int, int]:
+        '''
+        (rows, cols) shape of the source grid in the layout expected by the mapping factors
+        '''
+        if self.dims and len(self.dims) == 2:
+            return (int(self.dims[1]), int(self.dims[0]))
+        return None
+
+    def source_window(self, operators: dict) -> Tuple[int, int, int, int]:
+        '''
+        Window of the source grid containing every source index of the operators, None if the whole
+        source grid is needed or the window can't be determined
+        '''
+        if not self.source_shape or any(operator.coarsening is not None for operator in operators.values()):
+            return None
+        for operator in operators.values():
+            # Factors created before windows were recorded
+            if operator.source_window is None:
+                operator.source_window = operator.find_source_window(self.source_shape)
+        window = transformation_utils.union_window(operator.source_window for operator in operators.values())
+        if window == (0, self.source_shape[0], 0, self.source_shape[1]):
+            return None
+        return window
+
+    def source_dims(self, ds: xr.Dataset) -> Tuple[str, str]:
+        '''
+        Row and column dimensions of the fields of ds on the source grid, None if the fields' dimensions
+        don't match the source grid
+        '''
+        field_dims = {ds[field.name].dims[-2:] for field in self.fields if field.name in ds.data_vars}
+        if len(field_dims) != 1:
+            return None
+        row_dim, col_dim = field_dims.pop()
+        if self.transpose:
+            row_dim, col_dim = col_dim, row_dim
+        if (ds.sizes[row_dim], ds.sizes[col_dim]) != self.source_shape:
+            return None
+        return row_dim, col_dim
+
+    def window_source(self, ds: xr.Dataset, window: Tuple[int, int, int, int]) -> xr.Dataset:
+        '''
+        Subsets ds to a window of the source grid, before any data is read. Returns None if the fields'
+        dimensions don't match the source grid.
+        '''
+        dims = self.source_dims(ds)
+        if dims is None:
+            return None
+        row_dim, col_dim = dims
+        row_start, row_stop, col_start, col_stop = window
+        logger.debug(f'Reading {row_stop - row_start}x{col_stop - col_start} window of {self.file_name}')
+        return ds.isel({row_dim: slice(row_start, row_stop), col_dim: slice(col_start, col_stop)})
+
+    def windowed_operators(self, operators: dict, window: Tuple[int, int, int, int]) -> dict:
+        '''
+        Operators for a window of the source grid, keyed by grid name
+        '''
+        return {grid_name: grid_cache.load_windowed_operator(self, grid_name, operator, window)
+                for grid_name, operator in operators.items()}
+
+    def subset_source(self, ds: xr.Dataset, operators: dict) -> Tuple[xr.Dataset, dict]:
+        '''
+        Subsets ds to the window of the source grid used by the operators, before any data is read, and
+        returns it along with operators for the window. Returns ds and operators unchanged if the whole
+        source grid is needed or the fields' dimensions don't match the source grid.
+        '''
+        window = self.source_window(operators)
+        if window is None:
+            return ds, operators
+        windowed_ds = self.window_source(ds, window)
+        if windowed_ds is None:
+            return ds, operators
+        return windowed_ds, self.windowed_operators(operators, window)
+
+    def source_data(self, ds: xr.Dataset, field: Field) -> np.ndarray:
+        '''
+        Source values of a field in the layout expected by the mapping factors
         '''
-        Maps source data to target grid and applies metadata
+        if self.transpose:
+            return ds[field.name].values[0, :].T
+        return ds[field.name].values
+
+    def map_fields(self, source_data: dict, operator: transformation_utils.RegridOperator, model_grid: xr.Dataset) -> dict:
+        '''
+        Maps the source data of one or more fields, keyed by field name, to the target grid with a
+        single application of the operator. Fields without any valid data are not mapped and map to None.
+        '''
+        return self.map_fields_to_grids(source_data, {model_grid.name: operator}, {model_grid.name: model_grid})[model_grid.name]
+
+    def map_fields_to_grids(self, source_data: dict, operators: dict, model_grids: dict) -> dict:
+        '''
+        Maps the source data of one or more fields to several target grids, keyed by grid name, in a
+        single pass by stacking the operators of each grid (see RegridOperator.stack). Returns the
+        mapped fields of each grid, as returned by map_fields.
+        '''
+        mapped_grids = {grid_name: {field_name: None for field_name in source_data} for grid_name in operators}
+
+        # see if we have any valid data
+        fields_with_data = [field_name for field_name, data in source_data.items() if np.sum(~np.isnan(data)) > 0]
+
+        if fields_with_data:
+            stacked_data = np.stack([source_data[field_name].ravel() for field_name in fields_with_data])
+
+            # operators built against different (coarsened) levels of the source grid are stacked separately
+            coarsenings = list(dict.fromkeys(operator.coarsening for operator in operators.values()))
+            for coarsening in coarsenings:
+                grid_operators = {grid_name: operator for grid_name, operator in operators.items()
+                                  if operator.coarsening == coarsening}
+                operator = grid_cache.load_stacked_operator(self, grid_operators, stacked_data.shape[1])
+                projections = operator.apply_batch(stacked_data, self.mapping_operation)
+                grid_projections = transformation_utils.RegridOperator.split(projections, grid_operators.values())
+                for grid_name, projections in zip(grid_operators, grid_projections):
+                    for field_name, projection in zip(fields_with_data, projections):
+                        mapped_grids[grid_name][field_name] = projection.reshape(model_grids[grid_name].XC.shape)
+        return mapped_grids
+
+    def perform_mapping(self, ds: xr.Dataset, operator: transformation_utils.RegridOperator, field: Field,
+                        model_grid: xr.Dataset, mapped_fields: dict = None) -> xr.DataArray:
+        '''
+        Maps source data to target grid and applies metadata. Uses the field's entry in
+        mapped_fields (see map_fields) if provided.
         '''
         logger = logging.getLogger(str(current_process().pid))
 
+        if mapped_fields is None:
+            mapped_fields = self.map_fields({field.name: self.source_data(ds, field)}, operator, model_grid)
+
 
         data_DA = records.make_empty_record(self.date, model_grid)
 
@@ -157,16 +420,10 @@ class Transformation(Dataset):
 
         data_DA.name = f'{field.name}_interpolated_to_{model_grid.name}'
 
-        if self.transpose:
-            orig_data = ds[field.name].values[0, :].T
-        else:
-            orig_data = ds[field.name].values
+        data_model_projection = mapped_fields[field.name]
 
         # see if we have any valid data
-        if np.sum(~np.isnan(orig_data)) > 0:
-            data_model_projection = transformation_utils.transform_to_target_grid(*factors, orig_data, model_grid.XC.shape,
-                                                            operation=self.mapping_operation)
-
+        if data_model_projection is not None:
             # put the new data values into the data_DA array.
             # --where the mapped data are not nan, replace the original values
             # --where they are nan, just leave the original values alone
@@ -213,6 +470,34 @@ class Transformation(Dataset):
 
         return data_DA
     
+    def collect_source_data(self, ds: xr.Dataset) -> Tuple[xr.Dataset, dict, dict, list]:
+        '''
+        Applies each field's pre transformations and takes a copy of its source data right after,
+        as it was when fields were mapped one at a time. Returns the pre transformed dataset, source
+        data and errors raised while extracting it keyed by field name, and the names of missing fields.
+        '''
+        logger = logging.getLogger(str(current_process().pid))
+
+        source_data = {}
+        source_data_errors = {}
+        missing_fields = []
+        for field in self.fields:
+            if field.pre_transformations:
+                try:
+                    func_machine = PretransformationFuncs()
+                    ds = func_machine.call_functions(field.pre_transformations, ds)
+                except Exception as e:
+                    logger.exception(e)
+
+            if field.name not in ds.data_vars:
+                missing_fields.append(field.name)
+                continue
+            try:
+                source_data[field.name] = np.array(self.source_data(ds, field))
+            except Exception as e:
+                source_data_errors[field.name] = e
+        return ds, source_data, source_data_errors, missing_fields
+
     def transform(self, model_grid: xr.Dataset, factors: Tuple, ds: xr.Dataset) -> Iterable[Tuple[xr.Dataset, bool]]:
         """
         Function that actually performs the transformations. Returns a list of transformed
@@ -222,6 +507,34 @@ class Transformation(Dataset):
         
         logger.info(f'Transforming {len(self.fields)} fields on {self.date} to {model_grid.name}')
 
+        # Build the sparse mapping operator once for all fields
+        operator = transformation_utils.RegridOperator.from_factors(factors)
+
+        # =====================================================
+        # Apply pre transformations and collect source data
+        # =====================================================
+        ds, source_data, source_data_errors, missing_fields = self.collect_source_data(ds)
+
+        # =====================================================
+        # Map all fields with one application of the operator
+        # =====================================================
+        try:
+            mapped_fields = self.map_fields(source_data, operator, model_grid)
+        except Exception as e:
+            logger.debug(f'Batched mapping failed for {self.file_name}: {e}. Mapping fields individually.')
+            mapped_fields = {}
+
+        return self.make_records(model_grid, operator, ds, source_data, source_data_errors, missing_fields, mapped_fields)
+
+    def make_records(self, model_grid: xr.Dataset, operator: transformation_utils.RegridOperator, ds: xr.Dataset,
+                     source_data: dict, source_data_errors: dict, missing_fields: list,
+                     mapped_fields: dict) -> Iterable[Tuple[xr.Dataset, bool]]:
+        '''
+        Builds the transformed dataset of each field from the output of collect_source_data. Fields
+        not already in mapped_fields are mapped individually.
+        '''
+        logger = logging.getLogger(str(current_process().pid))
+
         record_date = self.date.replace('Z', '')
 
         field_DSs = []
@@ -232,16 +545,13 @@ class Transformation(Dataset):
         for field in self.fields:
             logger.debug(f'Transforming {self.file_name} for field {field.name}')
 
-            if field.pre_transformations:
-                try:
-                    func_machine = PretransformationFuncs()
-                    ds = func_machine.call_functions(field.pre_transformations, ds)
-                except Exception as e:
-                    logger.exception(e)
-
-            if field.name in ds.data_vars: 
+            if field.name not in missing_fields: 
                 try:
-                    field_DA = self.perform_mapping(ds, factors, field, model_grid)
+                    if field.name in source_data_errors:
+                        raise source_data_errors[field.name]
+                    if field.name not in mapped_fields:
+                        mapped_fields.update(self.map_fields({field.name: source_data[field.name]}, operator, model_grid))
+                    field_DA = self.perform_mapping(ds, operator, field, model_grid, mapped_fields)
                     mapping_success = True
                 except Exception as e:
                     logger.exception(f'Transformation failed: {e}')
@@ -341,143 +651,446 @@ class Transformation(Dataset):
 
         return field_DSs
 
+    def required_variables(self) -> Iterable[str]:
+        '''
+        Variables used from source files: the configured fields, the variables their pre transformations
+        read, and time. None if a pre transformation hasn't declared the variables it reads.
+        '''
+        variables = [field.name for field in self.fields] + ['time', 'Time']
+        if self.time_bounds_var:
+            variables.append(self.time_bounds_var)
+        for field in self.fields:
+            if field.pre_transformations:
+                pre_transformation_variables = PretransformationFuncs().variables_read(field.pre_transformations)
+                if pre_transformation_variables is None:
+                    return None
+                variables.extend(pre_transformation_variables)
+        return variables
+
+    def unused_variables(self, source_file_path: str) -> Iterable[str]:
+        '''
+        Variables in the source file that aren't required, read from the file's header. Dimension
+        coordinates are kept. Empty if the variables required can't be determined.
+        '''
+        required_variables = self.required_variables()
+        if required_variables is None:
+            return []
+        try:
+            # Shares xarray's lock as granules may be read on a prefetch thread
+            with NETCDF4_PYTHON_LOCK, nc4.Dataset(source_file_path) as nc_ds:
+                return [var for var in nc_ds.variables
+                        if var not in required_variables and var not in nc_ds.dimensions]
+        except Exception as e:
+            logger.debug(f'Unable to read variables of {source_file_path}. Loading all variables. {e}')
+            return []
+
     def load_file(self, source_file_path: str) -> xr.Dataset:
         if self.preprocessing_function:
             func_machine = PreprocessingFuncs()
             ds = func_machine.call_function(self.preprocessing_function, source_file_path, self.fields)
         else:
-            ds = xr.open_dataset(source_file_path, decode_times=True)
+            # Unused variables are never read or decoded
+            ds = xr.open_dataset(source_file_path, decode_times=True,
+                                 drop_variables=self.unused_variables(source_file_path))
         ds.attrs['original_file_name'] = self.file_name
         return ds
 
-    def prepopulate_solr(self, source_file_path: str, grid_name: str):
+    def prepopulate_solr(self, source_file_path: str, grid_names: Iterable[str]):
         '''
-        Populate Solr with transformation entries prior to attempting transformation
+        Populate Solr with transformation entries prior to attempting transformation. The ids of the
+        entries are kept so their status updates can be sent together once the granule is saved
+        (see update_solr).
         '''
+        # Query all existing transformation entries of the granule at once
+        query_fq = [f'dataset_s:{self.ds_name}', 'type_s:transformation',
+                    f'pre_transformation_file_path_s:"{source_file_path}"']
+        existing_docs = {(doc['grid_name_s'], doc['field_s']): doc for doc in solr_utils.solr_query(query_fq)}
+        granule_docs = None
+
         update_body = []
-        for field in self.fields:
-            logger.debug(f'Transforming {field.name}')
-
-            # Query if grid/field combination transformation entry exists
-            query_fq = [f'dataset_s:{self.ds_name}', 'type_s:transformation', f'grid_name_s:{grid_name}',
-                        f'field_s:{field.name}', f'pre_transformation_file_path_s:"{source_file_path}"']
-            docs = solr_utils.solr_query(query_fq)
-            transform = {}
-
-            # If grid/field combination transformation exists, update transformation status
-            # Otherwise initialize new transformation entry
-            if len(docs) > 0:
-                # Reset status fields
-                transform['id'] = docs[0]['id']
-                transform['transformation_in_progress_b'] = {"set": True}
-                transform['success_b'] = {"set": False}
-            else:
-                # Query for granule entry to get checksum
-                query_fq = [f'dataset_s:{self.ds_name}', 'type_s:granule',
-                            f'pre_transformation_file_path_s:"{source_file_path}"']
-                docs = solr_utils.solr_query(query_fq)
-
-                # Initialize new transformation entry
-                transform['type_s'] = 'transformation'
-                transform['date_s'] = self.date
-                transform['dataset_s'] = self.ds_name
-                transform['pre_transformation_file_path_s'] = source_file_path
-                transform['hemisphere_s'] = self.hemi.replace('_', '')
-                transform['origin_checksum_s'] = docs[0]['checksum_s']
-                transform['grid_name_s'] = grid_name
-                transform['field_s'] = field.name
-                transform['transformation_in_progress_b'] = True
-                transform['success_b'] = False
-            update_body.append(transform)
-        r = solr_utils.solr_update(update_body, r=True)
+        for grid_name in grid_names:
+            for field in self.fields:
+                transform = {}
+
+                # If grid/field combination transformation exists, update transformation status
+                # Otherwise initialize new transformation entry
+                if (grid_name, field.name) in existing_docs:
+                    # Reset status fields
+                    transform['id'] = existing_docs[(grid_name, field.name)]['id']
+                    transform['transformation_in_progress_b'] = {"set": True}
+                    transform['success_b'] = {"set": False}
+                else:
+                    # Query for granule entry to get checksum
+                    if granule_docs is None:
+                        query_fq = [f'dataset_s:{self.ds_name}', 'type_s:granule',
+                                    f'pre_transformation_file_path_s:"{source_file_path}"']
+                        granule_docs = solr_utils.solr_query(query_fq)
+
+                    # Initialize new transformation entry
+                    transform['id'] = str(uuid.uuid1())
+                    transform['type_s'] = 'transformation'
+                    transform['date_s'] = self.date
+                    transform['dataset_s'] = self.ds_name
+                    transform['pre_transformation_file_path_s'] = source_file_path
+                    transform['hemisphere_s'] = self.hemi.replace('_', '')
+                    transform['origin_checksum_s'] = granule_docs[0]['checksum_s']
+                    transform['grid_name_s'] = grid_name
+                    transform['field_s'] = field.name
+                    transform['transformation_in_progress_b'] = True
+                    transform['success_b'] = False
+                self.solr_doc_ids[(grid_name, field.name)] = transform['id']
+                update_body.append(transform)
+        r = solr_utils.solr_update(update_body, r=True, soft_commit=True)
         try:
             r.raise_for_status()
         except HTTPError:
             logger.exception(f'Failed to update Solr transformation status for {self.ds_name} on {self.date}')
             raise HTTPError
 
-def transform(source_file_path: str, tx_jobs: dict, config: dict, granule_date: str):
+    def update_solr(self):
+        '''
+        Sends the transformation entry updates collected while saving the granule's transformations
+        in a single request
+        '''
+        if not self.solr_updates:
+            return
+        update_body, self.solr_updates = self.solr_updates, []
+        r = solr_utils.solr_update(update_body, r=True, soft_commit=True)
+        if r.status_code != 200:
+            names = {doc_id: f'{grid_name} {field_name}' for (grid_name, field_name), doc_id in self.solr_doc_ids.items()}
+            failed = ', '.join(names.get(update['id'], update['id']) for update in update_body)
+            logger.error(f'Failed to update Solr transformation entries for {failed} in {self.ds_name} on {self.date}')
+
+def save_transformations(T: Transformation, source_file_path: str, grid_name: str, fields: Iterable[Field],
+                         field_DSs: Iterable[Tuple[xr.Dataset, bool]]) -> bool:
     """
-    Performs and saves locally all remaining transformations for a given source granule
-    Updates Solr with transformation entries and updates descendants, and dataset entries
+    Saves the transformed datasets of a granule for a single grid in netCDF format (or to year
+    stores) and updates their Solr transformation entries. Returns True if all transformations
+    were successful. A field that fails to save is logged and doesn't stop the others from being saved.
     """
-    T = Transformation(config, source_file_path, granule_date)
+    if T.output_format == 'zarr':
+        save = save_store_transformation
+    elif T.consolidate_fields:
+        try:
+            return save_consolidated_transformations(T, source_file_path, grid_name, fields, field_DSs)
+        except Exception as e:
+            logger.exception(f'Error saving {grid_name} transformations of {T.file_name}: {e}')
+            return False
+    else:
+        save = save_transformation
+
+    transformation_successes = True
+
+    # Save each transformed granule for the current field
+    for field, (field_DS, success) in zip(fields, field_DSs):
+        try:
+            transformation_successes = save(T, source_file_path, grid_name, field, field_DS, success) \
+                and transformation_successes
+        except Exception as e:
+            logger.exception(f'Error saving {grid_name} {field.name} transformation of {T.file_name}: {e}')
+            transformation_successes = False
+
+    logger.debug(f'CPU id {os.getpid()} saving {T.file_name} output file for grid {grid_name}')
+    return transformation_successes
+
+
+def save_transformation(T: Transformation, source_file_path: str, grid_name: str, field: Field,
+                        field_DS: xr.Dataset, success: bool) -> bool:
+    """
+    Saves a single field's transformed dataset and updates its Solr transformation entry
+    """
+    output_filename = f'{grid_name}_{field.name}_{T.file_name}.nc'
+    
+    output_path = f'{OUTPUT_DIR}/{T.ds_name}/transformed_products/{grid_name}/transformed/{field.name}/'
+    transformed_location = f'{output_path}{output_filename}'
+
+    os.makedirs(output_path, exist_ok=True)
+
+    # save field_DS
+    records.save_netcdf(field_DS, output_filename, output_path, T.encoding_profile)
+
+    update_transformation_entry(T, source_file_path, grid_name, field, field_DS, success, transformed_location,
+                                file_utils.md5(transformed_location))
+    return success
+
+
+def save_store_transformation(T: Transformation, source_file_path: str, grid_name: str, field: Field,
+                              field_DS: xr.Dataset, success: bool) -> bool:
+    """
+    Writes a single field's transformed dataset to its time step of the field's year store and
+    updates its Solr transformation entry
+    """
+    year = T.date[:4]
+    output_path = f'{OUTPUT_DIR}/{T.ds_name}/transformed_products/{grid_name}/transformed/{field.name}/'
+    store_location = transformed_store.store_path(output_path, grid_name, field.name, T.hemi, year)
+
+    # Variables are named as in netCDF files, including empty records
+    variable = f'{field.name}_interpolated_to_{grid_name}'
+    time_index = transformed_store.time_index(T.date, T.data_time_scale)
+    checksum = transformed_store.write_time_step(store_location, field_DS.rename({list(field_DS.data_vars)[0]: variable}),
+                                                 transformed_store.year_times(year, T.data_time_scale), time_index)
+
+    update_transformation_entry(T, source_file_path, grid_name, field, field_DS, success, store_location, checksum,
+                                variable, time_index)
+    return success
+
+
+def save_consolidated_transformations(T: Transformation, source_file_path: str, grid_name: str,
+                                      fields: Iterable[Field], field_DSs: Iterable[Tuple[xr.Dataset, bool]]) -> bool:
+    """
+    Saves the transformed datasets of a granule for a single grid in a single netCDF file, one variable
+    per field, and points each field's Solr transformation entry at its variable. Variables of fields
+    that aren't being transformed are kept from an existing file.
+    """
+    output_filename = f'{grid_name}_{T.file_name}.nc'
+    output_path = f'{OUTPUT_DIR}/{T.ds_name}/transformed_products/{grid_name}/transformed/'
+    transformed_location = f'{output_path}{output_filename}'
+
+    # Variables are named as in per field files, including empty records
+    variables = [f'{field.name}_interpolated_to_{grid_name}' for field in fields]
+    field_DSs = list(field_DSs)
+    consolidated_DSs = [field_DS.rename({list(field_DS.data_vars)[0]: variable})
+                        for variable, (field_DS, _) in zip(variables, field_DSs)]
+    if os.path.exists(transformed_location):
+        with xr.open_dataset(transformed_location) as existing_DS:
+            kept_variables = [var for var in existing_DS.data_vars if var not in variables]
+            if kept_variables:
+                consolidated_DSs.append(existing_DS[kept_variables].load())
+    consolidated_DS = xr.merge(consolidated_DSs, compat='override', combine_attrs='override')
+
+    records.save_netcdf(consolidated_DS, output_filename, output_path, T.encoding_profile)
+    checksum = file_utils.md5(transformed_location)
 
     transformation_successes = True
-    transformation_file_paths = {}
-    grids_updated = []
+    for field, variable, (field_DS, success) in zip(fields, variables, field_DSs):
+        try:
+            update_transformation_entry(T, source_file_path, grid_name, field, field_DS, success, transformed_location,
+                                        checksum, variable)
+        except Exception as e:
+            logger.exception(f'Error updating {grid_name} {field.name} transformation entry of {T.file_name}: {e}')
+            success = False
+        transformation_successes = transformation_successes and success
+    return transformation_successes
+
+
+def update_transformation_entry(T: Transformation, source_file_path: str, grid_name: str, field: Field,
+                                field_DS: xr.Dataset, success: bool, transformed_location: str, checksum: str,
+                                variable: str = None, time_index: int = None):
+    """
+    Queues the update of a field's Solr transformation entry with its saved file (and variable, for
+    files holding several fields, and time step, for year stores) and status
+    """
+    # Entry ids are known from prepopulate_solr
+    doc_id = T.solr_doc_ids.get((grid_name, field.name))
+    if doc_id is None:
+        query_fq = [f'dataset_s:{T.ds_name}', 'type_s:transformation', f'grid_name_s:{grid_name}',
+                    f'field_s:{field.name}', f'pre_transformation_file_path_s:"{source_file_path}"']
+        doc_id = solr_utils.solr_query(query_fq)[0]['id']
+
+    # Update Solr transformation entry with file paths and status
+    update_body = [
+        {
+            "id": doc_id,
+            "filename_s": {"set": os.path.basename(transformed_location)},
+            "transformation_file_path_s": {"set": transformed_location},
+            "transformation_completed_dt": {"set": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")},
+            "transformation_in_progress_b": {"set": False},
+            "success_b": {"set": success},
+            "transformation_checksum_s": {"set": checksum},
+            "transformation_version_f": {"set": T.transformation_version},
+            "transformation_variable_s": {"set": variable},
+            "transformation_time_index_i": {"set": time_index}
+        }
+    ]
+    
+    if success and 'Default empty model grid record' in field_DS.variables:
+        update_body[0]['transformation_note'] = {"set": 'Field not found in source data. Defaulting to empty record.'}
+
+    # Sent with the granule's other updates by T.update_solr
+    T.solr_updates.extend(update_body)
+
+
+def load_granule(source_file_path: str, tx_jobs: dict, config: dict, granule_date: str) -> Tuple[Transformation, xr.Dataset, dict, dict]:
+    """
+    Reads the data of a source granule needed to transform it to the grids in tx_jobs into memory.
+    Returns its Transformation, data, and the model grids and operators of each grid.
+    """
+    T = Transformation(config, source_file_path, granule_date)
 
     logger.debug(f'Loading {T.file_name} data')
     ds = T.load_file(source_file_path)
+
+    model_grids, operators = load_grids(T, tx_jobs.keys())
+    # Only read the window of the source grid the grids' factors use
+    ds, operators = T.subset_source(ds, operators)
+    return T, ds.load(), model_grids, operators
+
+
+def transform(source_file_path: str, tx_jobs: dict, config: dict, granule_date: str,
+              granule: Tuple[Transformation, xr.Dataset, dict, dict] = None, flush: bool = True):
+    """
+    Performs and saves locally all remaining transformations for a given source granule
+    Updates Solr with transformation entries and updates descendants, and dataset entries.
+    The granule's transformation entries are updated together in one request once it's saved.
+
+    Pre transformations are applied once and the fields are mapped to all grids in tx_jobs
+    in a single pass, after which the outputs are split back into per grid records.
+    granule is the granule as returned by load_granule, if it has already been read (ex: prefetched).
+    Outputs are saved by the worker's background writer while the next grid is processed. With
+    flush=False, transform returns without waiting for them to be saved.
+    """
+    T, ds, model_grids, operators = granule or load_granule(source_file_path, tx_jobs, config, granule_date)
+    writer = background_writer.get_writer()
     
     grid_fields = [[f'({grid_name}, {field})' for field in tx_jobs[grid_name]] for grid_name in tx_jobs.keys()]
     logger.debug(f'{T.file_name} needs to transform: {grid_fields} ')
 
-    # Iterate through grids in remaining_transformations
-    for grid_name in tx_jobs.keys():
-        fields: Iterable[Field] = tx_jobs[grid_name]
+    T.prepopulate_solr(source_file_path, tx_jobs.keys())
+
+    # =====================================================
+    # Run transformation
+    # =====================================================
+    logger.debug(f'Running transformations for {T.file_name}')
+    logger.info(f'Transforming {len(T.fields)} fields on {T.date} to {", ".join(tx_jobs.keys())}')
+
+    ds, source_data, source_data_errors, missing_fields = T.collect_source_data(ds)
+    try:
+        mapped_grids = T.map_fields_to_grids(source_data, operators, model_grids)
+    except Exception as e:
+        logger.debug(f'Batched mapping failed for {T.file_name}: {e}. Mapping fields individually.')
+        mapped_grids = {grid_name: {} for grid_name in tx_jobs.keys()}
+
+    try:
+        # Iterate through grids in remaining_transformations
+        for grid_name, fields in tx_jobs.items():
+            # Returns list of transformed DSs, one for each field in fields
+            field_DSs = T.make_records(model_grids[grid_name], operators[grid_name], ds, source_data,
+                                       source_data_errors, missing_fields, mapped_grids[grid_name])
+
+            # =====================================================
+            # Save the output in netCDF format
+            # =====================================================
+            writer.submit(save_transformations, T, source_file_path, grid_name, fields, field_DSs,
+                          description=f'{T.file_name} {grid_name} transformations')
+    finally:
+        # Entries of the outputs already queued are updated even if a later grid fails
+        writer.submit(T.update_solr, description=f'{T.file_name} Solr transformation entries')
+
+    if flush:
+        writer.flush()
 
+
+def load_grids(T: Transformation, grid_names: Iterable[str]) -> Tuple[dict, dict]:
+    """
+    Loads the model grids and the mapping operators from T's source grid to each of them.
+    Both are kept in the worker's grid cache for the granules that follow.
+    """
+    model_grids = {}
+    operators = {}
+    for grid_name in grid_names:
         logger.debug(f'Loading {grid_name} model grid')
-        grid_ds = xr.open_dataset(f'grids/{grid_name}.nc').reset_coords()
-        factors = T.make_factors(grid_ds)
-        T.prepopulate_solr(source_file_path, grid_name)
+        model_grids[grid_name] = grid_cache.load_grid(grid_name)
+        operators[grid_name] = grid_cache.load_operator(T, model_grids[grid_name])
+    return model_grids, operators
 
-        # =====================================================
-        # Run transformation
-        # =====================================================
-        logger.debug(f'Running transformations for {T.file_name}')
 
-        # Returns list of transformed DSs, one for each field in fields
-        field_DSs = T.transform(grid_ds, factors, ds)
-            
-        # =====================================================
-        # Save the output in netCDF format
-        # =====================================================
-        # Save each transformed granule for the current field
-        for field, (field_DS, success) in zip(fields, field_DSs):
-            output_filename = f'{grid_name}_{field.name}_{T.file_name[:-3]}.nc'
-            output_filename = f'{grid_name}_{field.name}_{T.file_name}.nc'
-            
-            output_path = f'{OUTPUT_DIR}/{T.ds_name}/transformed_products/{grid_name}/transformed/{field.name}/'
-            transformed_location = f'{output_path}{output_filename}'
-
-            os.makedirs(output_path, exist_ok=True)
-
-            # save field_DS
-            records.save_netcdf(field_DS, output_filename, output_path)
-
-            # Query Solr for transformation entry
-            query_fq = [f'dataset_s:{T.ds_name}', 'type_s:transformation', f'grid_name_s:{grid_name}',
-                        f'field_s:{field.name}', f'pre_transformation_file_path_s:"{source_file_path}"']
-
-            doc_id = solr_utils.solr_query(query_fq)[0]['id']
-
-            transformation_successes = transformation_successes and success
-            transformation_file_paths[f'{grid_name}_{field.name}_transformation_file_path_s'] = transformed_location
-
-            # Update Solr transformation entry with file paths and status
-            update_body = [
-                {
-                    "id": doc_id,
-                    "filename_s": {"set": output_filename},
-                    "transformation_file_path_s": {"set": transformed_location},
-                    "transformation_completed_dt": {"set": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")},
-                    "transformation_in_progress_b": {"set": False},
-                    "success_b": {"set": success},
-                    "transformation_checksum_s": {"set": file_utils.md5(transformed_location)},
-                    "transformation_version_f": {"set": T.transformation_version}
-                }
-            ]
-            
-            if success and 'Default empty model grid record' in field_DS.variables:
-                update_body[0]['transformation_note'] = {"set": 'Field not found in source data. Defaulting to empty record.'}
-
-            r = solr_utils.solr_update(update_body, r=True)
-
-            if r.status_code != 200:
-                logger.exception(f'Failed to update Solr transformation entry for {field["name"]} in {T.ds_name} on {T.date}')
-
-            if success and grid_name not in grids_updated:
-                grids_updated.append(grid_name)
-
-        logger.debug(f'CPU id {os.getpid()} saving {T.file_name} output file for grid {grid_name}')
\ No newline at end of file
+def transform_batch(granules: Iterable[Tuple[str, str]], tx_jobs: dict, config: dict):
+    """
+    Backfill version of transform for a batch of (source_file_path, granule_date) granules. Granules
+    are grouped by hemisphere, and so source grid, and the fields of each group are stacked into one
+    (time * fields, n_source) block and mapped to all grids with a single application of the stacked
+    operators (see transform_block). Outputs and Solr entries are saved per granule exactly as in transform.
+    """
+    Ts = []
+    dss = []
+    for source_file_path, granule_date in granules:
+        T = Transformation(config, source_file_path, granule_date)
+        logger.debug(f'Loading {T.file_name} data')
+        try:
+            dss.append(T.load_file(source_file_path))
+            Ts.append((T, source_file_path))
+        except Exception as e:
+            logger.exception(f'Error loading {source_file_path}: {e}')
+
+    for hemi in dict.fromkeys(T.hemi for T, _ in Ts):
+        group = [i for i, (T, _) in enumerate(Ts) if T.hemi == hemi]
+        try:
+            transform_block([Ts[i] for i in group], [dss[i] for i in group], tx_jobs)
+        except Exception as e:
+            logger.exception(f'Error transforming batch starting with {Ts[group[0]][1]}: {e}')
+    background_writer.get_writer().flush()
+
+
+def transform_block(Ts: Iterable[Tuple[Transformation, str]], dss: Iterable[xr.Dataset], tx_jobs: dict):
+    """
+    Maps the fields of granules sharing a source grid, given as (Transformation, source_file_path) and
+    their opened datasets, with a single application of the stacked operators and queues their outputs
+    on the background writer. A granule whose Solr entries or source data can't be prepared is logged
+    and left out, as it would have failed in transform.
+    """
+    # Granules share a source grid so the first one stands in for all of them
+    T_batch = Ts[0][0]
+
+    model_grids, full_operators = load_grids(T_batch, tx_jobs.keys())
+    # Only read the window of the source grid the grids' factors use. Granules whose fields don't
+    # match the source grid are read whole and mapped with the full operators.
+    window = T_batch.source_window(full_operators)
+    windowed_operators = T_batch.windowed_operators(full_operators, window) if window else None
+    granules = []
+    for ds in dss:
+        windowed_ds = T_batch.window_source(ds, window) if window else None
+        if windowed_ds is None:
+            granules.append((ds, full_operators))
+        else:
+            granules.append((windowed_ds, windowed_operators))
+
+    logger.info(f'Transforming {len(Ts)} granules from {Ts[0][0].date} to {Ts[-1][0].date} to {", ".join(tx_jobs.keys())}')
+
+    # =====================================================
+    # Apply pre transformations and collect source data
+    # =====================================================
+    collected = []
+    for (T, source_file_path), (ds, operators) in zip(Ts, granules):
+        try:
+            T.prepopulate_solr(source_file_path, tx_jobs.keys())
+            granule_data = T.collect_source_data(ds)
+        except Exception as e:
+            logger.exception(f'Error transforming {source_file_path}: {e}')
+            continue
+        collected.append(((T, source_file_path), operators, granule_data))
+
+    # =====================================================
+    # Map the block of granules sharing operators to all grids with one application of the stacked operators
+    # =====================================================
+    mapped_grids = {grid_name: {} for grid_name in tx_jobs.keys()}
+    for operators in [full_operators, windowed_operators]:
+        block = {(i, field_name): data for i, (_, granule_operators, granule_data) in enumerate(collected)
+                 if granule_operators is operators for field_name, data in granule_data[1].items()}
+        if not block:
+            continue
+        try:
+            mapped_block = T_batch.map_fields_to_grids(block, operators, model_grids)
+        except Exception as e:
+            logger.debug(f'Batched mapping failed for {len(block)} fields: {e}. Mapping granules individually.')
+            continue
+        for grid_name in tx_jobs.keys():
+            mapped_grids[grid_name].update(mapped_block[grid_name])
+
+    # =====================================================
+    # Make and save per granule records
+    # =====================================================
+    writer = background_writer.get_writer()
+    for grid_name, fields in tx_jobs.items():
+        mapped_block = mapped_grids[grid_name]
+        for i, ((T, source_file_path), operators, (ds, source_data, source_data_errors, missing_fields)) in enumerate(collected):
+            mapped_fields = {field_name: mapped_block[(i, field_name)] for field_name in source_data
+                             if (i, field_name) in mapped_block}
+            try:
+                field_DSs = T.make_records(model_grids[grid_name], operators[grid_name], ds, source_data,
+                                           source_data_errors, missing_fields, mapped_fields)
+                writer.submit(save_transformations, T, source_file_path, grid_name, fields, field_DSs,
+                              description=f'{T.file_name} {grid_name} transformations')
+            except Exception as e:
+                logger.exception(f'Error transforming {source_file_path}: {e}')
+    for (T, _), _, _ in collected:
+        writer.submit(T.update_solr, description=f'{T.file_name} Solr transformation entries')
@@ -1,20 +1,25 @@
 import logging
+import math
 import os
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from multiprocessing import Pool, cpu_count, current_process
-from typing import Iterable
+from typing import Iterable, Tuple
 
 import xarray as xr
 from baseclasses import Dataset
-from transformations.grid_transformation import Transformation, transform
-from utils.pipeline_utils import log_config, solr_utils
+from transformations.grid_transformation import Transformation, load_granule, transform, transform_batch
+from utils.pipeline_utils import log_config, memory_utils, solr_utils
+from utils.processing_utils import background_writer, factors_cache, grid_cache
 
 logger = logging.getLogger('pipeline')
 
 
-def multiprocess_transformation(config: dict, granule: dict, tx_jobs: dict, log_level: str, log_dir: str):
+def multiprocess_transformation(config: dict, granule: dict, tx_jobs: dict, log_level: str, log_dir: str) -> Tuple[int, dict, dict, dict]:
     """
     Callable function that performs the actual transformation on a granule.
+    Returns the worker's pid, memory usage, grid cache stats and prefetch stats (empty) after the transformation.
     """
     try:
         logger = log_config.mp_logging(str(current_process().pid), log_level, log_dir)
@@ -27,7 +32,7 @@ def multiprocess_transformation(config: dict, granule: dict, tx_jobs: dict, log_
     # Skips granules that weren't harvested properly
     if not granule_filepath or granule.get('file_size_l') < 100:
         logger.exception(f'Granule {granule_filepath} was not harvested properly. Skipping.')
-        return
+        return os.getpid(), memory_utils.process_memory(), grid_cache.cache.stats(), {}
 
     # Perform remaining transformations
     try:
@@ -35,14 +40,170 @@ def multiprocess_transformation(config: dict, granule: dict, tx_jobs: dict, log_
         transform(granule_filepath, tx_jobs, config, granule_date)
     except Exception as e:
         logger.exception(f'Error transforming {granule_filepath}: {e}')
+
+    memory_usage = memory_utils.process_memory()
+    logger.debug(f'Worker memory after {granule_filepath.split("/")[-1]}: {memory_utils.format_memory(memory_usage)}')
+    return os.getpid(), memory_usage, grid_cache.cache.stats(), {}
+
+
+def multiprocess_batch_transformation(config: dict, granules: Iterable[dict], tx_jobs: dict, log_level: str, log_dir: str) -> Tuple[int, dict, dict, dict]:
+    """
+    Backfill counterpart of multiprocess_transformation that transforms a batch of granules
+    sharing a source grid and hemisphere together.
+    Returns the worker's pid, memory usage, grid cache stats and prefetch stats (empty) after the transformations.
+    """
+    try:
+        logger = log_config.mp_logging(str(current_process().pid), log_level, log_dir)
+    except Exception as e:
+        print(e)
+
+    batch = []
+    for granule in granules:
+        granule_filepath = granule.get('pre_transformation_file_path_s')
+        # Skips granules that weren't harvested properly
+        if not granule_filepath or granule.get('file_size_l') < 100:
+            logger.exception(f'Granule {granule_filepath} was not harvested properly. Skipping.')
+            continue
+        batch.append((granule_filepath, granule.get('date_s')))
+
+    if batch:
+        try:
+            logger.info(f'{sum([len(v) for v in tx_jobs.values()])} remaining transformations for {len(batch)} granules')
+            transform_batch(batch, tx_jobs, config)
+        except Exception as e:
+            logger.exception(f'Error transforming batch starting with {batch[0][0]}: {e}')
+
+    memory_usage = memory_utils.process_memory()
+    logger.debug(f'Worker memory after batch of {len(batch)} granules: {memory_utils.format_memory(memory_usage)}')
+    return os.getpid(), memory_usage, grid_cache.cache.stats(), {}
         
         
+def multiprocess_prefetched_transformation(config: dict, jobs: Iterable[Tuple[dict, dict]], log_level: str, log_dir: str,
+                                           prefetch_depth: int = 0) -> Tuple[int, dict, dict, dict]:
+    """
+    Counterpart of multiprocess_transformation for a sequence of (granule, tx_jobs) jobs. While a granule
+    is transformed, the next prefetch_depth granules are read on a background thread.
+    Returns the worker's pid, memory usage, grid cache stats and prefetch stats after the transformations.
+    """
+    try:
+        logger = log_config.mp_logging(str(current_process().pid), log_level, log_dir)
+    except Exception as e:
+        print(e)
+
+    valid_jobs = []
+    for granule, tx_jobs in jobs:
+        # Skips granules that weren't harvested properly
+        if not granule.get('pre_transformation_file_path_s') or granule.get('file_size_l') < 100:
+            logger.exception(f'Granule {granule.get("pre_transformation_file_path_s")} was not harvested properly. Skipping.')
+            continue
+        valid_jobs.append((granule['pre_transformation_file_path_s'], tx_jobs, config, granule.get('date_s')))
+
+    def timed_load_granule(*job):
+        start = time.perf_counter()
+        return load_granule(*job), time.perf_counter() - start
+
+    # read_s: time spent reading granules, wait_s: time spent waiting on reads
+    prefetch_stats = {'granules': 0, 'read_s': 0., 'wait_s': 0.}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        loads = deque()
+        for i, job in enumerate(valid_jobs):
+            # Keep the current granule and up to prefetch_depth granules after it in flight
+            while len(loads) <= prefetch_depth and i + len(loads) < len(valid_jobs):
+                loads.append(executor.submit(timed_load_granule, *valid_jobs[i + len(loads)]))
+
+            granule_filepath = job[0]
+            try:
+                wait_start = time.perf_counter()
+                loads_future = loads.popleft()
+                loaded_granule, read_time = loads_future.result()
+                prefetch_stats['wait_s'] += time.perf_counter() - wait_start
+                prefetch_stats['read_s'] += read_time
+                prefetch_stats['granules'] += 1
+
+                logger.info(f'{sum([len(v) for v in job[1].values()])} remaining transformations for {granule_filepath.split("/")[-1]}')
+                # Outputs are saved in the background while the next granule is transformed
+                transform(*job, granule=loaded_granule, flush=False)
+            except Exception as e:
+                logger.exception(f'Error transforming {granule_filepath}: {e}')
+        try:
+            background_writer.get_writer().flush()
+        except Exception as e:
+            logger.exception(f'Error saving transformations: {e}')
+
+    memory_usage = memory_utils.process_memory()
+    logger.debug(f'Worker memory after {len(valid_jobs)} granules: {memory_utils.format_memory(memory_usage)}')
+    return os.getpid(), memory_usage, grid_cache.cache.stats(), prefetch_stats
+
+
+def worker_log_settings(log_subdir: str) -> Tuple[str, str]:
+    """
+    Log level and directory, within the pipeline's log directory, for worker logs
+    """
+    log_level = logging.getLevelName(logging.getLogger('pipeline').level)
+    log_dir = os.path.dirname(logging.getLogger('pipeline').handlers[0].baseFilename)
+    log_dir = os.path.join(log_dir[log_dir.find('logs/'):], log_subdir)
+    return log_level, log_dir
+
+
+def multiprocess_factors(config: dict, granule_filepath: str, grid_name: str, processes: int, log_level: str, log_dir: str):
+    """
+    Callable function that generates the mapping factors from a granule's source grid to a model grid,
+    searching tiles of the model grid across processes. Returns whether the factors were generated.
+    """
+    try:
+        logger = log_config.mp_logging(str(current_process().pid), log_level, log_dir)
+    except Exception as e:
+        print(e)
+
+    grid_ds = xr.open_dataset(f'grids/{grid_name}.nc')
+    T = Transformation(config, granule_filepath, '1972-01-01')
+    try:
+        # A single process searching tiles uses as many cpus for its queries instead
+        T.make_factors(grid_ds, processes=processes, workers=processes)
+    except Exception as e:
+        logger.exception(f'Error generating {grid_name} factors for {T.ds_name}{T.hemi}: {e}')
+        return False
+    return True
+
+
+def pregenerate_factors(factor_jobs: dict, user_cpus: int, log_level: str, log_dir: str) -> int:
+    """
+    Generates factors for factor jobs keyed by factors cache key, so that jobs with identical source grid
+    geometry and model grid (ex: from several datasets) are only run once. Jobs run in parallel with the
+    remaining cpus split between the tile searches of each job.
+    Returns the number of sets of factors generated.
+    """
+    if not factor_jobs:
+        return 0
+    workers = min(user_cpus, len(factor_jobs))
+    processes = max(1, user_cpus // workers)
+    logger.info(f'Generating {len(factor_jobs)} sets of factors using {workers} worker(s) of {processes} process(es)')
+
+    job_params = [(config, granule_filepath, grid_name, processes, log_level, log_dir)
+                  for config, granule_filepath, grid_name in factor_jobs.values()]
+    if workers == 1:
+        generated = sum(multiprocess_factors(*job_param) for job_param in job_params)
+    else:
+        # multiprocessing.Pool workers are daemonic and so can't start the pools used to search tiles
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            generated = sum(executor.map(multiprocess_factors, *zip(*job_params)))
+
+    if generated < len(factor_jobs):
+        logger.error(f'Unable to generate {len(factor_jobs) - generated} of {len(factor_jobs)} sets of factors')
+    return generated
+
+
 class TxJobFactory(Dataset):
     
-    def __init__(self, config: dict, user_cpus: int = 1, grids_to_use: Iterable[str]=[]) -> None:
+    def __init__(self, config: dict, user_cpus: int = 1, grids_to_use: Iterable[str]=[], backfill_days: int = 1,
+                 prefetch_depth: int = 0) -> None:
         super().__init__(config)
         self.config = config
         self.user_cpus = user_cpus
+        # Granules per batch in backfill mode. 1 transforms granules one at a time.
+        self.backfill_days = backfill_days
+        # Granules each worker reads ahead of the one it is transforming. 0 disables prefetching.
+        self.prefetch_depth = prefetch_depth
         self.harvested_granules = solr_utils.solr_query([f'dataset_s:{self.ds_name}', 'type_s:granule', 'harvest_success_b:true'])
 
         if not grids_to_use:
@@ -68,23 +229,80 @@ class TxJobFactory(Dataset):
     def initialize_jobs(self):
         self.pregenerate_factors()
         self.job_params = self.generate_jobs()
-        logger.info(f'{len(self.job_params)} harvested granules with remaining transformations.')
+        logger.info(f'{len(self.job_params)} transformation jobs for harvested granules with remaining transformations.')
         
     def execute_jobs(self):
         if self.job_params:
+            if self.backfill_days > 1:
+                job_function = multiprocess_batch_transformation
+            elif self.prefetch_depth > 0:
+                job_function = multiprocess_prefetched_transformation
+            else:
+                job_function = multiprocess_transformation
             if self.user_cpus == 1:
                 logger.info('Not using multiprocessing to do transformation')
-                for job_param in self.job_params:
-                    multiprocess_transformation(*job_param)
+                # Start from an empty cache, rather than the grids and factors of the previous dataset
+                grid_cache.cache.clear()
+                worker_results = [job_function(*job_param) for job_param in self.job_params]
+                grid_cache.cache.clear()
             else:
                 user_cpus = min(self.user_cpus, int(cpu_count()/4), len(self.job_params))
                 logger.info(f'Using {user_cpus} CPUs to do {len(self.job_params)} multiprocess transformation jobs')
                     
                 with Pool(processes=user_cpus) as pool:
-                    pool.starmap_async(multiprocess_transformation, self.job_params)
+                    results = pool.starmap_async(job_function, self.job_params)
                     pool.close()
                     pool.join()
+                try:
+                    worker_results = results.get()
+                except Exception as e:
+                    logger.error(f'Unable to collect transformation worker memory usage: {e}')
+                    worker_results = []
+            self.report_worker_memory(worker_results)
+            self.report_grid_cache(worker_results)
+            self.report_prefetch(worker_results)
+
+    def report_worker_memory(self, worker_results: Iterable[Tuple[int, dict, dict, dict]]):
+        '''
+        Logs the final memory usage of each transformation worker. Factors are memory-mapped
+        so pss (shared pages split between workers) is the better measure of per worker cost.
+        '''
+        final_usage = {pid: usage for pid, usage, _, _ in worker_results if usage}
+        for pid, usage in final_usage.items():
+            logger.info(f'Transformation worker {pid} memory: {memory_utils.format_memory(usage)}')
+        peak_rss = [usage['peak_rss'] for usage in final_usage.values() if 'peak_rss' in usage]
+        if peak_rss:
+            logger.info(f'Max transformation worker peak RSS: {max(peak_rss):.0f} MB across {len(final_usage)} worker(s)')
+
+    def report_grid_cache(self, worker_results: Iterable[Tuple[int, dict, dict, dict]]):
+        '''
+        Logs the hit rate of the grid and factors cache of each transformation worker, and across all of them
+        '''
+        final_stats = {}
+        for pid, _, stats, _ in worker_results:
+            # Stats are cumulative so the worker's totals are from its last job, the one with the most lookups
+            if pid not in final_stats or stats['hits'] + stats['misses'] > final_stats[pid]['hits'] + final_stats[pid]['misses']:
+                final_stats[pid] = stats
+        for pid, stats in final_stats.items():
+            logger.debug(f'Transformation worker {pid} grid cache: {grid_cache.format_stats(stats)}')
+        if final_stats:
+            total = {key: sum(stats[key] for stats in final_stats.values()) for key in ['hits', 'misses', 'entries', 'size_mb']}
+            logger.info(f'Grid cache across {len(final_stats)} worker(s): {grid_cache.format_stats(total)}')
                     
+    def report_prefetch(self, worker_results: Iterable[Tuple[int, dict, dict, dict]]):
+        '''
+        Logs how much of the time spent reading granules was overlapped with transforming them
+        '''
+        prefetch_stats = [stats for _, _, _, stats in worker_results if stats]
+        if not prefetch_stats:
+            return
+        read_s = sum(stats['read_s'] for stats in prefetch_stats)
+        wait_s = sum(stats['wait_s'] for stats in prefetch_stats)
+        overlap_s = max(read_s - wait_s, 0)
+        logger.info(f'Prefetching overlapped {overlap_s:.1f}s of {read_s:.1f}s spent reading '
+                    f'{sum(stats["granules"] for stats in prefetch_stats)} granules '
+                    f'({overlap_s / read_s if read_s else 0:.0%}) with transformation')
+
     def pipeline_cleanup(self) -> str:
         # Query Solr for dataset metadata
         fq = [f'dataset_s:{self.ds_name}', 'type_s:dataset']
@@ -124,15 +342,29 @@ class TxJobFactory(Dataset):
     
     def pregenerate_factors(self):
         '''
-        Generates mapping factors for all grids used for the given transformation version. Loads them into
-        Factors object which is used to reduce I/O.
+        Generates mapping factors for all grids used for the given transformation version, in parallel
+        across user_cpus processes. Factors already in the factors cache are skipped.
         '''
+        log_level, log_dir = worker_log_settings(f'tx_{self.ds_name}')
+        pregenerate_factors(self.factor_jobs(), self.user_cpus, log_level, log_dir)
+
+    def factor_jobs(self) -> dict:
+        '''
+        Returns the (config, granule path, grid name) factor jobs needed by this dataset, keyed by
+        factors cache key. Jobs whose factors are already cached are left out.
+        '''
+        factor_jobs = {}
+        transformations = [(granule['pre_transformation_file_path_s'],
+                            Transformation(self.config, granule['pre_transformation_file_path_s'], '1972-01-01'))
+                           for granule in self.find_data_for_factors()]
         for grid in self.grids:
-            for granule in self.find_data_for_factors():
-                grid_ds = xr.open_dataset(f'grids/{grid}.nc')
-                T = Transformation(self.config, granule['pre_transformation_file_path_s'], '1972-01-01')
-                T.make_factors(grid_ds)
-                
+            grid_ds = xr.open_dataset(f'grids/{grid}.nc')
+            for granule_filepath, T in transformations:
+                key = factors_cache.factors_key(T.factors_header(grid_ds))
+                if not os.path.exists(factors_cache.factors_path(key)):
+                    factor_jobs[key] = (self.config, granule_filepath, grid)
+        return factor_jobs
+
     def find_data_for_factors(self) -> Iterable[dict]:
         '''
         Returns Solr granule entry (two in the case of hemispherical data) to be used
@@ -164,18 +396,53 @@ class TxJobFactory(Dataset):
                 
     def generate_jobs(self):
         logger.info('Generating jobs...')
-        log_level = logging.getLevelName(logging.getLogger('pipeline').level)
-        log_dir = os.path.dirname(logging.getLogger('pipeline').handlers[0].baseFilename)
-        log_dir = os.path.join(log_dir[log_dir.find('logs/'):], f'tx_{self.ds_name}')
+        log_level, log_dir = worker_log_settings(f'tx_{self.ds_name}')
         
         all_jobs = self.get_tx_jobs()
+        if self.backfill_days > 1:
+            all_jobs = self.batch_jobs(all_jobs)
+        elif self.prefetch_depth > 0:
+            return [(self.config, jobs, log_level, log_dir, self.prefetch_depth) for jobs in self.sequence_jobs(all_jobs)]
 
         new_jobs = []
         for (granule, grid_fields) in all_jobs:
             job_params = (self.config, granule, grid_fields, log_level, log_dir)
             new_jobs.append(job_params)
         return new_jobs
+
+    def sequence_jobs(self, all_jobs: Iterable[Tuple[dict, dict]]) -> Iterable[Iterable[Tuple[dict, dict]]]:
+        '''
+        Splits granule jobs, in date order, into sequences that a worker transforms while prefetching
+        the next granule. Each worker gets around four sequences so work stays balanced across workers.
+        '''
+        all_jobs = sorted(all_jobs, key=lambda job: job[0].get('date_s', ''))
+        workers = max(1, min(self.user_cpus, int(cpu_count()/4)))
+        sequence_length = max(1, math.ceil(len(all_jobs) / (workers * 4))) if workers > 1 else len(all_jobs)
+        sequences = [all_jobs[i:i + sequence_length] for i in range(0, len(all_jobs), sequence_length)]
+        logger.info(f'Split {len(all_jobs)} granules into {len(sequences)} sequences prefetching up to {self.prefetch_depth} granule(s) ahead')
+        return sequences
     
+    def batch_jobs(self, all_jobs: Iterable[Tuple[dict, dict]]) -> Iterable[Tuple[Iterable[dict], dict]]:
+        '''
+        Groups granule jobs sharing a hemisphere (and so a source grid) and the same remaining
+        grid/field transformations into date ordered batches of up to backfill_days granules.
+        Hemispheres are found from file names, as when the granules are transformed.
+        '''
+        groups = defaultdict(list)
+        for granule, grid_fields in all_jobs:
+            hemi = Transformation(self.config, granule.get('pre_transformation_file_path_s') or '', granule.get('date_s')).hemi
+            key = (hemi, tuple((grid, tuple(field.name for field in fields)) for grid, fields in grid_fields.items()))
+            groups[key].append((granule, grid_fields))
+
+        batched_jobs = []
+        for jobs in groups.values():
+            jobs.sort(key=lambda job: job[0].get('date_s', ''))
+            for i in range(0, len(jobs), self.backfill_days):
+                batch = jobs[i:i + self.backfill_days]
+                batched_jobs.append(([granule for granule, _ in batch], batch[0][1]))
+        logger.info(f'Grouped {len(all_jobs)} granules into {len(batched_jobs)} backfill batches of up to {self.backfill_days} granules')
+        return batched_jobs
+
     def get_tx_jobs(self):
         fq = [f'dataset_s:{self.ds_name}', 'type_s:transformation']
         solr_txs = solr_utils.solr_query(fq)
@@ -1,18 +1,88 @@
 import hashlib
+import os
 import re
+import time
 from datetime import datetime
 import logging
 
+import requests
+from conf import global_settings
 
-def md5(fname: str) -> str:
+logger = logging.getLogger('pipeline')
+
+# Bytes read at a time when checksumming files, and downloaded at a time
+MD5_BUFFER_SIZE = getattr(global_settings, 'MD5_BUFFER_SIZE', 1024**2)
+
+# Checksums of files written through HashingWriter, keyed by path, along with the size and
+# modification time of the file they were computed for
+_written_checksums = {}
+
+
+class HashingWriter():
     """
-    Creates md5 checksum from file
+    Binary file opened for writing that checksums the data written to it, so md5 doesn't need to
+    read the file back
     """
-    hash_md5 = hashlib.md5()
 
-    with open(fname, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.file = open(fname, 'wb')
+        self.hash_md5 = hashlib.md5()
+        self.hash_time = 0
+
+    def write(self, data: bytes) -> int:
+        start = time.perf_counter()
+        self.hash_md5.update(data)
+        self.hash_time += time.perf_counter() - start
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        stat = os.stat(self.fname)
+        _written_checksums[os.path.realpath(self.fname)] = (stat.st_size, stat.st_mtime_ns, self.hash_md5.hexdigest())
+        logger.debug(f'md5 of {self.fname} ({stat.st_size / 1024**2:.1f} MB) computed while writing in {self.hash_time:.3f}s')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Incomplete files aren't recorded
+            self.file.close()
+
+
+def download(src: str, dst: str):
+    """
+    Streams src to dst, checksumming it as it's written
+    """
+    r = requests.get(src, stream=True)
+    r.raise_for_status()
+    with HashingWriter(dst) as f:
+        for chunk in r.iter_content(chunk_size=MD5_BUFFER_SIZE):
+            f.write(chunk)
+
+
+def md5(fname: str, buffer_size: int = MD5_BUFFER_SIZE) -> str:
+    """
+    Creates md5 checksum from file. Files written through HashingWriter and unchanged since aren't
+    read again. Otherwise the file is read buffer_size bytes at a time (from the page cache, for
+    files just written).
+    """
+    stat = os.stat(fname)
+    written = _written_checksums.pop(os.path.realpath(fname), None)
+    if written and written[:2] == (stat.st_size, stat.st_mtime_ns):
+        return written[2]
+
+    start = time.perf_counter()
+    hash_md5 = hashlib.md5()
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(fname, 'rb', buffering=0) as f:
+        for n in iter(lambda: f.readinto(buffer), 0):
+            hash_md5.update(view[:n])
+    logger.debug(f'md5 of {fname} ({stat.st_size / 1024**2:.1f} MB) computed in {time.perf_counter() - start:.3f}s')
     return hash_md5.hexdigest()
 
 
@@ -8,6 +8,7 @@ import netrc
 import xarray as xr
 from datetime import datetime
 from utils.pipeline_utils import solr_utils, config_validator, log_config, file_utils
+from utils.processing_utils import factors_cache, factors_io
 
 try:
     import conf.global_settings as global_settings
@@ -53,10 +54,15 @@ def wipe_factors():
     logger = logging.getLogger('pipeline')
     
     logger.info('Removing all factors')
-    all_factors = glob(f'{OUTPUT_DIR}/**/transformed_products/**/*_factors')
+    try:
+        factors_cache.clear()
+    except:
+        logger.error(f'Error clearing factors cache {factors_cache.CACHE_DIR}')
+    # Factors stored per dataset by earlier versions of the pipeline
+    all_factors = glob(f'{OUTPUT_DIR}/**/transformed_products/**/*_factors*')
     for factors_file in all_factors:
         try:
-            os.remove(factors_file)
+            factors_io.remove_factors(factors_file)
         except:
             logger.error(f'Error removing {factors_file}')
         logger.info('Successfully removed all factors')
@@ -0,0 +1,33 @@
+import resource
+import sys
+
+
+def process_memory() -> dict:
+    '''
+    Returns memory usage of the current process in MB:
+    rss - current resident set size
+    peak_rss - peak resident set size
+    pss - proportional set size, which splits shared pages (ie: memory-mapped factors)
+          between the processes using them. Only available on Linux.
+    '''
+    usage = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    usage['rss'] = int(line.split()[1]) / 1024
+                elif line.startswith('VmHWM:'):
+                    usage['peak_rss'] = int(line.split()[1]) / 1024
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    usage['pss'] = int(line.split()[1]) / 1024
+    except OSError:
+        # ru_maxrss is in bytes on macOS and KB elsewhere
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage['peak_rss'] = peak_rss / 1024**2 if sys.platform == 'darwin' else peak_rss / 1024
+    return usage
+
+
+def format_memory(usage: dict) -> str:
+    return ', '.join([f'{key} {value:.0f} MB' for key, value in usage.items()])
@@ -1,4 +1,5 @@
 import os
+import shutil
 import time
 from datetime import datetime
 from pathlib import Path
@@ -26,11 +27,13 @@ def solr_query(fq: Iterable[str], fl: str='') -> Iterable[dict]:
         response = requests.get(url, params=query_params, headers={'Connection': 'close'})
     return response.json()['response']['docs']
 
-def solr_update(update_body: Iterable[dict], r: bool=False):
+def solr_update(update_body: Iterable[dict], r: bool=False, soft_commit: bool=False):
     '''
-    Submit update to Solr
+    Submit update to Solr. With soft_commit, the update is made visible to searches without
+    flushing the index to disk, which is left to the next hard commit.
     '''
-    url = f'{SOLR_HOST}{SOLR_COLLECTION}/update?commit=true'
+    commit = 'softCommit=true' if soft_commit else 'commit=true'
+    url = f'{SOLR_HOST}{SOLR_COLLECTION}/update?{commit}'
     response = requests.post(url, json=update_body)    
     if r:
         return response
@@ -116,7 +119,8 @@ def delete_mismatch_transformations():
     Function called when using the wipe_transformations pipeline argument. Queries
     Solr for all transformation entries for the given dataset and compares the
     transformation version in Solr and in the config YAML. If they differ, the
-    function deletes the transformed file from disk and the entry from Solr.
+    function deletes the transformed file from disk and the entry from Solr. Files
+    shared with current transformations (consolidated files and year stores) are kept.
     """
     datasets = [os.path.splitext(ds)[0] for ds in os.listdir('conf/ds_configs') if ds != '.DS_Store' and 'tpl' not in ds]
     datasets.sort()
@@ -131,11 +135,20 @@ def delete_mismatch_transformations():
         fq = [f'dataset_s:{dataset_name}', 'type_s:transformation']
         transformations = solr_query(fq)
 
+        # Consolidated files and year stores hold several transformations, and are only
+        # removed once none of them is current
+        current_paths = {transformation.get('transformation_file_path_s') for transformation in transformations
+                         if transformation['transformation_version_f'] == config_version}
+
         for transformation in transformations:
             if transformation['transformation_version_f'] != config_version:
                 # Remove file from disk
-                if os.path.exists(transformation['transformation_file_path_s']):
-                    os.remove(transformation['transformation_file_path_s'])
+                path = transformation['transformation_file_path_s']
+                if path not in current_paths:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    elif os.path.exists(path):
+                        os.remove(path)
 
                 # Remove transformation entry from Solr
                 url = f'{SOLR_HOST}{SOLR_COLLECTION}/update?commit=true'
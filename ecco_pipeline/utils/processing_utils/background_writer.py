@@ -0,0 +1,84 @@
+import atexit
+import queue
+import threading
+from typing import Callable
+
+'''
+Process local writer thread that saves transformation outputs (compression, writing, checksums and
+Solr updates) while the worker goes on computing the next outputs. Writes are queued in a bounded
+queue so no more than MAX_QUEUED sets of outputs are held in memory waiting to be written.
+Failed writes are raised by the next flush, and anything still queued is written when the process exits.
+'''
+
+MAX_QUEUED = 4
+
+
+class BackgroundWriteError(Exception):
+    """Raise for writes that failed on the writer thread"""
+
+
+class BackgroundWriter():
+    '''
+    Runs submitted write calls in order on a single background thread
+    '''
+
+    def __init__(self, max_queued: int = MAX_QUEUED) -> None:
+        self.queue = queue.Queue(maxsize=max_queued)
+        # (description, exception) of writes that failed since the last flush
+        self.errors = []
+        self.thread = threading.Thread(target=self._run, name='background_writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            write, args, description = self.queue.get()
+            try:
+                if write is None:
+                    return
+                write(*args)
+            except Exception as e:
+                self.errors.append((description, e))
+            finally:
+                self.queue.task_done()
+
+    def submit(self, write: Callable, *args, description: str = ''):
+        '''
+        Queues write(*args), waiting if the queue is full. description identifies the write if it fails.
+        '''
+        self.queue.put((write, args, description))
+
+    def flush(self):
+        '''
+        Waits for all queued writes to finish. Raises BackgroundWriteError, from the first
+        error, if any write failed since the last flush.
+        '''
+        self.queue.join()
+        if self.errors:
+            errors, self.errors = self.errors, []
+            failed = '; '.join(f'{description}: {e}' for description, e in errors)
+            raise BackgroundWriteError(f'Error writing {failed}') from errors[0][1]
+
+    def close(self):
+        '''
+        Writes everything queued, then stops the writer thread
+        '''
+        try:
+            self.flush()
+        finally:
+            if self.thread.is_alive():
+                self.queue.put((None, (), ''))
+                self.thread.join()
+
+
+_writer = None
+
+
+def get_writer() -> BackgroundWriter:
+    '''
+    The process' writer, started on first use
+    '''
+    global _writer
+    if _writer is None:
+        _writer = BackgroundWriter()
+        atexit.register(_writer.close)
+    return _writer
@@ -10,6 +10,17 @@ logger = logging.getLogger(str(current_process().pid))
 
 class FuncNotFound(Exception):
     """Raise for processing func not found"""
+
+
+def reads(*variables: str):
+    '''
+    Declares the variables a pre transformation function reads beyond the fields it is applied to,
+    so only those need to be loaded from source files
+    '''
+    def decorator(func):
+        func.reads = list(variables)
+        return func
+    return decorator
     
 class PreprocessingFuncs():
     '''
@@ -48,6 +59,19 @@ class PretransformationFuncs():
             ds = self.call_function(func_name, ds)
         return ds
     
+    def variables_read(self, function_names: Iterable[str]) -> Iterable[str]:
+        '''
+        Variables the given functions read beyond the configured fields. None if any of them
+        hasn't declared what it reads.
+        '''
+        variables = []
+        for func_name in function_names:
+            func_reads = getattr(getattr(self, func_name, None), 'reads', None)
+            if func_reads is None:
+                return None
+            variables.extend(func_reads)
+        return variables
+
     def call_function(self, function_name: str, ds: xr.Dataset) -> xr.Dataset:
         # Get the function dynamically by name
         func = getattr(self, function_name, None)
@@ -60,6 +84,7 @@ class PretransformationFuncs():
             raise FuncNotFound(f"Function '{function_name}' not found")
         return ds
     
+    @reads('analysed_sst', 'sea_ice_fraction')
     def AVHRR_remove_ice_or_near_ice(self, ds: xr.Dataset) -> xr.Dataset:
         '''
         Replaces SST values < -0.5 or sea_ice_fraction > 0 to NaN
@@ -74,6 +99,7 @@ class PretransformationFuncs():
         return ds
 
 
+    @reads()
     def RDEFT4_remove_negative_values(self, ds: xr.Dataset) -> xr.Dataset:
         '''
         Replaces negative values with nans for all data vars
@@ -85,6 +111,7 @@ class PretransformationFuncs():
         return ds
 
 
+    @reads('nsidc_nt_seaice_conc', 'cdr_seaice_conc', 'spatial_interpolation_flag')
     def G02202_mask_flagged_conc(self, ds: xr.Dataset) -> xr.Dataset:
         '''
         Masks out values greater than 1 in nsidc_nt_seaice_conc and cdr_seaice_conc
@@ -108,6 +135,7 @@ class PretransformationFuncs():
         return ds
 
 
+    @reads('lwe_thickness', 'uncertainty', 'land_mask')
     def GRACE_MASCON(self, ds: xr.Dataset) -> xr.Dataset:
         '''
         Mask out land, setting land points to NaN.
@@ -0,0 +1,206 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing import current_process
+from typing import Iterable
+
+from conf import global_settings
+from conf.global_settings import OUTPUT_DIR
+from utils.processing_utils import factors_io
+
+logger = logging.getLogger(str(current_process().pid))
+
+'''
+Content addressed cache of mapping factors, shared across datasets and transformation versions.
+
+Factors are stored in the factors_io format at {OUTPUT_DIR}/factors_cache/{key}/ where key is a
+hash of the parameters that determine the factors (KEY_PARAMS): the source grid geometry, the
+target grid checksum and the mapping parameters. Datasets with identical source grids therefore
+share factors, and bumping t_version reuses them as long as the geometry doesn't change.
+
+index.json records each entry's parameters, size on disk, the datasets that have used it and
+when it was last used. When the cache grows past FACTORS_CACHE_SIZE_GB (optional, in
+global_settings.py) the least recently used entries are evicted.
+'''
+
+CACHE_DIR = os.path.join(OUTPUT_DIR, 'factors_cache')
+INDEX_FILENAME = 'index.json'
+KEY_PARAMS = ['data_res', 'area_extent', 'dims', 'proj_info', 'grid_checksum',
+              'neighbours', 'neighbour_search_backend', 'source_coarsening']
+# Parameters added since the cache was introduced, only part of the key when set so existing keys are unchanged
+OPTIONAL_KEY_PARAMS = ['target_mask']
+
+# Cache size limit in GB. None for no limit
+FACTORS_CACHE_SIZE_GB = getattr(global_settings, 'FACTORS_CACHE_SIZE_GB', None)
+
+# Keys whose last use has already been recorded by this process
+_touched = set()
+
+
+def key_params(header: dict) -> dict:
+    params = {param: header.get(param) for param in KEY_PARAMS}
+    params.update({param: header[param] for param in OPTIONAL_KEY_PARAMS if header.get(param) is not None})
+    return params
+
+
+def factors_key(header: dict) -> str:
+    '''
+    Cache key of the factors described by a factors header
+    '''
+    return hashlib.md5(json.dumps(key_params(header), sort_keys=True).encode()).hexdigest()
+
+
+def factors_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key)
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+@contextmanager
+def locked_index():
+    '''
+    Yields the cache index while holding an exclusive lock on it, and writes it back on exit
+    '''
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    index_path = os.path.join(CACHE_DIR, INDEX_FILENAME)
+    with open(f'{index_path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        yield index
+
+        tmp_path = f'{index_path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=4)
+        os.replace(tmp_path, index_path)
+
+
+def record(key: str, header: dict, ds_name: str):
+    '''
+    Adds newly created factors to the index and evicts entries if the cache is over its size limit
+    '''
+    with locked_index() as index:
+        entry = index.setdefault(key, {'params': key_params(header), 'datasets': []})
+        entry['grid_name'] = header.get('grid_name')
+        entry['size_bytes'] = directory_size(factors_path(key))
+        entry['last_used'] = datetime.utcnow().isoformat()
+        if ds_name not in entry['datasets']:
+            entry['datasets'].append(ds_name)
+        if FACTORS_CACHE_SIZE_GB is not None:
+            evict(index, FACTORS_CACHE_SIZE_GB * 1024**3, keep=[key])
+    _touched.add(key)
+
+
+def touch(key: str, header: dict, ds_name: str):
+    '''
+    Records that ds_name used the factors. Only the first use in a process updates the index.
+    '''
+    if key in _touched:
+        return
+    with locked_index() as index:
+        if key not in index:
+            index[key] = {'params': key_params(header), 'datasets': [], 'grid_name': header.get('grid_name'),
+                          'size_bytes': directory_size(factors_path(key))}
+        index[key]['last_used'] = datetime.utcnow().isoformat()
+        if ds_name not in index[key]['datasets']:
+            index[key]['datasets'].append(ds_name)
+    _touched.add(key)
+
+
+def evict(index: dict, max_bytes: float, keep: Iterable[str] = []):
+    '''
+    Removes least recently used entries until the cache is at most max_bytes. Entries in keep are not removed.
+    '''
+    total_bytes = sum(entry.get('size_bytes', 0) for entry in index.values())
+    for key in sorted(index, key=lambda key: index[key].get('last_used', '')):
+        if total_bytes <= max_bytes:
+            break
+        if key in keep:
+            continue
+        logger.info(f'Evicting {index[key].get("grid_name")} factors {key} from factors cache')
+        total_bytes -= index[key].get('size_bytes', 0)
+        _remove_files(key)
+        del index[key]
+
+
+def _remove_files(key: str):
+    path = factors_path(key)
+    if os.path.exists(path):
+        factors_io.remove_factors(path)
+    factors_io.remove_tiles(path)
+
+
+def remove(key: str):
+    '''
+    Removes an entry, ex: factors that could not be loaded
+    '''
+    with locked_index() as index:
+        _remove_files(key)
+        index.pop(key, None)
+    _touched.discard(key)
+
+
+def clear():
+    '''
+    Removes every entry in the index, along with any factors in the cache directory missing from it
+    '''
+    with locked_index() as index:
+        for key in list(index):
+            _remove_files(key)
+            del index[key]
+        for path in os.listdir(CACHE_DIR):
+            if not path.startswith(INDEX_FILENAME):
+                shutil.rmtree(os.path.join(CACHE_DIR, path), ignore_errors=True)
+    _touched.clear()
+
+
+def matches(existing_header: dict, header: dict) -> bool:
+    '''
+    Whether factors saved with existing_header are the factors described by header. Headers of
+    factors converted from pickles have no grid_checksum, so only their number of target cells
+    is checked against the target grid.
+    '''
+    existing_header = {**factors_io.LEGACY_FACTORS_PARAMS, **existing_header}
+    for param in ['neighbours', 'neighbour_search_backend', 'source_coarsening', *OPTIONAL_KEY_PARAMS]:
+        if existing_header.get(param) != header.get(param):
+            return False
+    if 'grid_checksum' not in existing_header:
+        return existing_header.get('n_target') == header.get('n_target')
+    return existing_header['grid_checksum'] == header['grid_checksum']
+
+
+def import_factors(path: str, key: str, header: dict, ds_name: str):
+    '''
+    Moves factors stored per dataset by earlier versions of the pipeline into the cache under key,
+    converting pickled factors first. Factors made for a different target grid are removed instead.
+    '''
+    try:
+        if factors_io.is_legacy_factors(path):
+            factors_io.convert_legacy_factors(path, header)
+        if not matches(factors_io.read_header(path), header):
+            logger.info(f'Removing out of date factors {path}')
+            factors_io.remove_factors(path)
+            return
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        os.rename(path, factors_path(key))
+    except FileNotFoundError:
+        # Another process got there first
+        return
+    except OSError:
+        if not os.path.isdir(factors_path(key)):
+            raise
+        factors_io.remove_factors(path)
+        return
+    logger.info(f'Moved {path} into factors cache')
+    record(key, header, ds_name)
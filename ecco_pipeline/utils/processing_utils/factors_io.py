@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from datetime import datetime
+from multiprocessing import current_process
+
+import numpy as np
+import xarray as xr
+from utils.processing_utils.transformation_utils import RegridOperator, SourceCoarsening
+
+logger = logging.getLogger(str(current_process().pid))
+
+'''
+Mapping factors are stored as a directory containing a JSON header and one .npy
+file per array, kept in the factors cache (see factors_cache) at
+{OUTPUT_DIR}/factors_cache/{key}/:
+
+{key}/
+    header.json                 format version, grid checksum, source grid parameters,
+                                source_coarsening, the block size of the coarsened level of the
+                                source grid the factors map from (1 for the source grid itself),
+                                and source_window, the window of the source grid the factors read
+    source_indices.npy          int32 source indices ordered by target cell
+    offsets.npy                 int32 (int64 for very large factors) start of each target cell in source_indices
+    num_source_indices.npy      float32 count of source indices per target cell
+    nearest_source_index.npy    int32 nearest source index per target cell, -1 where there is none
+
+Earlier versions of the pipeline stored factors per dataset, at
+{OUTPUT_DIR}/{ds_name}/transformed_products/{grid}/{grid}{hemi}_v{t_version}_factors,
+either in this format or as a single pickled tuple. They are moved into the cache the
+first time they are needed (factors_cache.import_factors), with pickles converted in place
+by convert_legacy_factors first. Pickles record nothing but the factors, so converted headers
+only describe what every pickle was made with (LEGACY_FACTORS_PARAMS) and have no grid_checksum.
+
+While factors are generated, the factors of each finished tile of the target grid
+are kept in {key}.tiles/ alongside the header they were generated with, so an
+interrupted run can resume (see tile_dir).
+'''
+
+FACTORS_FORMAT_VERSION = 1
+HEADER_FILENAME = 'header.json'
+FACTORS_ARRAYS = ['source_indices', 'offsets', 'num_source_indices', 'nearest_source_index']
+TILES_SUFFIX = '.tiles'
+# Parameters of every factors pickle: built with pyresample and 100 neighbours against the full, uncoarsened grids
+LEGACY_FACTORS_PARAMS = {'neighbours': 100, 'neighbour_search_backend': 'pyresample', 'source_coarsening': 1,
+                         'target_mask': None}
+
+
+class FactorsFormatError(Exception):
+    """Raise for factors written in an unsupported format"""
+
+
+def grid_checksum(grid_ds: xr.Dataset) -> str:
+    '''
+    md5 checksum of the target grid coordinates used to generate factors
+    '''
+    hash_md5 = hashlib.md5()
+    for var in ['XC', 'YC']:
+        hash_md5.update(np.ascontiguousarray(grid_ds[var].values, dtype=np.float64).tobytes())
+    return hash_md5.hexdigest()
+
+
+def is_legacy_factors(factors_path: str) -> bool:
+    '''
+    Pickled factors are stored as a single file rather than a directory
+    '''
+    return os.path.isfile(factors_path)
+
+
+def read_header(factors_path: str) -> dict:
+    with open(os.path.join(factors_path, HEADER_FILENAME), 'r') as f:
+        return json.load(f)
+
+
+def save_factors(operator: RegridOperator, factors_path: str, header: dict):
+    '''
+    Writes factors to factors_path. Arrays are written to a temporary directory which is
+    then renamed so that concurrent readers never see partially written factors.
+    '''
+    header = {
+        **header,
+        'format_version': FACTORS_FORMAT_VERSION,
+        'created': datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'n_target': int(operator.n_target),
+        'n_source_indices': int(len(operator.source_indices)),
+        'arrays': {}
+    }
+
+    arrays = {
+        'source_indices': operator.source_indices,
+        'offsets': operator.offsets,
+        'num_source_indices': np.asarray(operator.num_source_indices, dtype=np.float32),
+        'nearest_source_index': operator.nearest_source_index
+    }
+
+    tmp_path = f'{factors_path.rstrip("/")}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(array))
+        header['arrays'][name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    with open(os.path.join(tmp_path, HEADER_FILENAME), 'w') as f:
+        json.dump(header, f, indent=4)
+
+    try:
+        os.rename(tmp_path, factors_path)
+    except OSError:
+        # Another process finished writing the same factors first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(factors_path):
+            raise
+
+
+def load_factors(factors_path: str, mmap_mode: str = None) -> RegridOperator:
+    '''
+    Loads factors saved with save_factors as a RegridOperator. Factors built against a
+    coarsened source grid are returned with the SourceCoarsening to apply to source fields.
+    '''
+    header = read_header(factors_path)
+    if header.get('format_version') != FACTORS_FORMAT_VERSION:
+        raise FactorsFormatError(f'Unsupported factors format version {header.get("format_version")} in {factors_path}')
+
+    coarsening = None
+    if header.get('source_coarsening', 1) > 1:
+        coarsening = SourceCoarsening(header['dims'], header['source_coarsening'])
+
+    arrays = {name: np.load(os.path.join(factors_path, f'{name}.npy'), mmap_mode=mmap_mode) for name in FACTORS_ARRAYS}
+    return RegridOperator(arrays['source_indices'], arrays['num_source_indices'],
+                          arrays['nearest_source_index'], offsets=arrays['offsets'], coarsening=coarsening,
+                          source_window=header.get('source_window'))
+
+
+def convert_legacy_factors(factors_path: str, header: dict) -> RegridOperator:
+    '''
+    Converts pickled factors at factors_path to the array based format in place. header describes
+    the source grid the pickle was made for. The target grid it was made for can't be verified,
+    so the converted header has no grid_checksum.
+    '''
+    logger.info(f'Converting pickled factors {factors_path}')
+    with open(factors_path, 'rb') as f:
+        operator = RegridOperator.from_factors(pickle.load(f))
+
+    header = {param: value for param, value in header.items() if param not in ['grid_checksum', 'source_window']}
+    os.remove(factors_path)
+    save_factors(operator, factors_path, {**header, **LEGACY_FACTORS_PARAMS, 'converted_from_pickle': True})
+    return operator
+
+
+def tile_dir(factors_path: str, header: dict) -> str:
+    '''
+    Directory to keep finished tiles in while generating the factors described by header.
+    Tiles left by a run with a different header are removed.
+    '''
+    tiles_path = f'{factors_path.rstrip("/")}{TILES_SUFFIX}'
+    tiles_header_path = os.path.join(tiles_path, HEADER_FILENAME)
+    if os.path.isdir(tiles_path):
+        try:
+            with open(tiles_header_path, 'r') as f:
+                if json.load(f) == json.loads(json.dumps(header)):
+                    return tiles_path
+        except (OSError, ValueError):
+            pass
+        logger.info(f'Removing tiles of {factors_path} generated with different settings')
+        shutil.rmtree(tiles_path)
+
+    os.makedirs(tiles_path)
+    with open(tiles_header_path, 'w') as f:
+        json.dump(header, f, indent=4)
+    return tiles_path
+
+
+def remove_tiles(factors_path: str):
+    shutil.rmtree(f'{factors_path.rstrip("/")}{TILES_SUFFIX}', ignore_errors=True)
+
+
+def remove_factors(factors_path: str):
+    '''
+    Removes factors in either format
+    '''
+    if os.path.isdir(factors_path):
+        shutil.rmtree(factors_path)
+    else:
+        os.remove(factors_path)
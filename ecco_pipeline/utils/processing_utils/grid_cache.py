@@ -0,0 +1,127 @@
+import logging
+import threading
+from collections import OrderedDict
+from multiprocessing import current_process
+from typing import Any, Callable, Hashable, Tuple
+
+import xarray as xr
+from conf import global_settings
+from utils.processing_utils.transformation_utils import RegridOperator
+
+logger = logging.getLogger(str(current_process().pid))
+
+'''
+Process local cache of opened model grids and mapping operators, so a worker transforming many
+granules loads each grid and its factors once rather than once per granule. Entries are evicted
+least recently used first once their total size exceeds GRID_CACHE_SIZE_MB (optional, in
+global_settings.py). Factors are memory-mapped, so their size counts pages a worker may touch
+rather than memory it owns.
+'''
+
+GRID_CACHE_SIZE_MB = getattr(global_settings, 'GRID_CACHE_SIZE_MB', 2048)
+
+
+def nbytes(value: Any) -> int:
+    if isinstance(value, xr.Dataset):
+        return int(value.nbytes)
+    if isinstance(value, RegridOperator):
+        return int(sum(array.nbytes for array in [value.source_indices, value.offsets,
+                                                   value.num_source_indices, value.nearest_source_index]))
+    return 0
+
+
+class LRUCache():
+    '''
+    Least recently used cache with a limit on the total size of its values
+    '''
+
+    def __init__(self, max_bytes: float) -> None:
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # Granules may be loaded on a prefetch thread
+        self.lock = threading.RLock()
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        '''
+        Returns the cached value for key, calling load to create it on a miss
+        '''
+        with self.lock:
+            return self._get(key, load)
+
+    def _get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        value = load()
+        value_size = nbytes(value)
+        self.entries[key] = (value, value_size)
+        self.size += value_size
+
+        # Always keep the newest entry, even if it's over the limit on its own
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            evicted_key, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            logger.debug(f'Evicted {evicted_key} from grid cache')
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries),
+                    'size_mb': self.size / 1024**2}
+
+
+cache = LRUCache(GRID_CACHE_SIZE_MB * 1024**2)
+
+
+def load_grid(grid_name: str) -> xr.Dataset:
+    '''
+    Model grid, with its arrays loaded into memory
+    '''
+    return cache.get(('grid', grid_name), lambda: xr.open_dataset(f'grids/{grid_name}.nc').reset_coords().load())
+
+
+def load_operator(T, grid_ds: xr.Dataset) -> RegridOperator:
+    '''
+    Mapping operator from Transformation T's source grid to grid_ds
+    '''
+    key = ('factors', T.ds_name, grid_ds.name, T.hemi, T.transformation_version)
+    return cache.get(key, lambda: RegridOperator.from_factors(T.make_factors(grid_ds)))
+
+
+def load_windowed_operator(T, grid_name: str, operator: RegridOperator, window: Tuple[int, int, int, int]) -> RegridOperator:
+    '''
+    Operator for the window of T's source grid read from source files (see RegridOperator.windowed)
+    '''
+    key = ('factors', T.ds_name, grid_name, T.hemi, T.transformation_version, window)
+    return cache.get(key, lambda: operator.windowed(T.source_shape, window))
+
+
+def load_stacked_operator(T, operators: dict, n_source: int) -> RegridOperator:
+    '''
+    Operator stacking the operators of several grids, keyed by grid name, for source fields of n_source
+    cells (see RegridOperator.stack). Stacking copies the operators' arrays, so it's done once per worker.
+    '''
+    if len(operators) == 1:
+        return next(iter(operators.values()))
+    key = ('stacked', T.ds_name, tuple(operators), T.hemi, T.transformation_version, n_source)
+    return cache.get(key, lambda: RegridOperator.stack(operators.values()))
+
+
+def format_stats(stats: dict) -> str:
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / lookups if lookups else 0
+    return f'{hit_rate:.1%} hit rate ({stats["hits"]} hits, {stats["misses"]} misses), ' \
+           f'{stats["entries"]} entries, {stats["size_mb"]:.0f} MB'
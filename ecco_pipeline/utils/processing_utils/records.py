@@ -5,6 +5,7 @@ from typing import Iterable
 from dateutil.relativedelta import relativedelta
 from datetime import datetime
 import netCDF4 as nc4
+from conf import global_settings
 from utils.processing_utils.llc_array_conversion import llc_tiles_to_compact
 
 DTYPE = np.float32
@@ -12,6 +13,17 @@ BINARY_DTYPE = 'f4'
 BINARY_FILL_VALUE = -9999
 NETCDF_FILL_VALUE = nc4.default_fillvals[BINARY_DTYPE]
 
+# Encodings of the data variables written by save_netcdf. chunks is either None (netCDF default
+# chunking, or contiguous when uncompressed) or 'record' (one chunk per time step)
+ENCODING_PROFILES = {
+    'fast': {'zlib': False, 'chunks': None},
+    'balanced': {'zlib': True, 'complevel': 1, 'shuffle': True, 'chunks': 'record'},
+    'archival': {'zlib': True, 'complevel': 5, 'shuffle': True, 'chunks': None},
+}
+DEFAULT_ENCODING_PROFILE = 'archival'
+TRANSFORMATION_ENCODING_PROFILE = getattr(global_settings, 'TRANSFORMATION_ENCODING_PROFILE', DEFAULT_ENCODING_PROFILE)
+AGGREGATION_ENCODING_PROFILE = getattr(global_settings, 'AGGREGATION_ENCODING_PROFILE', DEFAULT_ENCODING_PROFILE)
+
 def make_empty_record(record_date: str, model_grid: xr.Dataset) -> xr.DataArray:
     '''
     Creates xarray DataArray filled with nans.
@@ -141,16 +153,29 @@ def save_binary(data, output_filename, binary_output_dir, model_grid_type, data_
     fd1.close()
 
 
-def save_netcdf(data: xr.Dataset, output_filename: str, netcdf_output_dir: str):
-    os.makedirs(netcdf_output_dir, exist_ok=True)
-    nc_output_path = os.path.join(netcdf_output_dir, output_filename)
+def variable_encoding(var: xr.DataArray, profile: str) -> dict:
+    '''
+    netCDF encoding of a data variable under the named encoding profile
+    '''
+    if profile not in ENCODING_PROFILES:
+        raise ValueError(f'Unknown encoding profile {profile}. Options are {list(ENCODING_PROFILES)}')
+    settings = ENCODING_PROFILES[profile]
+
+    encoding = {'zlib': settings['zlib'], '_FillValue': NETCDF_FILL_VALUE}
+    if settings['zlib']:
+        encoding['complevel'] = settings['complevel']
+        encoding['shuffle'] = settings['shuffle']
+    else:
+        encoding['contiguous'] = settings['chunks'] is None
+    if settings['chunks'] == 'record' and var.ndim:
+        encoding['chunksizes'] = tuple(1 if dim == 'time' else size for dim, size in zip(var.dims, var.shape))
+    return encoding
 
-    try:
-        data = data.fillna(NETCDF_FILL_VALUE)
-        data_DS = data.to_dataset()
-    except:
-        data_DS = data
 
+def coordinate_encoding(data_DS: xr.Dataset) -> dict:
+    '''
+    Encoding of the coordinates of transformed and aggregated outputs
+    '''
     coord_encoding = {}
     for coord in data_DS.coords:
         coord_encoding[coord] = {'_FillValue': None, 'dtype': 'float32'}
@@ -158,13 +183,25 @@ def save_netcdf(data: xr.Dataset, output_filename: str, netcdf_output_dir: str):
         if coord == 'time' or coord == 'time_bnds':
             coord_encoding[coord] = {'dtype': 'int32'}
     coord_encoding['time'] = {'units': 'hours since 1980-01-01'}
+    return coord_encoding
+
+
+def save_netcdf(data: xr.Dataset, output_filename: str, netcdf_output_dir: str,
+                encoding_profile: str = DEFAULT_ENCODING_PROFILE):
+    os.makedirs(netcdf_output_dir, exist_ok=True)
+    nc_output_path = os.path.join(netcdf_output_dir, output_filename)
+
+    try:
+        data = data.fillna(NETCDF_FILL_VALUE)
+        data_DS = data.to_dataset()
+    except:
+        data_DS = data
+
+    coord_encoding = coordinate_encoding(data_DS)
 
     var_encoding = {}
     for var in data_DS.data_vars:
-        var_encoding[var] = {'zlib': True,
-                             'complevel': 5,
-                             'shuffle': True,
-                             '_FillValue': NETCDF_FILL_VALUE}
+        var_encoding[var] = variable_encoding(data_DS[var], encoding_profile)
 
     encoding = {**coord_encoding, **var_encoding}
     data_DS.to_netcdf(nc_output_path,  encoding=encoding)
@@ -1,13 +1,384 @@
 import logging
-from multiprocessing import current_process
-from typing import Iterable
+import os
+from multiprocessing import Pool, current_process
+from typing import Iterable, Tuple
 import warnings
 
 import numpy as np
 import pyresample as pr
+from scipy import sparse
+from scipy.spatial import cKDTree
 
 logger = logging.getLogger(str(current_process().pid))
 
+# Number of target grid cells searched at a time when finding mappings. Bounds the
+# (chunk size x neighbours) index and distance arrays returned by pyresample.
+FACTORS_CHUNK_SIZE = 100000
+
+# Backends available to find_mappings_from_source_to_target for the neighbour search
+NEIGHBOUR_SEARCH_BACKENDS = ['pyresample', 'kdtree']
+
+# Earth radius (m) of the sphere pyresample computes neighbour distances on
+EARTH_RADIUS = 6370997.0
+
+class RegridOperator():
+    '''
+    Precomputed sparse form of the mapping factors between a source and target grid.
+
+    The source indices within the radius of each target cell are held in CSR layout:
+    a flat array of source indices ordered by target cell, and offsets into that array
+    for each target cell. Mapping a field with the 'mean' or 'nanmean' operation is a
+    single sparse matrix-vector product followed by normalisation by the number of
+    (non-nan) source values per target cell. 'median' and 'nanmedian' use a segmented
+    sort over the same arrays (see segmented_median).
+
+    source_indices          : flat array of source indices, ordered by target cell
+    num_source_indices      : number of source indices within the radius of each target cell
+    nearest_source_index    : index of the nearest source cell within source_grid_max_L of
+                              each target cell, -1 where there is none
+    offsets                 : start of each target cell in source_indices. Computed from
+                              num_source_indices if not given
+    coarsening              : SourceCoarsening applied to source fields before mapping when the
+                              factors were built against a coarsened level of the source grid
+    source_window           : (row_start, row_stop, col_start, col_stop) window of the 2D source grid
+                              containing every source index, if known (see find_source_window)
+    '''
+    operations = ['mean', 'nanmean', 'median', 'nanmedian', 'nearest']
+
+    def __init__(self, source_indices: np.ndarray, num_source_indices: np.ndarray, nearest_source_index: np.ndarray,
+                 offsets: np.ndarray = None, coarsening: 'SourceCoarsening' = None, source_window: Tuple[int] = None):
+        if offsets is None:
+            offsets = np.zeros(len(num_source_indices) + 1, dtype=np.int64)
+            np.cumsum(np.asarray(num_source_indices).astype(np.int64), out=offsets[1:])
+
+        # scipy requires matching dtypes for indices and offsets
+        idx_dtype = np.int32 if offsets[-1] < np.iinfo(np.int32).max else np.int64
+
+        self.source_indices: np.ndarray = np.asarray(source_indices).astype(idx_dtype, copy=False)
+        self.offsets: np.ndarray = np.asarray(offsets).astype(idx_dtype, copy=False)
+        self.num_source_indices: np.ndarray = np.asarray(num_source_indices)
+        self.nearest_source_index: np.ndarray = np.asarray(nearest_source_index).astype(idx_dtype, copy=False)
+        self.coarsening: SourceCoarsening = coarsening
+        self.source_window: Tuple[int] = tuple(source_window) if source_window is not None else None
+
+    @classmethod
+    def from_factors(cls, factors) -> 'RegridOperator':
+        '''
+        Builds a RegridOperator from the three part factors tuple
+        (source_indices_within_target_radius_i, num_source_indices_within_target_radius_i,
+        nearest_source_index_to_target_index_i). Supports the per target cell dictionaries
+        of previously generated factors. Returns factors unchanged if already an operator.
+        '''
+        if isinstance(factors, cls):
+            return factors
+
+        source_indices_within_target_radius_i, num_source_indices_within_target_radius_i, \
+            nearest_source_index_to_target_index_i = factors
+
+        counts = np.asarray(num_source_indices_within_target_radius_i).astype(np.int64)
+
+        if isinstance(source_indices_within_target_radius_i, dict):
+            cells_with_source = np.flatnonzero(counts)
+            if len(cells_with_source):
+                source_indices = np.concatenate([np.asarray(source_indices_within_target_radius_i[i]).ravel()
+                                                 for i in cells_with_source])
+            else:
+                source_indices = np.array([], dtype=np.int64)
+        else:
+            source_indices = source_indices_within_target_radius_i
+
+        if isinstance(nearest_source_index_to_target_index_i, dict):
+            nearest_source_index = np.full(len(counts), -1, dtype=np.int64)
+            if nearest_source_index_to_target_index_i:
+                target_i = np.fromiter(nearest_source_index_to_target_index_i.keys(), dtype=np.int64)
+                source_i = np.fromiter(nearest_source_index_to_target_index_i.values(), dtype=np.int64)
+                nearest_source_index[target_i] = source_i
+        else:
+            nearest_source_index = nearest_source_index_to_target_index_i
+
+        return cls(source_indices, counts, nearest_source_index)
+
+    @classmethod
+    def stack(cls, operators: Iterable['RegridOperator']) -> 'RegridOperator':
+        '''
+        Concatenates operators sharing a source grid into one block operator mapping to the target
+        cells of each operator in turn, so a field can be mapped to several target grids in one pass.
+        Use split to recover the output of each operator.
+        '''
+        operators = list(operators)
+        if len(operators) == 1:
+            return operators[0]
+        if len(set(operator.coarsening for operator in operators)) > 1:
+            raise ValueError('Only operators built against the same level of the source grid can be stacked')
+
+        offsets = [np.zeros(1, dtype=np.int64)]
+        for operator in operators:
+            offsets.append(operator.offsets[1:].astype(np.int64) + offsets[-1][-1])
+
+        return cls(np.concatenate([operator.source_indices for operator in operators]),
+                   np.concatenate([operator.num_source_indices for operator in operators]),
+                   np.concatenate([operator.nearest_source_index for operator in operators]),
+                   np.concatenate(offsets), coarsening=operators[0].coarsening)
+
+    @staticmethod
+    def split(source_on_target_grids: np.ndarray, operators: Iterable['RegridOperator']) -> Iterable[np.ndarray]:
+        '''
+        Splits the (..., n_target) output of a stacked operator into the output of each of its operators
+        '''
+        n_targets = [operator.n_target for operator in operators]
+        return np.split(source_on_target_grids, np.cumsum(n_targets)[:-1], axis=-1)
+
+    def scatter(self, target_indices: np.ndarray, n_target: int) -> 'RegridOperator':
+        '''
+        Expands an operator built for a subset of the cells of a target grid, given by their sorted
+        indices, to the full grid. Other target cells have no source cells and map to nan.
+        '''
+        num_source_indices = np.zeros(n_target, dtype=self.num_source_indices.dtype)
+        num_source_indices[target_indices] = self.num_source_indices
+        nearest_source_index = np.full(n_target, -1, dtype=self.nearest_source_index.dtype)
+        nearest_source_index[target_indices] = self.nearest_source_index
+        return RegridOperator(self.source_indices, num_source_indices, nearest_source_index,
+                              coarsening=self.coarsening, source_window=self.source_window)
+
+    def find_source_window(self, source_shape: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        '''
+        Smallest (row_start, row_stop, col_start, col_stop) window of a source grid of source_shape
+        containing every source index of the operator, including nearest source indices
+        '''
+        nearest_source_index = self.nearest_source_index[self.nearest_source_index >= 0]
+        if not len(self.source_indices) and not len(nearest_source_index):
+            return (0, 0, 0, 0)
+        rows, cols = [], []
+        for indices in [self.source_indices, nearest_source_index]:
+            if len(indices):
+                index_rows, index_cols = np.divmod(indices, source_shape[1])
+                rows.extend([index_rows.min(), index_rows.max()])
+                cols.extend([index_cols.min(), index_cols.max()])
+        return (int(min(rows)), int(max(rows)) + 1, int(min(cols)), int(max(cols)) + 1)
+
+    def windowed(self, source_shape: Tuple[int, int], window: Tuple[int, int, int, int]) -> 'RegridOperator':
+        '''
+        Operator mapping the (row_start:row_stop, col_start:col_stop) window of source fields of
+        source_shape, which must contain every source index of the operator
+        '''
+        row_start, row_stop, col_start, col_stop = window
+
+        def to_window(indices: np.ndarray) -> np.ndarray:
+            rows, cols = np.divmod(indices.astype(np.int64), source_shape[1])
+            return (rows - row_start) * (col_stop - col_start) + cols - col_start
+
+        nearest_source_index = np.where(self.nearest_source_index >= 0, to_window(self.nearest_source_index), -1)
+        return RegridOperator(to_window(self.source_indices), self.num_source_indices, nearest_source_index,
+                              offsets=self.offsets, coarsening=self.coarsening, source_window=(0, row_stop - row_start,
+                                                                                               0, col_stop - col_start))
+
+    @property
+    def n_target(self) -> int:
+        return len(self.num_source_indices)
+
+    def matrix(self, n_source: int) -> sparse.csr_matrix:
+        '''
+        Returns the (n_target, n_source) CSR matrix with unit weights. The matrix shares the index
+        arrays, which may be memory-mapped, and only allocates its weights, so it is built on
+        demand rather than held for the life of the operator.
+        '''
+        weights = np.ones(len(self.source_indices))
+        return sparse.csr_matrix((weights, self.source_indices, self.offsets),
+                                 shape=(self.n_target, n_source), copy=False)
+
+    def apply(self, source_field: np.ndarray, operation: str = 'mean', allow_nearest_neighbor: bool = True) -> np.ndarray:
+        '''
+        Maps source_field onto the target grid. Returns a 1D array with one value per target cell.
+
+        operation : one of ['mean', 'nanmean', 'median', 'nanmedian', 'nearest']
+        '''
+        source_field_r = np.asarray(source_field).reshape(1, -1)
+        return self.apply_batch(source_field_r, operation, allow_nearest_neighbor)[0]
+
+    def apply_batch(self, source_fields: np.ndarray, operation: str = 'mean', allow_nearest_neighbor: bool = True) -> np.ndarray:
+        '''
+        Maps a stack of flattened source fields (n_fields, n_source) onto the target grid in one
+        application of the operator. Returns an (n_fields, n_target) array.
+
+        operation : one of ['mean', 'nanmean', 'median', 'nanmedian', 'nearest']
+        '''
+        if operation not in self.operations:
+            raise ValueError(f'{operation} is not a supported operation. Must be one of {self.operations}')
+
+        source_fields = np.asarray(source_fields, dtype=np.float64)
+        if self.coarsening is not None:
+            source_fields = self.coarsening.coarsen_fields(source_fields, skipna=operation.startswith('nan'))
+        n_fields, n_source = source_fields.shape
+
+        # define array that will contain source_fields mapped to target_grid
+        source_on_target_grid = np.full((n_fields, self.n_target), np.nan)
+
+        has_source = self.num_source_indices > 0
+
+        # average these values. nans propagate through the product as in np.mean
+        if operation == 'mean':
+            sums = self._product(self.matrix(n_source), source_fields)
+            source_on_target_grid[:, has_source] = sums[:, has_source] / self.num_source_indices[has_source]
+
+        # average of non-nan values
+        elif operation == 'nanmean':
+            valid = ~np.isnan(source_fields)
+            A = self.matrix(n_source)
+            sums = self._product(A, np.where(valid, source_fields, 0))
+            num_valid = self._product(A, valid.astype(np.float64))
+            has_valid = num_valid > 0
+            source_on_target_grid[has_valid] = sums[has_valid] / num_valid[has_valid]
+
+        # median of these values, or of the non-nan values
+        elif operation in ['median', 'nanmedian']:
+            for i, source_field_r in enumerate(source_fields):
+                source_on_target_grid[i] = segmented_median(source_field_r[self.source_indices], self.offsets,
+                                                            skipna=operation == 'nanmedian')
+
+        # nearest neighbor is the first element in source_indices
+        elif operation == 'nearest':
+            first_source_index = self.source_indices[self.offsets[:-1][has_source]]
+            source_on_target_grid[:, has_source] = source_fields[:, first_source_index]
+
+        # number source indices within target radius is 0, then we can potentially
+        # use the nearest neighbor within source_grid_max_L
+        if allow_nearest_neighbor:
+            use_nearest = ~has_source & (self.nearest_source_index >= 0)
+            source_on_target_grid[:, use_nearest] = source_fields[:, self.nearest_source_index[use_nearest]]
+
+        return source_on_target_grid
+
+    @staticmethod
+    def _product(A: sparse.csr_matrix, source_fields: np.ndarray) -> np.ndarray:
+        '''
+        A applied to each row of source_fields. A single field uses the faster matrix-vector product
+        '''
+        if len(source_fields) == 1:
+            return (A @ source_fields[0])[np.newaxis]
+        return (A @ np.ascontiguousarray(source_fields.T)).T
+
+
+class SourceCoarsening():
+    '''
+    Block averaging of a structured source grid of dims (cols, rows) by factor x factor cells,
+    used to build and apply factors against a coarser level of the source grid when the source
+    grid is much finer than the target grid. Blocks at the right and bottom edges of grids not
+    divisible by factor hold the remaining cells.
+
+    The blocks are held as a RegridOperator mapping the source grid to the coarse grid.
+    '''
+
+    def __init__(self, dims: Iterable[int], factor: int):
+        self.dims: Tuple[int, int] = (int(dims[0]), int(dims[1]))
+        self.factor: int = int(factor)
+
+        cols, rows = self.dims
+        coarse_cols = -(-cols // self.factor)
+        self.coarse_dims: Tuple[int, int] = (coarse_cols, -(-rows // self.factor))
+
+        row_i, col_i = np.divmod(np.arange(cols * rows), cols)
+        block_i = (row_i // self.factor) * coarse_cols + col_i // self.factor
+        n_blocks = self.coarse_dims[0] * self.coarse_dims[1]
+        self.blocks = RegridOperator(np.argsort(block_i, kind='stable'), np.bincount(block_i, minlength=n_blocks),
+                                     np.full(n_blocks, -1))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SourceCoarsening) and (self.dims, self.factor) == (other.dims, other.factor)
+
+    def __hash__(self) -> int:
+        return hash((self.dims, self.factor))
+
+    @property
+    def size(self) -> int:
+        return self.blocks.n_target
+
+    def coarsen_fields(self, source_fields: np.ndarray, skipna: bool = False) -> np.ndarray:
+        '''
+        Block averages a stack of flattened source fields (n_fields, n_source). Blocks containing a
+        nan are nan unless skipna, in which case only blocks without any valid values are.
+        '''
+        return self.blocks.apply_batch(source_fields, 'nanmean' if skipna else 'mean', allow_nearest_neighbor=False)
+
+    def coarsen_grid(self, source_grid) -> pr.geometry.SwathDefinition:
+        '''
+        Coarse grid with cells at the centre of each block, found by averaging the 3-D unit vectors of
+        the block's cells so blocks spanning the antimeridian are handled
+        '''
+        source_lons, source_lats = source_grid.get_lonlats()
+        source_lons = np.asarray(source_lons, dtype=np.float64).ravel()
+        source_lats = np.asarray(source_lats, dtype=np.float64).ravel()
+
+        source_xyz = lonlat_to_unit_vectors(source_lons, source_lats)
+        source_xyz[~valid_lonlats(source_lons, source_lats)] = np.nan
+        coarse_xyz = self.coarsen_fields(source_xyz.T, skipna=True)
+
+        # blocks without any valid cells are left with invalid coordinates
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            coarse_lons = np.rad2deg(np.arctan2(coarse_xyz[1], coarse_xyz[0]))
+            coarse_lats = np.rad2deg(np.arctan2(coarse_xyz[2], np.hypot(coarse_xyz[0], coarse_xyz[1])))
+        invalid = np.isnan(coarse_lons) | np.isnan(coarse_lats)
+        coarse_lons[invalid] = 1e30
+        coarse_lats[invalid] = 1e30
+        return pr.geometry.SwathDefinition(lons=coarse_lons, lats=coarse_lats)
+
+
+def source_coarsening_factor(target_grid_radius: np.ndarray, source_grid_max_L: float, threshold: float) -> int:
+    '''
+    Block size to coarsen the source grid by so that a typical (median) target grid cell radius spans
+    about threshold source grid cells. Uses source_grid_max_L, the nominal resolution of the source
+    grid, since source_grid_min_L of lat-lon grids approaches 0 near the poles.
+    Returns 1 when the source grid is not finer than that.
+    '''
+    ratio = np.nanmedian(target_grid_radius) / source_grid_max_L
+    return max(int(ratio // threshold), 1)
+
+
+def union_window(windows: Iterable[Tuple[int, int, int, int]]) -> Tuple[int, int, int, int]:
+    '''
+    Smallest window containing all non empty windows
+    '''
+    windows = [window for window in windows if window[0] < window[1] and window[2] < window[3]]
+    if not windows:
+        return (0, 0, 0, 0)
+    return (min(w[0] for w in windows), max(w[1] for w in windows), min(w[2] for w in windows), max(w[3] for w in windows))
+
+
+def segmented_median(values: np.ndarray, offsets: np.ndarray, skipna: bool = False) -> np.ndarray:
+    '''
+    Median of each segment of values, where segment i is values[offsets[i]:offsets[i+1]].
+    Matches np.median (or np.nanmedian if skipna) applied to each segment: empty segments,
+    and segments containing a nan when skipna is False, are nan.
+
+    Values are sorted by segment and then by value in one pass, after which the median of each
+    segment is read from (or averaged between) the middle element(s) of the segment.
+    '''
+    counts = np.diff(offsets).astype(np.int64)
+    n_segments = len(counts)
+    segment_i = np.repeat(np.arange(n_segments), counts)
+
+    is_nan = np.isnan(values)
+    if skipna:
+        values = values[~is_nan]
+        segment_i = segment_i[~is_nan]
+        counts = np.bincount(segment_i, minlength=n_segments)
+    else:
+        has_nan = np.bincount(segment_i, weights=is_nan, minlength=n_segments) > 0
+
+    sorted_values = values[np.lexsort((values, segment_i))]
+    starts = np.cumsum(counts) - counts
+
+    medians = np.full(n_segments, np.nan)
+    has_values = counts > 0
+    lower = starts[has_values] + (counts[has_values] - 1) // 2
+    upper = starts[has_values] + counts[has_values] // 2
+    medians[has_values] = (sorted_values[lower] + sorted_values[upper]) / 2
+
+    if not skipna:
+        medians[has_nan] = np.nan
+    return medians
+
+
 def transform_to_target_grid(source_indices_within_target_radius_i: dict,
                              num_source_indices_within_target_radius_i: list,
                              nearest_source_index_to_target_index_i: dict,
@@ -23,6 +394,32 @@ def transform_to_target_grid(source_indices_within_target_radius_i: dict,
     target_grid_shape : shape of target grid array (2D)
     operation : one of ['mean', 'nanmean', 'median', 'nanmedian', 'nearest']
 
+    '''
+    factors = (source_indices_within_target_radius_i,
+               num_source_indices_within_target_radius_i,
+               nearest_source_index_to_target_index_i)
+
+    operator = RegridOperator.from_factors(factors)
+    source_on_target_grid = operator.apply(source_field, operation, allow_nearest_neighbor)
+    return source_on_target_grid.reshape(target_grid_shape)
+
+
+def _transform_to_target_grid_loop(source_indices_within_target_radius_i: dict,
+                             num_source_indices_within_target_radius_i: list,
+                             nearest_source_index_to_target_index_i: dict,
+                             source_field: np.ndarray, target_grid_shape: tuple, operation: str = 'mean',
+                             allow_nearest_neighbor: bool = True):
+    '''
+    Transforms source data to target grid one target cell at a time. Reference
+    implementation for RegridOperator, kept for validation and benchmarking.
+
+    source_indices_within_target_radius_i
+    num_source_indices_within_target_radius_i
+    nearest_source_index_to_target_index_i
+    source field: 2D field
+    target_grid_shape : shape of target grid array (2D)
+    operation : one of ['mean', 'nanmean', 'median', 'nanmedian', 'nearest']
+
     '''
 
     source_field_r = source_field.ravel()
@@ -76,9 +473,72 @@ def transform_to_target_grid(source_indices_within_target_radius_i: dict,
     return source_on_target_grid
 
 
+def lonlat_to_unit_vectors(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    '''
+    Converts longitudes and latitudes in degrees to an (n, 3) array of 3-D unit vectors
+    '''
+    lons_r = np.deg2rad(np.asarray(lons, dtype=np.float64))
+    lats_r = np.deg2rad(np.asarray(lats, dtype=np.float64))
+    return np.stack([np.cos(lats_r) * np.cos(lons_r),
+                     np.cos(lats_r) * np.sin(lons_r),
+                     np.sin(lats_r)], axis=-1)
+
+
+def valid_lonlats(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    '''
+    Mask of legal lon/lat pairs, as used by pyresample
+    '''
+    return (lons >= -180) & (lons <= 180) & (lats >= -90) & (lats <= 90)
+
+
+class UnitSphereNeighbourSearch():
+    '''
+    Neighbour search over the source grid cell centres as 3-D unit vectors. A single KD-tree is
+    built on the source grid and reused for every query, which runs in parallel over workers
+    (-1 uses all cores). Distances are chord lengths on a sphere of EARTH_RADIUS as in pyresample.
+    '''
+
+    def __init__(self, source_grid, workers: int = -1):
+        source_lons, source_lats = source_grid.get_lonlats()
+        source_lons = np.asarray(source_lons).ravel()
+        source_lats = np.asarray(source_lats).ravel()
+
+        self.len_source_grid: int = source_lons.size
+        self.workers: int = workers
+
+        # indices into the full source grid of the cells held in the tree
+        self.source_index: np.ndarray = np.flatnonzero(valid_lonlats(source_lons, source_lats))
+        self.tree = cKDTree(lonlat_to_unit_vectors(source_lons[self.source_index], source_lats[self.source_index]))
+
+    def get_neighbour_info(self, target_lons: np.ndarray, target_lats: np.ndarray,
+                           radius_of_influence: float, neighbours: int) -> tuple:
+        '''
+        Equivalent of pyresample's get_neighbour_info for target cells at target_lons, target_lats.
+        Returns (None, valid_output_index, index_array, distance_array) where index_array holds
+        source grid indices, with len_source_grid where no neighbour was found.
+        '''
+        valid_output_index = valid_lonlats(target_lons, target_lats)
+        target_coords = lonlat_to_unit_vectors(target_lons[valid_output_index], target_lats[valid_output_index])
+
+        distance_array, tree_index = self.tree.query(target_coords, k=neighbours,
+                                                     distance_upper_bound=radius_of_influence / EARTH_RADIUS,
+                                                     workers=self.workers)
+
+        # map tree indices back to the full source grid. Missing neighbours are flagged
+        # by the tree with its size, and here with the size of the source grid
+        found = tree_index < len(self.source_index)
+        index_array = np.full(tree_index.shape, self.len_source_grid, dtype=np.int64)
+        index_array[found] = self.source_index[tree_index[found]]
+
+        return None, valid_output_index, index_array, distance_array * EARTH_RADIUS
+
+
 def find_mappings_from_source_to_target(source_grid, target_grid, target_grid_radius,
                                         source_grid_min_L, source_grid_max_L,
-                                        neighbours: int = 100, less_output=True):
+                                        neighbours: int = 100, less_output=True,
+                                        chunk_size: int = FACTORS_CHUNK_SIZE,
+                                        backend: str = 'pyresample', workers: int = -1,
+                                        processes: int = 1, tile_dir: str = None):
     '''
     source grid, target_grid : area or grid defintion objects from pyresample
 
@@ -90,13 +550,35 @@ def find_mappings_from_source_to_target(source_grid, target_grid, target_grid_ra
 
     neighbours     : Specifies number of neighbours to look for when getting
                      the neighbour info of a cell using pyresample.
-                     Default is 100 to limit memory usage.
-                     Value given must be a whole number greater than 0
+                     Default is 100. Value given must be a whole number greater than 0
+
+    chunk_size     : Number of target grid cells searched at a time (a tile). Peak memory
+                     of the search scales with chunk_size * neighbours rather than with
+                     the size of the target grid.
+
+    backend        : Neighbour search backend, one of NEIGHBOUR_SEARCH_BACKENDS.
+                     'pyresample' uses pyresample's get_neighbour_info on each chunk.
+                     'kdtree' builds one KD-tree on the source grid (see
+                     UnitSphereNeighbourSearch) and queries it in parallel.
+
+    workers        : Number of parallel queries for the 'kdtree' backend, -1 for all cores.
+                     Ignored when processes > 1.
+
+    processes      : Number of processes searching tiles in parallel
+
+    tile_dir       : Optional directory the factors of each tile are saved to as they
+                     finish. Tiles already in tile_dir are not searched again, so an
+                     interrupted run resumes where it stopped. tile_dir must only hold
+                     tiles from a search with the same arguments.
+
+    Returns the three part factors built by compress_neighbour_info
     '''
 
-    # # of element of the source and target grids
+    if backend not in NEIGHBOUR_SEARCH_BACKENDS:
+        raise ValueError(f'{backend} is not a supported neighbour search backend. Must be one of {NEIGHBOUR_SEARCH_BACKENDS}')
+
+    # # of element of the source grid
     len_source_grid = source_grid.size
-    len_target_grid = target_grid.size
 
     # the maximum radius of the target grid
     max_target_grid_radius = np.nanmax(target_grid_radius)
@@ -112,15 +594,103 @@ def find_mappings_from_source_to_target(source_grid, target_grid, target_grid_ra
     # limit neighbours to the upper_bound if the supplied neighbours value is larger
     # since you dont need more neighbours than exists within a cell.
     if neighbours > neighbours_upper_bound:
-        print('using more neighbours than upper bound.  limiting to the upper bound '
-              f'of {int(neighbours_upper_bound)} neighbours')
+        logger.debug('using more neighbours than upper bound.  limiting to the upper bound '
+                     f'of {int(neighbours_upper_bound)} neighbours')
         neighbours = neighbours_upper_bound
     else:
-        print(f'Only using {neighbours} nearest neighbours, but you may need up to {neighbours_upper_bound}')
+        logger.debug(f'Only using {neighbours} nearest neighbours, but you may need up to {neighbours_upper_bound}')
 
     # make sure neighbours is an int for pyresample
     # neighbours_upper_bound is float, and user input can be float
-    neighbours = int(neighbours)
+    neighbours = max(int(neighbours), 1)
+
+    target_lons = np.asarray(target_grid.lons).ravel()
+    target_lats = np.asarray(target_grid.lats).ravel()
+    len_target_grid = len(target_lons)
+    chunk_size = max(int(chunk_size), 1)
+    tiles = [slice(start, min(start + chunk_size, len_target_grid)) for start in range(0, len_target_grid, chunk_size)]
+
+    # Tiles finished by an earlier, interrupted, run are reused from tile_dir
+    tile_paths = [os.path.join(tile_dir, f'tile_{i:05d}.npz') if tile_dir else None for i in range(len(tiles))]
+    remaining = [i for i, tile_path in enumerate(tile_paths) if not tile_path or not os.path.exists(tile_path)]
+    if len(remaining) < len(tiles):
+        logger.info(f'Resuming factor generation with {len(tiles) - len(remaining)} of {len(tiles)} tiles already done')
+
+    search_args = (source_grid, target_lons, target_lats, target_grid_radius, int(max_target_grid_radius),
+                   int(source_grid_max_L), neighbours, backend, workers if processes == 1 else 1)
+
+    tile_factors = {}
+
+    def finish_tile(i: int, factors: tuple):
+        if tile_paths[i]:
+            save_tile(tile_paths[i], factors)
+        else:
+            tile_factors[i] = factors
+        logger.info(f'Found mappings for tile {i + 1} of {len(tiles)} '
+                    f'({tiles[i].stop} of {len_target_grid} target grid cells)')
+
+    # Search the target grid a tile at a time, compressing each tile into the factors.
+    # With more than one process tiles are searched in parallel
+    processes = min(max(int(processes), 1), len(remaining)) if remaining else 1
+    if processes > 1:
+        with Pool(processes=processes, initializer=_init_tile_search, initargs=search_args) as pool:
+            for i, factors in pool.imap_unordered(_find_tile_mappings, [(i, tiles[i]) for i in remaining]):
+                finish_tile(i, factors)
+    else:
+        _init_tile_search(*search_args)
+        try:
+            for i in remaining:
+                finish_tile(*_find_tile_mappings((i, tiles[i])))
+        finally:
+            # don't hold on to the source grid and tree once the search is done or has failed
+            _tile_search.clear()
+
+    # Merge tiles in target grid order
+    for i, tile_path in enumerate(tile_paths):
+        if tile_path:
+            tile_factors[i] = load_tile(tile_path)
+    source_indices, num_source_indices, nearest_source_index = \
+        [np.concatenate([tile_factors[i][j] for i in range(len(tiles))]) for j in range(3)]
+
+    # target cells where every neighbour found is within the cell's radius may have more source cells
+    num_saturated = int(np.sum(num_source_indices >= neighbours))
+    if num_saturated and neighbours < neighbours_upper_bound:
+        logger.warning(f'{num_saturated} target grid cells have all {neighbours} neighbours within their radius '
+                       'and may be missing source grid cells. Consider increasing neighbours.')
+
+    return source_indices, num_source_indices, nearest_source_index
+
+
+# Neighbour search state shared by the tiles searched in a process, set by _init_tile_search
+_tile_search = {}
+
+
+def _init_tile_search(source_grid, target_lons: np.ndarray, target_lats: np.ndarray, target_grid_radius: np.ndarray,
+                      max_target_grid_radius: int, source_grid_max_L: int, neighbours: int, backend: str, workers: int):
+    _tile_search.update(source_grid=source_grid, target_lons=target_lons, target_lats=target_lats,
+                        target_grid_radius=target_grid_radius, max_target_grid_radius=max_target_grid_radius,
+                        source_grid_max_L=source_grid_max_L, neighbours=neighbours, backend=backend)
+    if backend == 'kdtree':
+        # build the tree once per process rather than once per tile
+        _tile_search['search'] = UnitSphereNeighbourSearch(source_grid, workers)
+
+
+def _find_tile_mappings(tile_args: Tuple[int, slice]) -> Tuple[int, tuple]:
+    '''
+    Finds the factors of one tile of the target grid. Returns the tile number and its factors.
+    '''
+    i, tile = tile_args
+    source_grid = _tile_search['source_grid']
+    target_lons = _tile_search['target_lons'][tile]
+    target_lats = _tile_search['target_lats'][tile]
+
+    def get_neighbour_info(radius_of_influence: int, neighbours: int) -> tuple:
+        if _tile_search['backend'] == 'kdtree':
+            return _tile_search['search'].get_neighbour_info(target_lons, target_lats, radius_of_influence, neighbours)
+        target_grid_tile = pr.geometry.SwathDefinition(lons=target_lons, lats=target_lats)
+        return pr.kd_tree.get_neighbour_info(source_grid, target_grid_tile,
+                                             radius_of_influence=radius_of_influence,
+                                             neighbours=neighbours)
 
     # FIRST FIND THE SET OF SOURCE GRID CELLS THAT FALL WITHIN THE SEARCH
     # RADIUS OF EACH TARGET GRID CELL
@@ -138,20 +708,7 @@ def find_mappings_from_source_to_target(source_grid, target_grid, target_grid_ra
     # is furthest.
     # for some reason the radius of influence has to be in an int.
 
-    Ax_max_target_grid_r = \
-        pr.kd_tree.get_neighbour_info(source_grid,
-                                      target_grid,
-                                      radius_of_influence=int(max_target_grid_radius),
-                                      neighbours=neighbours)
-
-    # define a dictionary, which will contain the list of SOURCE grid cells
-    # that are within the search radius of each TARGET grid cell
-    source_indices_within_target_radius_i = dict()
-
-    # define a vector which is a COUNT of the # of SOURCE grid cells
-    # that are within the search radius of each TARGET grid cell
-    num_source_indices_within_target_radius_i =\
-        np.zeros((target_grid_radius.shape))
+    Ax_max_target_grid_r = get_neighbour_info(_tile_search['max_target_grid_radius'], _tile_search['neighbours'])
 
     # SECOND FIND THE SINGLE SOURCE GRID CELL THAT IS CLOSEST TO EACH
     # TARGET GRID CELL, BUT ONLY SEARCH AS FAR AS SOURCE_GRID_MAX_L
@@ -163,76 +720,80 @@ def find_mappings_from_source_to_target(source_grid, target_grid, target_grid_ra
     # fall within the small centers of the TARGET grid.
     # we'll look for the nearest SOURCE grid cell within 'source_grid_max_L'
 
-    Ax_nearest_within_source_grid_max_L = \
-        pr.kd_tree.get_neighbour_info(source_grid, target_grid,
-                                      radius_of_influence=int(source_grid_max_L),
-                                      neighbours=1)
+    Ax_nearest_within_source_grid_max_L = get_neighbour_info(_tile_search['source_grid_max_L'], 1)
+
+    return i, compress_neighbour_info(Ax_max_target_grid_r, Ax_nearest_within_source_grid_max_L,
+                                      _tile_search['target_grid_radius'][tile], source_grid.size)
+
+
+def save_tile(tile_path: str, factors: tuple):
+    '''
+    Saves the factors of one tile. Written to a temporary file first so an interrupted
+    run never leaves a partial tile behind.
+    '''
+    tmp_path = f'{tile_path}.tmp{os.getpid()}.npz'
+    np.savez(tmp_path, *factors)
+    os.replace(tmp_path, tile_path)
 
-    # define a vector that will store the index of the source grid closest to
-    # the target grid within the search radius 'source_grid_max_L'
-    nearest_source_index_to_target_index_i = dict()
 
-    # >> a list of i's to print debug statements for
-    debug_is = np.linspace(0, len_target_grid, 20).astype(int)
+def load_tile(tile_path: str) -> tuple:
+    with np.load(tile_path) as tile:
+        return tuple(tile[f'arr_{j}'] for j in range(3))
 
-    # loop through every TARGET grid cell, pull out the SOURCE grid cells
-    # that fall within the TARGET grid radius and stick into the
-    # 'source_indices_within_target_radius_i' dictionary
-    # and then do the same for the nearest neighbour business.
 
-    current_valid_target_i = 0
+def compress_neighbour_info(Ax_max_target_grid_r: tuple, Ax_nearest_within_source_grid_max_L: tuple,
+                            target_grid_radius: np.ndarray, len_source_grid: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Compresses the outputs of pyresample's get_neighbour_info into the three part factors
+
+    Ax_max_target_grid_r                : get_neighbour_info output searching within the max target grid radius
+    Ax_nearest_within_source_grid_max_L : get_neighbour_info output for the single nearest neighbour
+                                          within source_grid_max_L
+    target_grid_radius                  : radius of each target grid cell (m)
+    len_source_grid                     : number of source grid cells
+
+    Returns (source_indices_within_target_radius_i, num_source_indices_within_target_radius_i,
+    nearest_source_index_to_target_index_i) where
+    - source_indices_within_target_radius_i is a flat int32 array of the source indices that fall
+      within the radius of each target cell, ordered by target cell and then by distance
+    - num_source_indices_within_target_radius_i is the float32 count of those indices per target cell
+    - nearest_source_index_to_target_index_i is the int32 index of the nearest source cell of each
+      target cell, -1 where there is none
+    '''
+    len_target_grid = len(target_grid_radius)
 
-    if not less_output:
-        print('length of target grid: ', len_target_grid)
+    # Ax[1] is a t/f array over the target grid of cells with valid lat/lons.
+    # Ax[2] and Ax[3] only have rows for those valid target cells
+    valid_target_i = np.flatnonzero(Ax_max_target_grid_r[1])
 
-    for i in range(len_target_grid):
+    # a tile of the target grid may have no valid cells at all
+    if len(valid_target_i) == 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(len_target_grid, dtype=np.float32), \
+            np.full(len_target_grid, -1, dtype=np.int32)
 
-        if not less_output:
-            print('looping through all points of target grid: ', i)
+    # Ax[2] is the matrix of closest SOURCE grid points for each TARGET grid point
+    # and Ax[3] the distance in meters. Both are 1D when only one neighbour is requested
+    src_indices = Ax_max_target_grid_r[2].reshape(len(valid_target_i), -1)
+    dist_from_src_to_target = Ax_max_target_grid_r[3].reshape(len(valid_target_i), -1)
 
-        if Ax_nearest_within_source_grid_max_L[1][i] == True:
+    # pull out the source indices that fall within the radius of each target cell.
+    # neighbours that weren't found have infinite distance so are dropped here too.
+    # Boolean indexing is row-major so the flattened indices stay grouped by target cell
+    dist_within_target_r = dist_from_src_to_target <= target_grid_radius[valid_target_i, np.newaxis]
 
-            # Ax[2][i,:] are the closest source grid indices
-            #            for target grid cell i
-            # data_within_search_radius[i,:] is the T/F array for which
-            #            of the closest 'neighbours' source grid indices are within
-            #            the radius of this target grid cell i
-            # -- so we're pulling out just those source grid indices
-            #    that fall within the target grid cell radius
+    source_indices_within_target_radius_i = src_indices[dist_within_target_r].astype(np.int32)
 
-            # FIRST RECORD THE SOURCE POINTS THAT FALL WITHIN TARGET_GRID_RADIUS
-            dist_from_src_to_target = Ax_max_target_grid_r[3][current_valid_target_i]
+    num_source_indices_within_target_radius_i = np.zeros(len_target_grid, dtype=np.float32)
+    num_source_indices_within_target_radius_i[valid_target_i] = dist_within_target_r.sum(axis=1)
 
-            dist_within_target_r = dist_from_src_to_target <= target_grid_radius[i]
+    # when there is no source index within the search radius then the
+    # 'get neighbour info' routine returns a dummy value of the length of the source grid
+    nearest_target_i = np.flatnonzero(Ax_nearest_within_source_grid_max_L[1])
+    nearest_src_i = Ax_nearest_within_source_grid_max_L[2].reshape(len(nearest_target_i), -1)[:, 0]
+    found = nearest_src_i < len_source_grid
 
-            if neighbours > 1:
-                src_indicies_here = Ax_max_target_grid_r[2][current_valid_target_i, :]
-            else:
-                src_indicies_here = Ax_max_target_grid_r[2][current_valid_target_i]
-
-            source_indices_within_target_radius_i[i] = \
-                src_indicies_here[dist_within_target_r == True]
-
-            # count the # source indices here
-            num_source_indices_within_target_radius_i[i] = \
-                int(len(source_indices_within_target_radius_i[i]))
-
-            # NOW RECORD THE NEAREST NEIGHBOR POINT WIHTIN SOURCE_GRID_MAX_L
-            # when there is no source index within the search radius then
-            # the 'get neighbour info' routine returns a dummy value of
-            # the length of the source grid.  so we test to see if that's the
-            # value that was returned.  If not, then we are good to go.
-            # In other words...if the index in Ax_nearest... is the length of source grid, it is invalid
-            # We think this should always because of the initial test for Ax[1] == True
-            if Ax_nearest_within_source_grid_max_L[2][current_valid_target_i] < len_source_grid:
-                nearest_source_index_to_target_index_i[i] = Ax_nearest_within_source_grid_max_L[2][current_valid_target_i]
-
-            # increment this little bastard
-            current_valid_target_i += 1
-
-        # print progress.  always nice
-        if i in debug_is:
-            print(str(int(i/len_target_grid*100)) + ' %')
+    nearest_source_index_to_target_index_i = np.full(len_target_grid, -1, dtype=np.int32)
+    nearest_source_index_to_target_index_i[nearest_target_i[found]] = nearest_src_i[found]
 
     return source_indices_within_target_radius_i,\
         num_source_indices_within_target_radius_i,\
@@ -0,0 +1,120 @@
+import fcntl
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+from multiprocessing import current_process
+
+import numpy as np
+import xarray as xr
+import zarr
+from utils.processing_utils.records import NETCDF_FILL_VALUE, coordinate_encoding
+
+logger = logging.getLogger(str(current_process().pid))
+
+'''
+Year stores of transformed fields: a Zarr store per dataset, grid, field, hemisphere and year with
+a time step for every day (or month) of the year, one chunk per time step. Each granule writes only
+its own time step, so a year of transformations is a single store rather than one netCDF per
+granule, and aggregation reads the year from one store.
+
+Stores are created, with the grid coordinates and attributes of the first granule written, under a
+lock on {store}.lock. Granules write to separate chunks so they're written without locking.
+'''
+
+
+def store_path(output_dir: str, grid_name: str, field_name: str, hemi: str, year: str) -> str:
+    return os.path.join(output_dir, f'{grid_name}_{field_name}{hemi}_{year}.zarr')
+
+
+def year_times(year: str, data_time_scale: str) -> np.ndarray:
+    '''
+    Start of each time step of a year store
+    '''
+    if data_time_scale.upper() == 'MONTHLY':
+        return np.arange(f'{year}-01', f'{int(year)+1}-01', dtype='datetime64[M]').astype('datetime64[ns]')
+    return np.arange(f'{year}-01-01', f'{int(year)+1}-01-01', dtype='datetime64[D]').astype('datetime64[ns]')
+
+
+def time_index(date: str, data_time_scale: str) -> int:
+    '''
+    Index of the time step of a granule date within its year store
+    '''
+    if data_time_scale.upper() == 'MONTHLY':
+        return int(date[5:7]) - 1
+    return int((np.datetime64(date[:10], 'D') - np.datetime64(f'{date[:4]}-01-01', 'D')).astype(int))
+
+
+@contextmanager
+def locked(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def create_store(path: str, field_DS: xr.Dataset, times: np.ndarray):
+    '''
+    Creates an empty year store shaped like field_DS (a single time step) with a time step per times
+    '''
+    n_times = len(times)
+
+    # Write field_DS as the first time step, then extend the time dimension without touching data
+    template_DS = field_DS.copy()
+    for var in template_DS.data_vars:
+        template_DS[var] = template_DS[var].where(False)
+    template_DS = template_DS.assign_coords(time=times[:1])
+    # Coordinates are encoded as in netCDF outputs, except times are stored as floats so any time
+    # of day can be written to a time step
+    encoding = coordinate_encoding(template_DS)
+    for var in template_DS.variables:
+        if np.issubdtype(template_DS[var].dtype, np.datetime64):
+            encoding[var] = {'units': 'hours since 1980-01-01', 'dtype': 'float64'}
+        elif var in template_DS.data_vars:
+            encoding[var] = {'_FillValue': NETCDF_FILL_VALUE}
+        if 'time' in template_DS[var].dims:
+            encoding[var]['chunks'] = tuple(1 if dim == 'time' else size
+                                            for dim, size in zip(template_DS[var].dims, template_DS[var].shape))
+    template_DS.to_zarr(path, mode='w', encoding=encoding, consolidated=False)
+
+    time_vars = [var for var in template_DS.variables if 'time' in template_DS[var].dims]
+    group = zarr.open_group(path, mode='r+')
+    for var in time_vars:
+        group[var].resize((n_times, *group[var].shape[1:]))
+
+    # Time steps not yet written span their own day (or month)
+    bounds = np.append(times, times[-1] + (times[-1] - times[-2]))
+    time_DS = xr.Dataset(coords={'time': times, 'time_bnds': (('time', 'nv'), np.stack([bounds[:-1], bounds[1:]], 1))})
+    time_DS[[var for var in time_DS.variables if var in time_vars]].to_zarr(path, region={'time': slice(0, n_times)},
+                                                                          consolidated=False)
+    zarr.consolidate_metadata(path)
+
+
+def write_time_step(path: str, field_DS: xr.Dataset, times: np.ndarray, index: int) -> str:
+    '''
+    Writes field_DS (a single time step) to time step index of the year store at path, creating
+    the store if needed. Returns the md5 checksum of the time step's data.
+    '''
+    if not os.path.exists(path):
+        with locked(path):
+            if not os.path.exists(path):
+                # Created aside and moved in place, so the store is never seen half made
+                logger.debug(f'Creating transformed year store {path}')
+                tmp_path = f'{path}.tmp{os.getpid()}'
+                create_store(tmp_path, field_DS, times)
+                os.rename(tmp_path, path)
+
+    time_step_DS = field_DS.drop_vars([var for var in field_DS.variables if 'time' not in field_DS[var].dims])
+    time_step_DS.to_zarr(path, region={'time': slice(index, index + 1)}, consolidated=False)
+
+    checksum = hashlib.md5()
+    for var in sorted(time_step_DS.data_vars):
+        checksum.update(np.ascontiguousarray(time_step_DS[var].values).tobytes())
+    return checksum.hexdigest()
+
+
+def open_store(path: str) -> xr.Dataset:
+    '''
+    Lazily opens a year store. Only the time steps selected are read.
+    '''
+    return xr.open_zarr(path, chunks=None)